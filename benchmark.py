@@ -0,0 +1,322 @@
+# benchmark.py
+"""
+합성(synthetic) COCO 형식 데이터셋으로 주요 경로의 성능을 측정하는 벤치마크.
+
+사용 예:
+    python benchmark.py --images 5000 --boxes-per-image 7 --classes 80 --output bench.json
+    python benchmark.py --compare bench_prev.json --max-slowdown 1.2
+
+각 항목마다 소요 시간, 처리량(items/s), 최대 메모리(tracemalloc 기준)를 측정하여 JSON으로 저장합니다.
+--compare로 이전 결과를 주면 느려진 항목을 표시하고 종료 코드 1을 반환합니다.
+GUI/시각화 모듈의 import 시간도 측정하여 IMPORT_TIME_BUDGETS를 넘거나 matplotlib, scipy를 미리 import하면 실패로 처리합니다.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+import coco_loader
+import map_calculator
+import visualizer
+
+# 시작 시 import되는 모듈별 허용 import 시간 (초). GUI 창이 1초 안에 표시되도록 여유를 둔 값
+IMPORT_TIME_BUDGETS = {
+    "gui": 0.5,
+    "show_annotations": 0.3,
+    "visualizer": 0.3,
+}
+# GUI 시작 시 import되면 안 되는 무거운 모듈
+LAZY_MODULES = ("matplotlib", "scipy")
+
+
+def generate_synthetic_dataset(num_images=1000, boxes_per_image=7, num_classes=80,
+                               score_distribution="uniform", image_size=(640, 480), seed=0):
+    """
+    합성 GT(COCO 형식 dict)와 예측(COCO results 리스트)을 생성합니다.
+    예측은 GT를 흔들어 만든 TP 후보와 무작위 위치의 FP로 구성됩니다.
+
+    Args:
+        score_distribution (str): "uniform" 또는 "beta" (높은 score에 치우친 분포).
+    """
+    rng = np.random.default_rng(seed)
+    width, height = image_size
+    categories = [{"id": c, "name": f"class_{c}"} for c in range(1, num_classes + 1)]
+    images = [{"id": i, "file_name": f"{i:012d}.jpg", "width": width, "height": height}
+              for i in range(1, num_images + 1)]
+
+    counts = rng.poisson(boxes_per_image, size=num_images)
+    total = int(counts.sum())
+    image_ids = np.repeat(np.arange(1, num_images + 1), counts)
+    wh = rng.uniform(10, min(width, height) / 2, size=(total, 2))
+    xy = rng.uniform(0, 1, size=(total, 2)) * (np.array([width, height]) - wh)
+    gt_boxes = np.hstack([xy, wh])
+    gt_classes = rng.integers(1, num_classes + 1, size=total)
+
+    annotations = [
+        {"id": k + 1, "image_id": int(image_ids[k]), "category_id": int(gt_classes[k]),
+         "bbox": [round(float(v), 2) for v in gt_boxes[k]],
+         "area": float(gt_boxes[k, 2] * gt_boxes[k, 3]), "iscrowd": 0}
+        for k in range(total)
+    ]
+
+    # 예측: GT를 흔든 박스(약 80%) + 같은 수의 20%만큼 무작위 FP
+    keep = rng.random(total) < 0.8
+    jitter = rng.normal(0, 0.1, size=(total, 4)) * np.repeat(gt_boxes[:, 2:], 2, axis=1)
+    pred_boxes = np.clip(gt_boxes + jitter, 1, None)[keep]
+    pred_image_ids = image_ids[keep]
+    pred_classes = np.where(rng.random(total) < 0.9, gt_classes, rng.integers(1, num_classes + 1, size=total))[keep]
+
+    num_fp = int(total * 0.2)
+    fp_wh = rng.uniform(10, min(width, height) / 2, size=(num_fp, 2))
+    fp_xy = rng.uniform(0, 1, size=(num_fp, 2)) * (np.array([width, height]) - fp_wh)
+    pred_boxes = np.vstack([pred_boxes, np.hstack([fp_xy, fp_wh])])
+    pred_image_ids = np.concatenate([pred_image_ids, rng.integers(1, num_images + 1, size=num_fp)])
+    pred_classes = np.concatenate([pred_classes, rng.integers(1, num_classes + 1, size=num_fp)])
+
+    if score_distribution == "beta":
+        scores = rng.beta(5, 2, size=len(pred_boxes))
+    else:
+        scores = rng.uniform(0, 1, size=len(pred_boxes))
+
+    predictions = [
+        {"image_id": int(pred_image_ids[k]), "category_id": int(pred_classes[k]),
+         "bbox": [round(float(v), 2) for v in pred_boxes[k]], "score": round(float(scores[k]), 4)}
+        for k in range(len(pred_boxes))
+    ]
+    coco = {"images": images, "annotations": annotations, "categories": categories}
+    return coco, predictions
+
+
+def write_synthetic_images(directory, images, count):
+    """썸네일/렌더링 측정용 JPEG 이미지를 count개 생성합니다."""
+    rng = np.random.default_rng(0)
+    written = []
+    for image_info in images[:count]:
+        pixels = rng.integers(0, 255, size=(image_info["height"], image_info["width"], 3), dtype=np.uint8)
+        path = os.path.join(directory, image_info["file_name"])
+        Image.fromarray(pixels).save(path, quality=90)
+        written.append(path)
+    return written
+
+
+def measure(name, func, items, results, track_memory=True):
+    """
+    func 실행 시간과 최대 메모리를 측정하여 results[name]에 기록합니다.
+    tracemalloc은 실행 속도를 크게 떨어뜨리므로 시간 측정과 메모리 측정은 별도로 한 번씩 실행합니다.
+    """
+    start = time.perf_counter()
+    value = func()
+    elapsed = time.perf_counter() - start
+
+    peak_mb = None
+    if track_memory:
+        tracemalloc.start()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peak_mb = peak / (1024 * 1024)
+
+    results[name] = {
+        "seconds": elapsed,
+        "items": items,
+        "throughput": items / elapsed if elapsed > 0 else None,
+        "peak_memory_mb": peak_mb,
+    }
+    peak_text = f"peak {peak_mb:8.1f} MB" if peak_mb is not None else ""
+    print(f"{name:<28} {elapsed:9.4f}s  {results[name]['throughput'] or 0:12.1f} items/s  {peak_text}")
+    return value
+
+
+def measure_import_time(module_name, repeats=3):
+    """
+    새 인터프리터에서 모듈 import 시간을 repeats번 측정하여 최소값(초)과 함께 import된 lazy 대상 모듈 목록을 반환합니다.
+    """
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {module_name}\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"loaded = [m for m in {LAZY_MODULES!r} if m in sys.modules]\n"
+        "print(elapsed, ','.join(loaded))\n"
+    )
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    timings, loaded = [], []
+    for _ in range(repeats):
+        output = subprocess.check_output([sys.executable, "-c", code], cwd=cwd, text=True).split()
+        timings.append(float(output[0]))
+        loaded = output[1].split(",") if len(output) > 1 else []
+    return min(timings), loaded
+
+
+def check_import_budgets(results, budgets=IMPORT_TIME_BUDGETS):
+    """모듈별 import 시간을 측정하여 results에 기록하고, 예산을 넘거나 lazy 대상 모듈을 import한 항목을 반환합니다."""
+    violations = []
+    for module_name, budget in budgets.items():
+        try:
+            seconds, loaded = measure_import_time(module_name)
+        except (OSError, subprocess.CalledProcessError) as e:
+            print(f"import {module_name:<21} 측정 실패 - {e}")
+            continue
+        results[f"import {module_name}"] = {"seconds": seconds, "budget": budget, "eager_modules": loaded}
+        over = seconds > budget
+        marker = "  <-- OVER BUDGET" if over else ""
+        eager = f"  (eager: {', '.join(loaded)})" if loaded else ""
+        print(f"{'import ' + module_name:<28} {seconds:9.4f}s  budget {budget:.2f}s{marker}{eager}")
+        if over or loaded:
+            violations.append(module_name)
+    return violations
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(args):
+    results = {}
+    track_memory = not args.no_memory
+    import_violations = check_import_budgets(results)
+    workdir = tempfile.mkdtemp(prefix="map_bench_")
+    try:
+        coco, predictions = generate_synthetic_dataset(
+            args.images, args.boxes_per_image, args.classes, args.score_distribution, seed=args.seed
+        )
+        gt_path = os.path.join(workdir, "gt.json")
+        pred_path = os.path.join(workdir, "predictions.json")
+        with open(gt_path, 'w') as f:
+            json.dump(coco, f)
+        with open(pred_path, 'w') as f:
+            json.dump(predictions, f)
+        num_gt, num_pred = len(coco["annotations"]), len(predictions)
+        print(f"synthetic dataset: {args.images} images, {num_gt} GT, {num_pred} predictions, {args.classes} classes")
+
+        images, gt_annotations, categories = measure(
+            "load_coco_annotations", lambda: coco_loader.load_coco_annotations(gt_path), num_gt, results, track_memory)
+        pred_by_image = measure(
+            "load_predictions", lambda: coco_loader.load_predictions(pred_path), num_pred, results, track_memory)
+
+        # 가장 예측이 많은 이미지 하나로 단일 이미지 경로 측정
+        dense_image_id = max(pred_by_image, key=lambda i: len(pred_by_image[i]))
+        dense_gt = gt_annotations.get(dense_image_id, [])
+        dense_pred = pred_by_image[dense_image_id]
+        repeats = args.repeats
+
+        def pr_arrays_loop():
+            for _ in range(repeats):
+                map_calculator.get_pr_arrays(dense_gt, dense_pred, category_id=None, iou_threshold=0.5)
+        measure("get_pr_arrays", pr_arrays_loop, repeats, results, track_memory)
+
+        sample_ids = list(images.keys())[:min(len(images), args.map_images)]
+        def calculate_map_loop():
+            for image_id in sample_ids:
+                map_calculator.calculate_map(gt_annotations.get(image_id, []), pred_by_image.get(image_id, []),
+                                             categories, 0.5)
+        measure("calculate_map (per image)", calculate_map_loop, len(sample_ids), results, track_memory)
+
+        measure("dataset_map", lambda: map_calculator.evaluate_dataset(
+            gt_annotations, pred_by_image, categories, iou_threshold=0.5, image_ids=images.keys(),
+            workers=args.workers), len(images), results, track_memory)
+
+        image_dir = os.path.join(workdir, "images")
+        os.makedirs(image_dir)
+        image_paths = write_synthetic_images(image_dir, coco["images"], args.render_images)
+
+        def thumbnails():
+            for path in image_paths:
+                with Image.open(path) as img:
+                    img.thumbnail((64, 64), Image.Resampling.LANCZOS)
+        measure("thumbnail_generation", thumbnails, len(image_paths), results, track_memory)
+
+        def render():
+            for image_info, path in zip(coco["images"], image_paths):
+                image_id = image_info["id"]
+                visualizer.draw_annotations(path, gt_annotations.get(image_id, []), pred_by_image.get(image_id, []),
+                                            categories, confidence_threshold=0.3)
+        measure("draw_annotations", render, len(image_paths), results, track_memory)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "commit": _git_commit(),
+        "timestamp": time.time(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "params": {
+            "images": args.images, "boxes_per_image": args.boxes_per_image, "classes": args.classes,
+            "score_distribution": args.score_distribution, "seed": args.seed, "workers": args.workers,
+        },
+        "results": results,
+        "import_budget_violations": import_violations,
+    }
+
+
+def compare_results(current, previous, max_slowdown):
+    """이전 결과 대비 max_slowdown배 이상 느려진 항목 목록을 반환합니다."""
+    regressions = []
+    for name, result in current["results"].items():
+        prev = previous.get("results", {}).get(name)
+        if not prev or not prev.get("seconds") or "items" not in result:
+            continue
+        ratio = result["seconds"] / prev["seconds"]
+        marker = "  <-- REGRESSION" if ratio > max_slowdown else ""
+        print(f"{name:<28} {prev['seconds']:9.4f}s -> {result['seconds']:9.4f}s  x{ratio:5.2f}{marker}")
+        if ratio > max_slowdown:
+            regressions.append(name)
+    return regressions
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Synthetic COCO-scale performance benchmarks.")
+    parser.add_argument("--images", type=int, default=5000, help="이미지 수")
+    parser.add_argument("--boxes-per-image", type=float, default=7.3, help="이미지당 평균 GT 박스 수")
+    parser.add_argument("--classes", type=int, default=80, help="클래스 수")
+    parser.add_argument("--score-distribution", choices=["uniform", "beta"], default="uniform")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="dataset mAP 계산 프로세스 수")
+    parser.add_argument("--repeats", type=int, default=200, help="get_pr_arrays 반복 횟수")
+    parser.add_argument("--map-images", type=int, default=1000, help="이미지 단위 calculate_map 측정 이미지 수")
+    parser.add_argument("--render-images", type=int, default=50, help="썸네일/렌더링 측정 이미지 수")
+    parser.add_argument("--no-memory", action="store_true", help="최대 메모리 측정(추가 실행)을 생략")
+    parser.add_argument("--output", help="결과 JSON 저장 경로")
+    parser.add_argument("--compare", help="비교할 이전 결과 JSON 경로")
+    parser.add_argument("--max-slowdown", type=float, default=1.25, help="회귀로 판단할 배율 (기본값: 1.25)")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    report = run_benchmarks(args)
+    exit_code = 0
+    if report["import_budget_violations"]:
+        print(f"import 시간 예산 초과: {', '.join(report['import_budget_violations'])}")
+        exit_code = 1
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"결과 저장: {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            previous = json.load(f)
+        regressions = compare_results(report, previous, args.max_slowdown)
+        if regressions:
+            print(f"성능 회귀: {', '.join(regressions)}")
+            exit_code = 1
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
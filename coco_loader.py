@@ -1,16 +1,232 @@
 # coco_loader.py
+import bisect
+import gzip
 import json
 import os
+import re
 from collections import defaultdict
 
-def load_coco_annotations(filepath):
-    """COCO 형식의 Ground Truth annotation 파일을 로드합니다."""
+import numpy as np
+
+READ_CHUNK_SIZE = 4 * 1024 * 1024 # 진행률 보고/취소 확인 단위 (bytes)
+
+
+class LoadCancelled(Exception):
+    """cancel_event로 로드가 취소되었을 때 발생합니다."""
+
+
+class _ProgressReader:
+    """
+    파일 객체를 감싸 읽은 byte 수를 세고 progress_callback(bytes_read, total_bytes)을 호출합니다.
+    cancel_event가 설정되면 다음 read()에서 LoadCancelled를 발생시킵니다.
+    gzip 파일은 압축된 byte 기준으로 진행률을 계산합니다.
+    """
+
+    def __init__(self, raw, total_bytes, progress_callback=None, cancel_event=None):
+        self.raw = raw
+        self.total_bytes = total_bytes
+        self.bytes_read = 0
+        self.progress_callback = progress_callback
+        self.cancel_event = cancel_event
+
+    def _check_cancel(self):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise LoadCancelled()
+
+    def read(self, size=-1):
+        self._check_cancel()
+        data = self.raw.read(size)
+        self.bytes_read += len(data)
+        if self.progress_callback and data:
+            self.progress_callback(self.bytes_read, self.total_bytes)
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def readable(self):
+        return True
+
+    def close(self):
+        self.raw.close()
+
+
+def _read_json(filepath, progress_callback=None, cancel_event=None):
+    """
+    JSON 파일(.gz 포함)을 READ_CHUNK_SIZE 단위로 읽으며 진행률을 보고한 뒤 파싱합니다.
+
+    Raises:
+        LoadCancelled: 읽는 도중 cancel_event가 설정된 경우.
+    """
+    total_bytes = os.path.getsize(filepath)
+    reader = _ProgressReader(open(filepath, 'rb'), total_bytes, progress_callback, cancel_event)
+    try:
+        stream = gzip.GzipFile(fileobj=reader, mode='rb') if filepath.lower().endswith('.gz') else reader
+        chunks = []
+        while True:
+            chunk = stream.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        reader.close()
+    data = b"".join(chunks)
+    del chunks
+    reader._check_cancel()
+    return json.loads(data)
+
+def _load_columnar_predictions(filepath):
+    """results_writer.write_columnar_results()로 저장한 .npz 예측 파일을 레코드 리스트로 읽습니다."""
+    with np.load(filepath, allow_pickle=False) as data:
+        image_ids = data['image_id'].tolist()
+        category_ids = data['category_id'].tolist()
+        # float32로 저장된 값을 JSON 저장 시와 같은 자릿수로 맞춤
+        bboxes = np.round(data['bbox'].astype(np.float64), 2).tolist()
+        scores = np.round(data['score'].astype(np.float64), 4).tolist()
+        # id 컬럼은 없을 수 있음 (이전 형식). 정수 -1 / 빈 문자열은 id가 없는 예측
+        ann_ids = data['id'].tolist() if 'id' in data.files else [None] * len(scores)
+    predictions = []
+    for image_id, category_id, bbox, score, ann_id in zip(image_ids, category_ids, bboxes, scores, ann_ids):
+        pred = {"image_id": image_id, "category_id": category_id, "bbox": bbox, "score": score}
+        if ann_id is not None and ann_id != -1 and ann_id != "":
+            pred["id"] = ann_id
+        predictions.append(pred)
+    return predictions
+
+def _score_key(pred):
+    return pred['score']
+
+def bucket_by_category(annotations, sort_by_score=False):
+    """
+    annotation 리스트를 category_id별 리스트로 나눕니다. 각 리스트는 입력 순서를 유지합니다.
+
+    Args:
+        sort_by_score (bool): True이면 각 리스트를 score 내림차순으로 정렬합니다. (같은 score는 입력 순서 유지)
+
+    Returns:
+        dict: category_id -> annotation 리스트 (등장한 클래스만 포함)
+    """
+    buckets = defaultdict(list)
+    for ann in annotations:
+        buckets[ann['category_id']].append(ann)
+    if sort_by_score:
+        for anns in buckets.values():
+            anns.sort(key=_score_key, reverse=True)
+    return dict(buckets)
+
+def build_category_buckets(annotations_by_image, sort_by_score=False):
+    """
+    이미지별 annotation을 (image_id, category_id) 단위 bucket으로 나눕니다.
+    이미지별 조회가 잦으므로 {image_id: {category_id: [...]}} 형태로 반환합니다.
+    """
+    return {image_id: bucket_by_category(anns, sort_by_score)
+            for image_id, anns in annotations_by_image.items()}
+
+class ImageIndex:
+    """
+    GT 로드 시 한 번 만드는 이미지 역색인. 탐색기의 조건 검색을 정렬된 image_id 배열의 교집합으로 처리합니다.
+
+    - category_id -> 해당 클래스 GT가 있는 image_id (정렬된 배열)
+    - 파일명 prefix: 소문자 파일명을 정렬해 두고 이분 탐색
+    - 파일명 substring: 소문자 파일명을 줄바꿈으로 이어 붙인 문자열에서 검색한 뒤 위치를 이미지로 변환
+    - 예측 score: set_predictions()로 예측의 (score, image_id)를 score 내림차순 배열로 저장 (score는 편집 불가이므로 유지됨)
+    """
+
+    def __init__(self, images, annotations_by_image):
+        image_ids = list(images.keys())
+        self.all_image_ids = np.sort(np.array(image_ids))
+
+        pair_images, pair_categories = [], []
+        for image_id, anns in annotations_by_image.items():
+            for cat_id in set(ann['category_id'] for ann in anns):
+                pair_images.append(image_id)
+                pair_categories.append(cat_id)
+        pair_images, pair_categories = np.array(pair_images), np.array(pair_categories, dtype=np.int64)
+        order = np.lexsort((pair_images, pair_categories))
+        cats, starts = np.unique(pair_categories[order], return_index=True)
+        self._by_category = {int(cat_id): ids for cat_id, ids in zip(cats, np.split(pair_images[order], starts[1:]))}
+
+        names = [images[image_id].get('file_name', '').lower() for image_id in image_ids]
+        name_ids = np.array(image_ids)
+        name_order = sorted(range(len(names)), key=names.__getitem__)
+        self._sorted_names = [names[i] for i in name_order]
+        self._sorted_name_ids = name_ids[name_order]
+        self._name_ids = name_ids
+        self._name_text = "\n".join(names)
+        self._name_starts = np.cumsum([0] + [len(name) + 1 for name in names[:-1]]) if names else np.zeros(0, dtype=np.int64)
+
+        self._pred_scores = np.zeros(0) # score 내림차순
+        self._pred_image_ids = np.zeros(0, dtype=self.all_image_ids.dtype)
+
+    def set_predictions(self, predictions_by_image):
+        """예측 score 색인을 만듭니다. (예측 세트가 바뀔 때마다 호출)"""
+        scores, image_ids = [], []
+        for image_id, preds in (predictions_by_image or {}).items():
+            scores.extend(pred['score'] for pred in preds)
+            image_ids.extend([image_id] * len(preds))
+        scores = np.array(scores, dtype=np.float64)
+        order = np.argsort(-scores, kind='stable')
+        self._pred_scores = scores[order]
+        self._pred_image_ids = np.array(image_ids)[order] if image_ids else self._pred_image_ids[:0]
+
+    def images_with_category(self, category_id):
+        return self._by_category.get(category_id, self.all_image_ids[:0])
+
+    def images_with_filename_prefix(self, prefix):
+        prefix = prefix.lower()
+        lo = bisect.bisect_left(self._sorted_names, prefix)
+        hi = bisect.bisect_left(self._sorted_names, prefix + "\uffff")
+        return np.sort(self._sorted_name_ids[lo:hi])
+
+    def images_with_filename_substring(self, text):
+        text = text.lower()
+        if not text:
+            return self.all_image_ids
+        offsets = [match.start() for match in re.finditer(re.escape(text), self._name_text)]
+        positions = np.searchsorted(self._name_starts, offsets, side='right') - 1
+        return np.unique(self._name_ids[positions])
+
+    def images_with_score(self, min_score, inclusive=False):
+        """score가 min_score보다 큰(inclusive면 이상인) 예측이 있는 image_id"""
+        count = np.searchsorted(-self._pred_scores, -min_score, side='right' if inclusive else 'left')
+        return np.unique(self._pred_image_ids[:count])
+
+    def query(self, predicates):
+        """
+        색인으로 답할 수 있는 조건(class, file_prefix, file_contains, score)을 모두 만족하는 image_id 배열.
+        해당 조건이 없으면 None (전체 이미지)을 반환합니다. 다른 종류의 조건은 무시합니다.
+        """
+        result = None
+        for predicate in predicates:
+            kind = predicate[0]
+            if kind == "class":
+                ids = self.images_with_category(predicate[1])
+            elif kind == "file_prefix":
+                ids = self.images_with_filename_prefix(predicate[1])
+            elif kind == "file_contains":
+                ids = self.images_with_filename_substring(predicate[1])
+            elif kind in ("score", "unmatched"): # unmatched는 score 조건으로 후보만 좁히고 매칭 확인은 호출한 쪽에서
+                ids = self.images_with_score(predicate[2], inclusive=predicate[1] == ">=")
+            else:
+                continue
+            result = ids if result is None else np.intersect1d(result, ids, assume_unique=True)
+        return result
+
+def load_coco_annotations(filepath, progress_callback=None, cancel_event=None):
+    """
+    COCO 형식의 Ground Truth annotation 파일을 로드합니다.
+
+    Args:
+        progress_callback (callable, optional): progress_callback(bytes_read, total_bytes). 읽는 스레드에서 호출됩니다.
+        cancel_event (threading.Event, optional): 설정되면 로드를 중단하고 LoadCancelled를 발생시킵니다.
+    """
     if not os.path.exists(filepath):
         print(f"오류: GT annotation 파일을 찾을 수 없습니다 - {filepath}")
         return None, None, None
     try:
-        with open(filepath, 'r') as f:
-            coco_data = json.load(f)
+        coco_data = _read_json(filepath, progress_callback, cancel_event)
 
         images = {img['id']: img for img in coco_data.get('images', [])}
         annotations = defaultdict(list)
@@ -19,18 +235,34 @@ def load_coco_annotations(filepath):
         categories = {cat['id']: cat for cat in coco_data.get('categories', [])}
         print(f"GT 로드 완료: {len(images)}개 이미지, {len(coco_data.get('annotations', []))}개 annotation")
         return images, annotations, categories
+    except LoadCancelled:
+        print(f"GT annotation 로드가 취소되었습니다 - {filepath}")
+        raise
     except Exception as e:
         print(f"오류: GT annotation 파일 로드 중 오류 발생 - {e}")
         return None, None, None
 
-def load_predictions(filepath):
-    """모델 예측 annotation 파일을 로드합니다."""
+def load_predictions(filepath, progress_callback=None, cancel_event=None):
+    """
+    모델 예측 annotation 파일을 로드합니다. (.json, .json.gz, .npz)
+
+    Args:
+        progress_callback (callable, optional): progress_callback(bytes_read, total_bytes). 읽는 스레드에서 호출됩니다.
+        cancel_event (threading.Event, optional): 설정되면 로드를 중단하고 LoadCancelled를 발생시킵니다.
+    """
     if not os.path.exists(filepath):
         print(f"오류: 예측 annotation 파일을 찾을 수 없습니다 - {filepath}")
         return None
     try:
-        with open(filepath, 'r') as f:
-            predictions = json.load(f)
+        if filepath.lower().endswith('.npz'):
+            predictions = _load_columnar_predictions(filepath)
+            if progress_callback:
+                size = os.path.getsize(filepath)
+                progress_callback(size, size)
+        else:
+            predictions = _read_json(filepath, progress_callback, cancel_event)
+        if cancel_event is not None and cancel_event.is_set():
+            raise LoadCancelled()
         # 예측 결과를 image_id 기준으로 그룹화
         predictions_by_image = defaultdict(list)
         for pred in predictions:
@@ -46,8 +278,16 @@ def load_predictions(filepath):
             if formatted_pred["image_id"] is not None:
                  predictions_by_image[formatted_pred["image_id"]].append(formatted_pred)
 
+        # 이미지별 예측을 score 내림차순으로 한 번만 정렬 (같은 score는 파일 순서 유지)
+        # -> 클래스별로 나눈 bucket도 자동으로 score 내림차순이 되어 평가/렌더링 시 다시 정렬할 필요가 없음
+        for preds in predictions_by_image.values():
+            preds.sort(key=_score_key, reverse=True)
+
         print(f"예측 로드 완료: {len(predictions)}개 예측")
         return predictions_by_image
+    except LoadCancelled:
+        print(f"예측 로드가 취소되었습니다 - {filepath}")
+        raise
     except Exception as e:
         print(f"오류: 예측 annotation 파일 로드 중 오류 발생 - {e}")
         return None
@@ -0,0 +1,328 @@
+# coco_metrics.py
+"""
+COCO 표준 12개 요약 지표(AP, AP50, AP75, APs/m/l, AR1/10/100, ARs/m/l)를 한 번의 매칭으로 계산합니다.
+
+- 이미지/클래스마다 예측(score 상위 100개)과 GT를 10개 IoU 임계값(0.50:0.05:0.95)에 대해 한 번만 매칭합니다.
+- GT/예측 면적은 배열로 한 번만 계산해 두고, area range와 maxDets는 매칭 결과 배열에 대한 mask로 적용합니다.
+  (area range마다, maxDets마다 다시 매칭하지 않음)
+- crowd(iscrowd=1)/ignore GT는 GT 개수에서 빠지고, 여기에 매칭된 예측은 TP/FP 집계 전에 제외합니다.
+  crowd 영역은 예측 면적 대비 교집합(IoP)으로 매칭하며 여러 예측이 같은 crowd 영역에 매칭될 수 있습니다.
+
+pycocotools와의 차이:
+    pycocotools는 area range마다 범위 밖 GT를 ignore로 두고 다시 매칭합니다. 여기서는 전체 범위("all")로 한 번 매칭한 뒤
+    매칭된 GT가 범위 밖이면 그 예측을 ignore로 처리하므로, 범위 안/밖 GT가 같은 예측을 두고 경합하는 드문 경우에만
+    small/medium/large 지표가 약간 달라질 수 있습니다. AP, AP50, AP75, AR1/10/100은 동일합니다.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import map_calculator
+import profiling
+
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+RECALL_THRESHOLDS = np.linspace(0.0, 1.0, 101)
+MAX_DETS = (1, 10, 100)
+AREA_RANGES = {
+    "all": (0, 1e5 ** 2),
+    "small": (0, 32 ** 2),
+    "medium": (32 ** 2, 96 ** 2),
+    "large": (96 ** 2, 1e5 ** 2),
+}
+AREA_NAMES = tuple(AREA_RANGES)
+
+# (이름, 지표 종류, IoU 임계값(None이면 0.50:0.95 평균), area range, maxDets)
+SUMMARY_METRICS = (
+    ("AP", "precision", None, "all", 100),
+    ("AP50", "precision", 0.5, "all", 100),
+    ("AP75", "precision", 0.75, "all", 100),
+    ("APs", "precision", None, "small", 100),
+    ("APm", "precision", None, "medium", 100),
+    ("APl", "precision", None, "large", 100),
+    ("AR1", "recall", None, "all", 1),
+    ("AR10", "recall", None, "all", 10),
+    ("AR100", "recall", None, "all", 100),
+    ("ARs", "recall", None, "small", 100),
+    ("ARm", "recall", None, "medium", 100),
+    ("ARl", "recall", None, "large", 100),
+)
+
+
+def _box_areas(boxes):
+    return boxes[:, 2] * boxes[:, 3] if len(boxes) else np.zeros(0)
+
+
+def _last_argmax(score):
+    """row별 최댓값 위치 (같은 값이면 마지막 column, pycocotools와 동일)"""
+    return score.shape[1] - 1 - np.argmax(score[:, ::-1], axis=1)
+
+
+def match_category_coco(gt_boxes, dt_boxes, gt_crowd=None, gt_ignore=None):
+    """
+    score 내림차순 예측과 GT를 모든 IoU 임계값에 대해 COCO 규칙으로 매칭합니다.
+    예측 순서대로, 아직 매칭되지 않은 GT 중 IoU가 가장 큰 GT를 가져갑니다. (같은 IoU면 뒤쪽 GT, pycocotools와 동일)
+    ignore GT는 일반 GT 후보가 없을 때만 고려하고, crowd GT는 IoP로 비교하며 매칭되어도 계속 후보로 남습니다.
+    예측 하나에 대해 10개 임계값을 한 번에(벡터로) 처리합니다.
+
+    Args:
+        gt_crowd (array-like, optional): [G] bool, crowd GT 여부.
+        gt_ignore (array-like, optional): [G] bool, ignore GT 여부 (crowd 포함).
+
+    Returns:
+        np.ndarray: [T, D] 각 예측에 매칭된 GT 인덱스, 없으면 -1.
+        np.ndarray: [T, D] bool, ignore GT에 매칭되어 집계에서 제외할 예측이면 True.
+    """
+    num_t, num_dt, num_gt = len(IOU_THRESHOLDS), len(dt_boxes), len(gt_boxes)
+    matched = np.full((num_t, num_dt), -1, dtype=np.int64)
+    dt_ignore = np.zeros((num_t, num_dt), dtype=bool)
+    if num_dt == 0 or num_gt == 0:
+        return matched, dt_ignore
+    crowd = np.zeros(num_gt, dtype=bool) if gt_crowd is None else np.asarray(gt_crowd, dtype=bool)
+    ignore = crowd if gt_ignore is None else np.asarray(gt_ignore, dtype=bool) | crowd
+    has_ignore = bool(ignore.any())
+
+    ious = map_calculator.box_iou_matrix(dt_boxes, gt_boxes, crowd if crowd.any() else None)
+    thresholds = np.minimum(IOU_THRESHOLDS, 1 - 1e-10)[:, None]
+    taken = np.zeros((num_t, num_gt), dtype=bool)
+    rows = np.arange(num_t)
+    for d in range(num_dt):
+        iou = ious[d]
+        candidates = (iou >= thresholds) & (~taken | crowd)
+        if not candidates.any():
+            continue
+        score = np.where(candidates & ~ignore, iou, -1.0)
+        best = _last_argmax(score)
+        ok = score[rows, best] >= 0
+        if has_ignore and not ok.all():
+            # 일반 GT 후보가 없는 임계값에서만 ignore GT 중 최선을 고름
+            score_ignored = np.where(candidates & ignore, iou, -1.0)
+            best_ignored = _last_argmax(score_ignored)
+            use_ignored = ~ok & (score_ignored[rows, best_ignored] >= 0)
+            best = np.where(use_ignored, best_ignored, best)
+            ok = ok | use_ignored
+        matched[ok, d] = best[ok]
+        taken[rows[ok], best[ok]] = True
+    if has_ignore:
+        dt_ignore = (matched >= 0) & ignore[np.clip(matched, 0, None)]
+    return matched, dt_ignore
+
+
+def match_image_coco(gt_annotations_img, pred_annotations_img, category_ids, max_det=MAX_DETS[-1]):
+    """
+    이미지 하나의 클래스별 COCO 매칭 결과를 계산합니다.
+
+    Returns:
+        dict: category_id -> {"scores", "rank", "dt_area", "matched_gt"[T, D], "dt_ignore"[T, D], "gt_area", "gt_ignore"}
+    """
+    gt_by_cat, dt_by_cat = {}, {}
+    for ann in gt_annotations_img:
+        if ann['category_id'] in category_ids:
+            gt_by_cat.setdefault(ann['category_id'], []).append(ann)
+    for pred in pred_annotations_img:
+        if pred['category_id'] in category_ids:
+            dt_by_cat.setdefault(pred['category_id'], []).append(pred)
+
+    results = {}
+    for cat_id in gt_by_cat.keys() | dt_by_cat.keys():
+        gts = gt_by_cat.get(cat_id, [])
+        dts = dt_by_cat.get(cat_id, [])
+        scores = np.array([d['score'] for d in dts], dtype=np.float64)
+        order = np.argsort(-scores, kind='mergesort')[:max_det]
+        scores = scores[order]
+        dt_boxes = np.array([dts[i]['bbox'] for i in order], dtype=np.float64).reshape(-1, 4)
+        gt_boxes = np.array([g['bbox'] for g in gts], dtype=np.float64).reshape(-1, 4)
+        gt_area = np.array([g.get('area', g['bbox'][2] * g['bbox'][3]) for g in gts], dtype=np.float64)
+        gt_crowd = np.array([bool(g.get('iscrowd', 0)) for g in gts], dtype=bool)
+        gt_ignore = np.array([map_calculator.is_ignored_gt(g) for g in gts], dtype=bool)
+        matched_gt, dt_ignore = match_category_coco(gt_boxes, dt_boxes, gt_crowd, gt_ignore)
+        results[cat_id] = {
+            "scores": scores,
+            "rank": np.arange(len(scores)),
+            "dt_area": _box_areas(dt_boxes),
+            "matched_gt": matched_gt,
+            "dt_ignore": dt_ignore,
+            "gt_area": gt_area,
+            "gt_ignore": gt_ignore,
+        }
+    return results
+
+
+_COCO_CONTEXT = {}
+
+def _init_coco_worker(gt_annotations, pred_annotations, category_ids):
+    _COCO_CONTEXT.update(gt_annotations=gt_annotations, pred_annotations=pred_annotations, category_ids=category_ids)
+
+@profiling.profiled("coco_chunk")
+def _match_image_chunk(image_ids):
+    """이미지 묶음을 매칭하여 클래스별 배열 목록을 반환합니다. (GT 면적은 매칭된 예측 쪽에 미리 옮겨 둠)"""
+    ctx = _COCO_CONTEXT
+    partial = {}
+    for image_id in image_ids:
+        gt_img = ctx["gt_annotations"].get(image_id, []) if ctx["gt_annotations"] else []
+        pred_img = ctx["pred_annotations"].get(image_id, []) if ctx["pred_annotations"] else []
+        if not gt_img and not pred_img:
+            continue
+        for cat_id, m in match_image_coco(gt_img, pred_img, ctx["category_ids"]).items():
+            matched_gt = m["matched_gt"]
+            gt_area = m["gt_area"]
+            # 매칭된 GT의 면적 [T, D] (매칭 없음: nan) - area range mask를 GT 목록 없이 계산하기 위함
+            matched_area = np.where(matched_gt >= 0, gt_area[np.clip(matched_gt, 0, None)] if len(gt_area) else np.nan, np.nan)
+            entry = partial.setdefault(cat_id, {"scores": [], "rank": [], "dt_area": [], "matched_area": [],
+                                                "dt_ignore": [], "gt_area": []})
+            entry["scores"].append(m["scores"])
+            entry["rank"].append(m["rank"])
+            entry["dt_area"].append(m["dt_area"])
+            entry["matched_area"].append(matched_area)
+            entry["dt_ignore"].append(m["dt_ignore"])
+            entry["gt_area"].append(gt_area[~m["gt_ignore"]]) # GT 개수는 crowd/ignore 제외
+    return partial
+
+
+def _merge_partials(partials, category_ids):
+    """worker 결과를 클래스별 연속 배열로 합치고 score 내림차순(안정 정렬)으로 정렬합니다."""
+    merged = {}
+    num_t = len(IOU_THRESHOLDS)
+    for cat_id in category_ids:
+        parts = [p[cat_id] for p in partials if cat_id in p]
+        if not parts:
+            continue
+        scores = np.concatenate([a for p in parts for a in p["scores"]])
+        order = np.argsort(-scores, kind='mergesort')
+        merged[cat_id] = {
+            "scores": scores[order],
+            "rank": np.concatenate([a for p in parts for a in p["rank"]])[order],
+            "dt_area": np.concatenate([a for p in parts for a in p["dt_area"]])[order],
+            "matched_area": np.concatenate([a for p in parts for a in p["matched_area"]] or [np.zeros((num_t, 0))], axis=1)[:, order],
+            "dt_ignore": np.concatenate([a for p in parts for a in p["dt_ignore"]] or [np.zeros((num_t, 0), dtype=bool)], axis=1)[:, order],
+            "gt_area": np.concatenate([a for p in parts for a in p["gt_area"]]),
+        }
+    return merged
+
+
+def accumulate(matches, category_ids):
+    """
+    클래스별 매칭 배열에서 area range / maxDets mask만 바꿔 가며 precision과 recall을 계산합니다.
+
+    Returns:
+        np.ndarray: precision [T, R, K, A, M] (계산 불가: -1)
+        np.ndarray: recall [T, K, A, M] (계산 불가: -1)
+    """
+    num_t, num_r = len(IOU_THRESHOLDS), len(RECALL_THRESHOLDS)
+    num_k, num_a, num_m = len(category_ids), len(AREA_RANGES), len(MAX_DETS)
+    precision = -np.ones((num_t, num_r, num_k, num_a, num_m))
+    recall = -np.ones((num_t, num_k, num_a, num_m))
+
+    for k, cat_id in enumerate(category_ids):
+        m = matches.get(cat_id)
+        if m is None:
+            continue
+        matched = ~np.isnan(m["matched_area"]) # [T, D]
+        for a, (lo, hi) in enumerate(AREA_RANGES.values()):
+            num_gt = int(np.count_nonzero((m["gt_area"] >= lo) & (m["gt_area"] <= hi)))
+            if num_gt == 0:
+                continue
+            dt_in_range = (m["dt_area"] >= lo) & (m["dt_area"] <= hi)
+            with np.errstate(invalid='ignore'):
+                match_in_range = (m["matched_area"] >= lo) & (m["matched_area"] <= hi)
+            # 매칭된 예측은 GT가 범위 안일 때만, 매칭되지 않은 예측은 자기 면적이 범위 안일 때만 집계
+            # crowd/ignore GT에 매칭된 예측은 어느 범위에서도 집계하지 않음
+            counted = np.where(matched, match_in_range, dt_in_range[None, :]) & ~m["dt_ignore"]
+            tp_all = matched & counted
+            fp_all = ~matched & counted
+
+            for mi, max_det in enumerate(MAX_DETS):
+                selected = m["rank"] < max_det
+                num_dt = int(np.count_nonzero(selected))
+                if num_dt == 0:
+                    recall[:, k, a, mi] = 0
+                    precision[:, :, k, a, mi] = 0
+                    continue
+                tp = np.cumsum(tp_all[:, selected], axis=1, dtype=np.float64)
+                fp = np.cumsum(fp_all[:, selected], axis=1, dtype=np.float64)
+                rc = tp / num_gt
+                pr = tp / (fp + tp + np.spacing(1))
+                recall[:, k, a, mi] = rc[:, -1]
+                # precision envelope (오른쪽에서 누적 최댓값) 후 101개 recall 지점에서 샘플링
+                pr = np.maximum.accumulate(pr[:, ::-1], axis=1)[:, ::-1]
+                for t in range(num_t):
+                    inds = np.searchsorted(rc[t], RECALL_THRESHOLDS, side='left')
+                    q = np.zeros(num_r)
+                    valid = inds < num_dt
+                    q[valid] = pr[t, inds[valid]]
+                    precision[t, :, k, a, mi] = q
+    return precision, recall
+
+
+def summarize(precision, recall):
+    """accumulate() 결과에서 12개 요약 지표를 계산합니다. (값이 없으면 -1)"""
+    stats = {}
+    for name, kind, iou_thr, area, max_det in SUMMARY_METRICS:
+        a = AREA_NAMES.index(area)
+        mi = MAX_DETS.index(max_det)
+        if kind == "precision":
+            values = precision[:, :, :, a, mi]
+        else:
+            values = recall[:, :, a, mi]
+        if iou_thr is not None:
+            values = values[np.isclose(IOU_THRESHOLDS, iou_thr)]
+        values = values[values > -1]
+        stats[name] = float(np.mean(values)) if values.size else -1.0
+    return stats
+
+
+def format_summary(stats):
+    """pycocotools와 같은 형식의 요약 문자열을 만듭니다."""
+    lines = []
+    for name, kind, iou_thr, area, max_det in SUMMARY_METRICS:
+        title = "Average Precision" if kind == "precision" else "Average Recall"
+        short = "(AP)" if kind == "precision" else "(AR)"
+        iou_text = "0.50:0.95" if iou_thr is None else f"{iou_thr:0.2f}"
+        lines.append(f" {title:<18} {short} @[ IoU={iou_text:<9} | area={area:>6} | maxDets={max_det:>3} ] = {stats[name]:0.3f}")
+    return "\n".join(lines)
+
+
+def evaluate_coco(gt_annotations, pred_annotations, categories, image_ids=None, workers=None, parallel_min_images=2000):
+    """
+    COCO 표준 12개 요약 지표를 계산합니다. 매칭은 이미지/클래스마다 한 번만 수행합니다.
+
+    Args:
+        gt_annotations (dict): image_id -> GT annotation 리스트.
+        pred_annotations (Mapping): image_id -> 예측 리스트 (dict 또는 PredictionStore).
+        categories (dict): 평가할 카테고리 정보.
+        image_ids (iterable, optional): 평가할 이미지 ID. None이면 GT와 예측에 등장하는 모든 이미지.
+        workers (int, optional): 프로세스 수. None이면 이미지 수가 parallel_min_images 이상일 때 CPU 수만큼 사용.
+
+    Returns:
+        dict: {"stats": {지표 이름: 값}, "precision": [T, R, K, A, M], "recall": [T, K, A, M], "category_ids": [...]}
+    """
+    if not categories:
+        print("오류: 카테고리 정보가 없습니다.")
+        return None
+    if image_ids is None:
+        image_ids = set(gt_annotations or {}) | set(pred_annotations or {})
+    image_ids = list(image_ids)
+    category_ids = sorted(categories.keys())
+    category_set = frozenset(category_ids)
+
+    if workers is None:
+        workers = (os.cpu_count() or 1) if len(image_ids) >= parallel_min_images else 1
+
+    init_args = (gt_annotations, pred_annotations, category_set)
+    if workers <= 1:
+        _init_coco_worker(*init_args)
+        partials = [_match_image_chunk(image_ids)]
+    else:
+        chunk_size = max(1, len(image_ids) // (workers * 4))
+        chunks = [image_ids[i:i + chunk_size] for i in range(0, len(image_ids), chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_coco_worker, initargs=init_args) as executor:
+            partials = list(executor.map(_match_image_chunk, chunks))
+
+    matches = _merge_partials(partials, category_ids)
+    precision, recall = accumulate(matches, category_ids)
+    return {
+        "stats": summarize(precision, recall),
+        "precision": precision,
+        "recall": recall,
+        "category_ids": category_ids,
+    }
@@ -0,0 +1,200 @@
+# confusion_matrix.py
+"""
+데이터셋 전체의 클래스 간 혼동 행렬.
+
+이미지마다 예측(score 내림차순)과 모든 클래스의 GT 사이 IoU를 iou_candidates로 한 번 계산하고 두 단계로 매칭합니다.
+    1. 같은 클래스: MATCH_VOC 규칙 (evaluate_dataset의 TP와 같으므로 대각 성분 합 = TP 수)
+    2. 다른 클래스: 1에서 남은 예측과 GT를 IoU가 큰 쌍부터 greedy로 1:1 매칭 (클래스 혼동)
+매칭되지 않은 예측은 background 행(FP), 매칭되지 않은 GT는 background 열(missed)에 셉니다.
+같은 클래스의 crowd/ignore 영역에 떨어진 예측은 evaluate_dataset과 같이 세지 않습니다.
+
+행렬은 [C+1, C+1] 크기이며 matrix[GT 클래스, 예측 클래스] 순서이고, 마지막 인덱스가 background 입니다.
+각 매칭 쌍의 (GT 인덱스, 예측 인덱스, 이미지)를 함께 반환하므로 칸별로 해당하는 이미지를 바로 찾을 수 있습니다.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import map_calculator
+import profiling
+
+
+def match_image_any_class(gt_annotations_img, pred_annotations_img, label_ids, iou_threshold=0.5, conf_threshold=0.0):
+    """
+    이미지 하나의 예측과 GT를 클래스와 무관하게 매칭하여 혼동 행렬의 (GT 인덱스, 예측 인덱스) 쌍을 만듭니다.
+
+    Args:
+        label_ids (np.ndarray): 정렬된 category_id 배열. 행렬 인덱스는 이 배열에서의 위치이고 len(label_ids)가 background.
+
+    Returns:
+        np.ndarray: [K] GT 쪽 행렬 인덱스 (background면 len(label_ids)).
+        np.ndarray: [K] 예측 쪽 행렬 인덱스 (background면 len(label_ids)).
+    """
+    background = len(label_ids)
+    label_set = set(label_ids.tolist())
+    preds = [p for p in pred_annotations_img if p['score'] >= conf_threshold and p['category_id'] in label_set]
+    preds.sort(key=lambda p: -p['score'])
+    gts = [g for g in gt_annotations_img if g['category_id'] in label_set]
+    regular, ignored = map_calculator.split_ignored(gts)
+
+    pred_label = np.searchsorted(label_ids, [p['category_id'] for p in preds]).astype(np.int64)
+    gt_label = np.searchsorted(label_ids, [g['category_id'] for g in regular]).astype(np.int64)
+    pred_boxes = np.array([p['bbox'] for p in preds], dtype=np.float64).reshape(-1, 4)
+    gt_boxes = np.array([g['bbox'] for g in regular], dtype=np.float64).reshape(-1, 4)
+
+    pred_match = np.full(len(preds), -1, dtype=np.int64)
+    gt_taken = np.zeros(len(regular), dtype=bool)
+    if len(preds) and len(regular):
+        rows, cols, ious = map_calculator.iou_candidates(pred_boxes, gt_boxes, iou_threshold)
+        # row 오름차순, 같은 row에서는 IoU 내림차순 (같은 IoU는 앞선 column 우선, match_boxes와 동일)
+        order = np.lexsort((cols, -ious, rows))
+        rows, cols, ious = rows[order], cols[order], ious[order]
+        same = pred_label[rows] == gt_label[cols]
+
+        # 1) 같은 클래스: 예측마다 IoU가 가장 큰 GT를 고르고, 같은 GT를 고른 예측 중 가장 앞선 것만 매칭 (MATCH_VOC)
+        same_rows, same_cols = rows[same], cols[same]
+        first_of_row = np.ones(len(same_rows), dtype=bool)
+        first_of_row[1:] = same_rows[1:] != same_rows[:-1]
+        best_rows, best_cols = same_rows[first_of_row], same_cols[first_of_row]
+        _, first = np.unique(best_cols, return_index=True)
+        pred_match[best_rows[first]] = best_cols[first]
+        gt_taken[best_cols[first]] = True
+
+        # 2) 다른 클래스: 남은 예측/GT 쌍을 IoU 내림차순으로 훑으며 greedy 1:1 매칭
+        cross = ~same & (pred_match[rows] < 0) & ~gt_taken[cols]
+        cross_rows, cross_cols, cross_ious = rows[cross], cols[cross], ious[cross]
+        for idx in np.lexsort((cross_cols, cross_rows, -cross_ious)).tolist():
+            row, col = cross_rows[idx], cross_cols[idx]
+            if pred_match[row] < 0 and not gt_taken[col]:
+                pred_match[row] = col
+                gt_taken[col] = True
+
+    # 매칭되지 않은 예측 중 같은 클래스 ignore 영역에 떨어진 것은 집계에서 제외
+    counted = np.ones(len(preds), dtype=bool)
+    if ignored:
+        unmatched = np.flatnonzero(pred_match < 0)
+        ignored_label = np.searchsorted(label_ids, [g['category_id'] for g in ignored])
+        for label in np.unique(pred_label[unmatched]).tolist():
+            region = np.flatnonzero(ignored_label == label)
+            if not len(region):
+                continue
+            rows = unmatched[pred_label[unmatched] == label]
+            hits = map_calculator.ignore_region_hits(
+                pred_boxes[rows], [ignored[i]['bbox'] for i in region],
+                [bool(ignored[i].get('iscrowd', 0)) for i in region], iou_threshold
+            )
+            counted[rows[hits]] = False
+
+    matched = pred_match >= 0
+    unmatched_preds = ~matched & counted
+    gt_index = np.concatenate((
+        gt_label[pred_match[matched]],                       # 매칭된 쌍
+        np.full(np.count_nonzero(unmatched_preds), background), # FP (background GT)
+        gt_label[~gt_taken],                                 # missed GT
+    ))
+    pred_index = np.concatenate((
+        pred_label[matched],
+        pred_label[unmatched_preds],
+        np.full(np.count_nonzero(~gt_taken), background),
+    ))
+    return gt_index.astype(np.int64), pred_index.astype(np.int64)
+
+
+_CONFUSION_CONTEXT = {}
+
+def _init_confusion_worker(gt_annotations, pred_annotations, label_ids, iou_threshold, conf_threshold):
+    _CONFUSION_CONTEXT.update(
+        gt_annotations=gt_annotations, pred_annotations=pred_annotations, label_ids=label_ids,
+        iou_threshold=iou_threshold, conf_threshold=conf_threshold
+    )
+
+@profiling.profiled("confusion_chunk")
+def _confusion_image_chunk(chunk):
+    """(image_index, image_id) 묶음의 부분 행렬과 매칭 쌍을 계산합니다."""
+    ctx = _CONFUSION_CONTEXT
+    label_ids = ctx["label_ids"]
+    size = len(label_ids) + 1
+    gt_parts, pred_parts, image_parts = [], [], []
+    for image_index, image_id in chunk:
+        gt_img = ctx["gt_annotations"].get(image_id, []) if ctx["gt_annotations"] else []
+        pred_img = ctx["pred_annotations"].get(image_id, []) if ctx["pred_annotations"] else []
+        if not gt_img and not pred_img:
+            continue
+        gt_index, pred_index = match_image_any_class(gt_img, pred_img, label_ids,
+                                                     ctx["iou_threshold"], ctx["conf_threshold"])
+        gt_parts.append(gt_index)
+        pred_parts.append(pred_index)
+        image_parts.append(np.full(len(gt_index), image_index, dtype=np.int64))
+
+    gt_index = np.concatenate(gt_parts) if gt_parts else np.zeros(0, dtype=np.int64)
+    pred_index = np.concatenate(pred_parts) if pred_parts else np.zeros(0, dtype=np.int64)
+    image_index = np.concatenate(image_parts) if image_parts else np.zeros(0, dtype=np.int64)
+    matrix = np.zeros((size, size), dtype=np.int64)
+    np.add.at(matrix, (gt_index, pred_index), 1)
+    return matrix, gt_index, pred_index, image_index
+
+
+def compute_confusion_matrix(gt_annotations, pred_annotations, categories, iou_threshold=0.5, conf_threshold=0.0,
+                             image_ids=None, workers=None, parallel_min_images=2000):
+    """
+    데이터셋 전체의 혼동 행렬을 계산합니다.
+
+    Args:
+        gt_annotations (dict): image_id -> GT annotation 리스트.
+        pred_annotations (Mapping): image_id -> 예측 리스트 (dict 또는 PredictionStore).
+        categories (dict): 행렬에 포함할 카테고리 정보.
+        iou_threshold (float): 매칭으로 인정하는 최소 IoU.
+        conf_threshold (float): 이 값 미만의 예측은 제외합니다.
+        image_ids (iterable, optional): 대상 이미지 ID. None이면 GT와 예측에 등장하는 모든 이미지.
+        workers (int, optional): 프로세스 수. None이면 이미지 수가 parallel_min_images 이상일 때 CPU 수만큼 사용.
+
+    Returns:
+        dict: {
+            "matrix": [C+1, C+1] 개수 행렬 (matrix[GT 클래스, 예측 클래스], 마지막 인덱스는 background),
+            "labels": 행렬 인덱스별 category_id 리스트 (마지막은 None = background),
+            "image_ids": 대상 이미지 ID 리스트,
+            "gt_index", "pred_index", "image_index": 매칭 쌍별 행렬 인덱스와 image_ids에서의 위치,
+        }
+        카테고리 정보가 없으면 None.
+    """
+    if not categories:
+        print("오류: 카테고리 정보가 없습니다.")
+        return None
+    if image_ids is None:
+        image_ids = set(gt_annotations or {}) | set(pred_annotations or {})
+    image_ids = list(image_ids)
+    label_ids = np.array(sorted(categories.keys()), dtype=np.int64)
+    indexed_ids = list(enumerate(image_ids))
+
+    if workers is None:
+        workers = (os.cpu_count() or 1) if len(image_ids) >= parallel_min_images else 1
+
+    init_args = (gt_annotations, pred_annotations, label_ids, iou_threshold, conf_threshold)
+    if workers <= 1:
+        _init_confusion_worker(*init_args)
+        partials = [_confusion_image_chunk(indexed_ids)]
+    else:
+        chunk_size = max(1, len(indexed_ids) // (workers * 4))
+        chunks = [indexed_ids[i:i + chunk_size] for i in range(0, len(indexed_ids), chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_confusion_worker, initargs=init_args) as executor:
+            partials = list(executor.map(_confusion_image_chunk, chunks))
+
+    return {
+        "matrix": sum(p[0] for p in partials),
+        "labels": label_ids.tolist() + [None],
+        "image_ids": image_ids,
+        "gt_index": np.concatenate([p[1] for p in partials]),
+        "pred_index": np.concatenate([p[2] for p in partials]),
+        "image_index": np.concatenate([p[3] for p in partials]),
+        "iou_threshold": iou_threshold,
+        "conf_threshold": conf_threshold,
+    }
+
+
+def cell_image_ids(result, gt_index, pred_index):
+    """혼동 행렬의 한 칸(GT 인덱스, 예측 인덱스)에 해당하는 이미지 ID를 (등장 횟수 내림차순으로) 반환합니다."""
+    mask = (result["gt_index"] == gt_index) & (result["pred_index"] == pred_index)
+    positions, counts = np.unique(result["image_index"][mask], return_counts=True)
+    positions = positions[np.argsort(-counts, kind='stable')]
+    return [result["image_ids"][i] for i in positions.tolist()]
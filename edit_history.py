@@ -0,0 +1,88 @@
+# edit_history.py
+from collections import deque
+
+DEFAULT_MAX_ENTRIES = 10000 # 기본 메모리 예산 (편집 기록 개수 기준)
+
+
+class EditRecord:
+    """
+    단일 예측 편집에 대한 compact diff.
+    bbox는 float 4개짜리 tuple로 저장하고, 변경되지 않은 필드는 old == new로 둡니다.
+    """
+    __slots__ = ("image_id", "index", "old_bbox", "new_bbox", "old_category_id", "new_category_id")
+
+    def __init__(self, image_id, index, old_bbox, new_bbox, old_category_id, new_category_id):
+        self.image_id = image_id
+        self.index = index
+        self.old_bbox = tuple(old_bbox)
+        self.new_bbox = tuple(new_bbox)
+        self.old_category_id = old_category_id
+        self.new_category_id = new_category_id
+
+    def is_noop(self):
+        return self.old_bbox == self.new_bbox and self.old_category_id == self.new_category_id
+
+    def __repr__(self):
+        return (f"EditRecord(image_id={self.image_id}, index={self.index}, "
+                f"bbox={self.old_bbox}->{self.new_bbox}, "
+                f"category_id={self.old_category_id}->{self.new_category_id})")
+
+
+class EditHistory:
+    """
+    예측 편집의 Undo/Redo 스택.
+    - 편집마다 EditRecord(diff) 하나만 저장하므로 이미지 전체를 다시 로드하지 않고 O(1)로 되돌릴 수 있습니다.
+    - max_entries를 넘으면 가장 오래된 기록부터 버립니다. (메모리 예산 제한)
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._undo_stack = deque(maxlen=max_entries)
+        self._redo_stack = deque(maxlen=max_entries)
+
+    def record(self, image_id, index, old_annotation, new_annotation):
+        """편집 전/후 예측으로 diff를 만들어 기록합니다. 변경이 없으면 기록하지 않습니다."""
+        entry = EditRecord(
+            image_id, index,
+            old_annotation['bbox'], new_annotation['bbox'],
+            old_annotation['category_id'], new_annotation['category_id']
+        )
+        if entry.is_noop():
+            return None
+        self._undo_stack.append(entry)
+        self._redo_stack.clear() # 새 편집이 들어오면 redo 기록은 무효
+        return entry
+
+    def undo(self):
+        """가장 최근 편집을 꺼내 반환합니다. 호출자는 old_* 값을 적용해야 합니다."""
+        if not self._undo_stack:
+            return None
+        entry = self._undo_stack.pop()
+        self._redo_stack.append(entry)
+        return entry
+
+    def redo(self):
+        """가장 최근에 되돌린 편집을 꺼내 반환합니다. 호출자는 new_* 값을 적용해야 합니다."""
+        if not self._redo_stack:
+            return None
+        entry = self._redo_stack.pop()
+        self._undo_stack.append(entry)
+        return entry
+
+    def can_undo(self):
+        return bool(self._undo_stack)
+
+    def can_redo(self):
+        return bool(self._redo_stack)
+
+    def discard_image(self, image_id):
+        """특정 이미지의 기록을 제거합니다. (해당 이미지를 reset 했을 때 사용)"""
+        self._undo_stack = deque((e for e in self._undo_stack if e.image_id != image_id), maxlen=self.max_entries)
+        self._redo_stack = deque((e for e in self._redo_stack if e.image_id != image_id), maxlen=self.max_entries)
+
+    def clear(self):
+        self._undo_stack.clear()
+        self._redo_stack.clear()
+
+    def __len__(self):
+        return len(self._undo_stack)
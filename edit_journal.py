@@ -0,0 +1,165 @@
+# edit_journal.py
+import json
+import os
+import time
+
+import results_writer
+
+JOURNAL_SUFFIX = ".journal"
+
+
+def journal_path_for(predictions_path):
+    """예측 파일 경로에 대응하는 편집 저널 경로를 반환합니다."""
+    return predictions_path + JOURNAL_SUFFIX
+
+
+class EditJournal:
+    """
+    예측 편집을 한 줄씩(JSON Lines) 즉시 기록하는 append-only 저널.
+
+    - 편집이 일어날 때마다 한 줄을 추가하고 flush + fsync 하므로, 프로그램이 비정상 종료되어도 작업이 남습니다.
+    - 첫 줄은 원본 예측 파일 정보(header)이며, 이후 줄은 "set"(bbox/category_id 절대값) 또는 "reset" 기록입니다.
+    - replay()로 PredictionStore에 다시 적용하고, compact()로 전체 결과 파일에 병합합니다. (원본 파일에 덮어쓸 때만 저널을 비움)
+    """
+
+    def __init__(self, path, source_path=None, prediction_count=None):
+        self.path = path
+        self.source_path = source_path
+        self.prediction_count = prediction_count
+        self._file = None
+
+    # --- 기록 ---
+    def open(self):
+        """저널을 append 모드로 엽니다. 비어 있으면 header를 먼저 씁니다."""
+        if self._file is not None:
+            return
+        is_new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        ends_with_newline = True
+        if not is_new:
+            with open(self.path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                ends_with_newline = f.read(1) == b"\n"
+        self._file = open(self.path, 'a', encoding='utf-8')
+        if is_new:
+            self._write_line(self._header())
+        elif not ends_with_newline:
+            # 비정상 종료로 잘린 줄 뒤에 새 기록이 이어 붙지 않도록 줄을 끊음
+            self._file.write("\n")
+
+    def _header(self):
+        return {
+            "op": "header",
+            "source": os.path.basename(self.source_path) if self.source_path else None,
+            "count": self.prediction_count,
+            "created": time.time(),
+        }
+
+    def _write_line(self, entry):
+        if self._file is None:
+            self.open()
+        self._file.write(json.dumps(entry, separators=(',', ':')) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def record_edit(self, image_id, index, bbox, category_id):
+        self._write_line({
+            "op": "set",
+            "image_id": image_id,
+            "index": index,
+            "bbox": [float(c) for c in bbox],
+            "category_id": category_id,
+        })
+
+    def record_reset(self, image_id):
+        self._write_line({"op": "reset", "image_id": image_id})
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    # --- 복원 ---
+    def has_entries(self):
+        """header 외에 기록된 편집이 있는지 확인합니다."""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, 'r', encoding='utf-8') as f:
+            f.readline() # header
+            return any(line.strip() for line in f)
+
+    def replay(self, store):
+        """
+        저널의 편집 기록을 순서대로 store에 다시 적용합니다.
+
+        Returns:
+            int: 적용된 기록 수. 저널이 다른 예측 파일의 것이면 -1.
+        """
+        if not os.path.exists(self.path):
+            return 0
+        applied = 0
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # 기록 도중 종료되어 잘린 마지막 줄은 무시
+                    print(f"경고: 저널 {line_no + 1}번째 줄을 읽을 수 없어 건너뜁니다.")
+                    continue
+
+                op = entry.get("op")
+                if op == "header":
+                    count = entry.get("count")
+                    if count is not None and self.prediction_count is not None and count != self.prediction_count:
+                        print(f"오류: 저널의 예측 수({count})가 현재 예측 수({self.prediction_count})와 다릅니다.")
+                        return -1
+                elif op == "set":
+                    try:
+                        store.apply_edit(entry["image_id"], entry["index"], bbox=entry["bbox"], category_id=entry["category_id"])
+                        applied += 1
+                    except (KeyError, IndexError) as e:
+                        print(f"경고: 저널 {line_no + 1}번째 기록을 적용할 수 없습니다 - {e}")
+                elif op == "reset":
+                    store.reset(entry["image_id"])
+                    applied += 1
+        return applied
+
+    # --- 병합 ---
+    def compact(self, store, output_path, progress_callback=None):
+        """
+        현재 store(저널이 반영된 상태)를 전체 결과 파일로 스트리밍 저장하고, 원본 예측 파일에 덮어쓴 경우에만 저널을 비웁니다.
+        다른 경로에 저장하면 store는 여전히 원본 파일 기준으로 편집을 들고 있으므로, 저널을 비우면
+        저장 이후의 편집만 남아 저장 전 편집이 어느 파일에도 함께 남지 않게 됩니다. 이 경우 저널은 그대로 둡니다.
+        결과 파일 쓰기가 실패해도 저널은 그대로 남습니다.
+
+        Returns:
+            bool: 저널을 비웠으면 True.
+        """
+        results_writer.write_results(
+            store.iter_predictions(), output_path,
+            total=store.count_predictions(), progress_callback=progress_callback
+        )
+        if not self.is_source(output_path):
+            return False
+        self.truncate()
+        return True
+
+    def is_source(self, path):
+        """path가 이 저널의 원본 예측 파일인지 확인합니다."""
+        if not self.source_path:
+            return False
+        try:
+            return os.path.samefile(path, self.source_path)
+        except OSError:
+            return os.path.realpath(path) == os.path.realpath(self.source_path)
+
+    def truncate(self):
+        """저널을 비우고 header만 다시 씁니다."""
+        self.close()
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(self._header(), separators=(',', ':')) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.open()
@@ -0,0 +1,328 @@
+# error_analysis.py
+"""
+TIDE 방식의 오류 유형 분석.
+
+이미지마다 예측 x GT의 클래스 구분 없는 IoU 행렬을 한 번 계산하고, FP 예측을 다음 중 하나로 분류합니다.
+(판정 순서도 TIDE와 같음, t_f = iou_threshold, t_b = background_threshold)
+
+    bkg   : 모든 GT와 IoU < t_b (배경을 검출)
+    loc   : 같은 클래스 GT와 t_b <= IoU < t_f (위치 오류)
+    cls   : 다른 클래스 GT와 IoU >= t_f (분류 오류)
+    dupe  : 같은 클래스 GT와 IoU >= t_f 이지만 그 GT는 더 높은 score의 예측이 이미 매칭 (중복)
+    both  : 다른 클래스 GT와 t_b <= IoU < t_f (위치 + 분류 오류)
+    missed: 어떤 예측과도 매칭되지 않고 loc/cls 오류의 대상도 아닌 GT
+
+TP 판정은 map_calculator.evaluate_dataset과 같은 규칙(MATCH_VOC, crowd/ignore 영역에 떨어진 예측 제외)이므로
+기본 mAP는 evaluate_dataset 결과와 같습니다. 각 오류 유형을 "고쳤을 때"의 mAP 증가량(dAP)은 매칭을 다시 하지 않고
+분류 결과 배열에 mask/재배치만 적용하여 계산합니다.
+    bkg, dupe, both: 해당 예측 제거
+    loc, cls: 대상 GT가 아직 매칭되지 않았으면 (대상별로 score가 가장 높은 예측 하나를) TP로, 나머지는 제거.
+              cls는 대상 GT의 클래스로 옮겨서 계산
+    missed: 해당 GT를 GT 개수에서 제외
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import map_calculator
+import profiling
+
+BACKGROUND_IOU = 0.1
+
+ERROR_TYPES = ("cls", "loc", "both", "dupe", "bkg", "missed")
+
+# 예측 분류 코드
+PRED_TP = 0
+PRED_CLS = 1
+PRED_LOC = 2
+PRED_BOTH = 3
+PRED_DUPE = 4
+PRED_BKG = 5
+PRED_IGNORED = 6 # crowd/ignore 영역에 떨어져 평가에서 제외된 예측
+_TYPE_CODES = {"cls": PRED_CLS, "loc": PRED_LOC, "both": PRED_BOTH, "dupe": PRED_DUPE, "bkg": PRED_BKG}
+
+
+def classify_image(gt_annotations_img, pred_annotations_img, category_ids, iou_threshold=0.5, conf_threshold=0.0,
+                   background_threshold=BACKGROUND_IOU):
+    """
+    이미지 하나의 예측과 GT를 분류합니다.
+
+    Returns:
+        dict: {
+            "pred_category", "pred_score": score 내림차순 예측 배열,
+            "pred_type": 예측 분류 코드 (PRED_*),
+            "pred_target": TP면 매칭된 GT, cls/loc면 대상 GT의 이미지 내 인덱스 (그 외 -1),
+            "gt_category": 일반 GT(crowd/ignore 제외)의 클래스,
+            "gt_missed": missed GT 여부,
+        }
+    """
+    preds = [p for p in pred_annotations_img if p['score'] >= conf_threshold and p['category_id'] in category_ids]
+    gts = [g for g in gt_annotations_img if g['category_id'] in category_ids]
+    regular, ignored = map_calculator.split_ignored(gts)
+
+    scores = np.array([p['score'] for p in preds], dtype=np.float64)
+    order = np.argsort(-scores, kind='stable')
+    scores = scores[order]
+    pred_cat = np.array([preds[i]['category_id'] for i in order], dtype=np.int64)
+    pred_boxes = np.array([preds[i]['bbox'] for i in order], dtype=np.float64).reshape(-1, 4)
+    gt_cat = np.array([g['category_id'] for g in regular], dtype=np.int64)
+    gt_boxes = np.array([g['bbox'] for g in regular], dtype=np.float64).reshape(-1, 4)
+
+    num_pred, num_gt = len(scores), len(gt_cat)
+    pred_type = np.full(num_pred, PRED_BKG, dtype=np.int8)
+    pred_target = np.full(num_pred, -1, dtype=np.int64)
+    gt_missed = np.ones(num_gt, dtype=bool)
+
+    if num_pred and num_gt:
+        ious = map_calculator.box_iou_matrix(pred_boxes, gt_boxes) # [P, G], 클래스 구분 없이 한 번만 계산
+        same = pred_cat[:, None] == gt_cat[None, :]
+        same_iou = np.where(same, ious, 0.)
+        other_iou = np.where(same, 0., ious)
+        same_best = np.argmax(same_iou, axis=1) # 같은 IoU면 앞쪽 GT (MATCH_VOC와 동일)
+        other_best = np.argmax(other_iou, axis=1)
+        rows = np.arange(num_pred)
+        same_max = same_iou[rows, same_best]
+        other_max = other_iou[rows, other_best]
+
+        # TP: 같은 클래스에서 IoU가 가장 큰 GT가 임계값 이상이고, score 순서상 그 GT를 처음 고른 예측
+        candidate = np.flatnonzero((same_max >= iou_threshold) & (same_max > 0))
+        _, first = np.unique(same_best[candidate], return_index=True)
+        tp_rows = candidate[first]
+        is_tp = np.zeros(num_pred, dtype=bool)
+        is_tp[tp_rows] = True
+
+        # TIDE 판정 순서: bkg -> cls -> dupe -> loc -> both
+        all_max = np.maximum(same_max, other_max)
+        pred_type = np.select(
+            [is_tp,
+             all_max < background_threshold,
+             other_max >= iou_threshold,
+             same_max >= iou_threshold,
+             same_max >= background_threshold],
+            [PRED_TP, PRED_BKG, PRED_CLS, PRED_DUPE, PRED_LOC],
+            default=PRED_BOTH
+        ).astype(np.int8)
+
+        pred_target = np.where(pred_type == PRED_CLS, other_best, -1)
+        pred_target = np.where((pred_type == PRED_TP) | (pred_type == PRED_LOC), same_best, pred_target)
+
+        # missed: 매칭되지 않았고 loc/cls 오류의 대상도 아닌 GT
+        covered = pred_target[pred_target >= 0]
+        gt_missed[covered] = False
+
+    if num_pred and ignored:
+        # TP가 아닌 예측 중 같은 클래스의 crowd/ignore 영역에 떨어진 예측은 평가에서 제외 (evaluate_dataset과 동일)
+        for cat_id in np.unique(pred_cat[pred_type != PRED_TP]):
+            ignore_anns = [g for g in ignored if g['category_id'] == cat_id]
+            if not ignore_anns:
+                continue
+            rows = np.flatnonzero((pred_cat == cat_id) & (pred_type != PRED_TP))
+            hits = map_calculator.ignore_region_hits(
+                pred_boxes[rows], [g['bbox'] for g in ignore_anns],
+                [bool(g.get('iscrowd', 0)) for g in ignore_anns], iou_threshold
+            )
+            pred_type[rows[hits]] = PRED_IGNORED
+            pred_target[rows[hits]] = -1
+        if num_gt:
+            gt_missed[:] = True
+            gt_missed[pred_target[pred_target >= 0]] = False
+
+    return {
+        "pred_category": pred_cat,
+        "pred_score": scores,
+        "pred_type": pred_type,
+        "pred_target": pred_target,
+        "gt_category": gt_cat,
+        "gt_missed": gt_missed,
+    }
+
+
+_ERROR_CONTEXT = {}
+
+def _init_error_worker(gt_annotations, pred_annotations, category_ids, iou_threshold, conf_threshold, background_threshold):
+    _ERROR_CONTEXT.update(
+        gt_annotations=gt_annotations, pred_annotations=pred_annotations, category_ids=category_ids,
+        iou_threshold=iou_threshold, conf_threshold=conf_threshold, background_threshold=background_threshold
+    )
+
+@profiling.profiled("error_chunk")
+def _classify_image_chunk(image_ids):
+    """이미지 묶음을 분류하여 배열을 이어 붙입니다. pred_target은 묶음 안에서의 GT 인덱스로 바꿉니다."""
+    ctx = _ERROR_CONTEXT
+    parts = []
+    gt_offset = 0
+    for image_id in image_ids:
+        gt_img = ctx["gt_annotations"].get(image_id, []) if ctx["gt_annotations"] else []
+        pred_img = ctx["pred_annotations"].get(image_id, []) if ctx["pred_annotations"] else []
+        if not gt_img and not pred_img:
+            continue
+        result = classify_image(gt_img, pred_img, ctx["category_ids"], ctx["iou_threshold"],
+                                ctx["conf_threshold"], ctx["background_threshold"])
+        result["pred_target"] = np.where(result["pred_target"] >= 0, result["pred_target"] + gt_offset, -1)
+        gt_offset += len(result["gt_category"])
+        parts.append(result)
+    return _concat_results(parts)
+
+
+def _concat_results(parts):
+    """classify_image 결과들을 이어 붙입니다. (각 part의 pred_target은 이미 이어 붙인 GT 기준 인덱스여야 함)"""
+    keys = ("pred_category", "pred_score", "pred_type", "pred_target", "gt_category", "gt_missed")
+    dtypes = (np.int64, np.float64, np.int8, np.int64, np.int64, bool)
+    return {key: np.concatenate([p[key] for p in parts]) if parts else np.zeros(0, dtype=dtype)
+            for key, dtype in zip(keys, dtypes)}
+
+
+def _merge_chunks(chunks):
+    """worker 결과를 합치면서 pred_target을 전체 GT 기준 인덱스로 바꿉니다."""
+    gt_offset = 0
+    for chunk in chunks:
+        chunk["pred_target"] = np.where(chunk["pred_target"] >= 0, chunk["pred_target"] + gt_offset, -1)
+        gt_offset += len(chunk["gt_category"])
+    return _concat_results(chunks)
+
+
+def _mean_ap(category, score, tp, num_gt_by_class, class_ids):
+    """클래스별로 score 내림차순 정렬한 TP 배열로 AP를 구해 평균합니다. (evaluate_dataset과 같은 계산)"""
+    order = np.lexsort((-score, category)) # 클래스별로 묶고, 클래스 안에서 score 내림차순 (같은 score는 원래 순서)
+    category, tp = category[order], tp[order]
+    starts = np.searchsorted(category, class_ids, side='left')
+    ends = np.searchsorted(category, class_ids, side='right')
+    aps = [map_calculator._ap_from_matches(None, tp[start:end], num_gt_by_class.get(cat_id, 0))
+           for cat_id, start, end in zip(class_ids, starts, ends)]
+    return float(np.mean(aps)) if aps else 0.0
+
+
+def _fix_targets(pred_type, pred_target, code, gt_matched):
+    """
+    loc/cls 오류를 고칠 때 TP가 되는 예측을 고릅니다.
+    대상 GT가 아직 매칭되지 않았으면 그 GT를 대상으로 하는 예측 중 score가 가장 높은(배열에서 가장 앞선) 하나만 TP.
+
+    Returns:
+        np.ndarray: TP가 되는 예측 인덱스 (score 순서로 정렬된 배열 기준)
+    """
+    rows = np.flatnonzero(pred_type == code)
+    rows = rows[~gt_matched[pred_target[rows]]]
+    _, first = np.unique(pred_target[rows], return_index=True)
+    return rows[first]
+
+
+def error_breakdown(classified, category_ids=None):
+    """
+    분류 결과(classify_image 결과를 합친 배열)로 오류 유형별 개수와 dAP를 계산합니다.
+
+    Returns:
+        dict: {"map", "counts": {유형: 개수}, "delta_ap": {유형: mAP 증가량}, "num_tp", "num_gt", "num_predictions"}
+    """
+    # 전체 예측을 score 내림차순으로 한 번 정렬 (같은 score는 이미지 순서 유지 -> 이미지 안의 순서도 유지)
+    order = np.argsort(-classified["pred_score"], kind='stable')
+    category = classified["pred_category"][order]
+    score = classified["pred_score"][order]
+    pred_type = classified["pred_type"][order]
+    pred_target = classified["pred_target"][order]
+    gt_category = classified["gt_category"]
+    gt_missed = classified["gt_missed"]
+
+    # evaluate_dataset과 같은 클래스 집합 (예측이나 일반 GT가 있는 클래스)
+    class_ids = np.union1d(np.unique(category), np.unique(gt_category))
+    if category_ids is not None:
+        class_ids = class_ids[np.isin(class_ids, list(category_ids))]
+    gt_cats, gt_counts = np.unique(gt_category, return_counts=True)
+    num_gt_by_class = dict(zip(gt_cats.tolist(), gt_counts.tolist()))
+
+    keep = pred_type != PRED_IGNORED
+    is_tp = pred_type == PRED_TP
+    base_map = _mean_ap(category[keep], score[keep], is_tp[keep], num_gt_by_class, class_ids)
+
+    gt_matched = np.zeros(len(gt_category), dtype=bool)
+    gt_matched[pred_target[is_tp]] = True
+
+    delta_ap = {}
+    for name in ("bkg", "dupe", "both"):
+        fixed_keep = keep & (pred_type != _TYPE_CODES[name])
+        delta_ap[name] = _mean_ap(category[fixed_keep], score[fixed_keep], is_tp[fixed_keep],
+                                  num_gt_by_class, class_ids) - base_map
+
+    for name in ("loc", "cls"):
+        code = _TYPE_CODES[name]
+        fixed_rows = _fix_targets(pred_type, pred_target, code, gt_matched)
+        fixed_tp = is_tp.copy()
+        fixed_tp[fixed_rows] = True
+        fixed_keep = keep & ((pred_type != code) | fixed_tp)
+        fixed_category = category.copy()
+        if name == "cls":
+            fixed_category[fixed_rows] = gt_category[pred_target[fixed_rows]] # 올바른 클래스로 옮김
+        delta_ap[name] = _mean_ap(fixed_category[fixed_keep], score[fixed_keep], fixed_tp[fixed_keep],
+                                  num_gt_by_class, class_ids) - base_map
+
+    missed_cats, missed_counts = np.unique(gt_category[gt_missed], return_counts=True)
+    fixed_num_gt = dict(num_gt_by_class)
+    for cat_id, count in zip(missed_cats.tolist(), missed_counts.tolist()):
+        fixed_num_gt[cat_id] -= count
+    delta_ap["missed"] = _mean_ap(category[keep], score[keep], is_tp[keep], fixed_num_gt, class_ids) - base_map
+
+    counts = {name: int(np.count_nonzero(pred_type == code)) for name, code in _TYPE_CODES.items()}
+    counts["missed"] = int(np.count_nonzero(gt_missed))
+    return {
+        "map": base_map,
+        "counts": {name: counts[name] for name in ERROR_TYPES},
+        "delta_ap": {name: float(delta_ap[name]) for name in ERROR_TYPES},
+        "num_tp": int(np.count_nonzero(is_tp)),
+        "num_gt": int(len(gt_category)),
+        "num_predictions": int(np.count_nonzero(keep)),
+    }
+
+
+def analyze_dataset(gt_annotations, pred_annotations, categories, iou_threshold=0.5, conf_threshold=0.0,
+                    image_ids=None, background_threshold=BACKGROUND_IOU, workers=None, parallel_min_images=2000):
+    """
+    데이터셋 전체의 오류 유형 분석을 수행합니다.
+
+    Args:
+        gt_annotations (dict): image_id -> GT annotation 리스트.
+        pred_annotations (Mapping): image_id -> 예측 리스트 (dict 또는 PredictionStore).
+        categories (dict): 평가할 카테고리 정보.
+        iou_threshold (float): TP 판정 IoU (TIDE의 t_f).
+        conf_threshold (float): 이 값 미만의 예측은 제외합니다.
+        image_ids (iterable, optional): 분석할 이미지 ID. None이면 GT와 예측에 등장하는 모든 이미지.
+        background_threshold (float): 배경 오류 판정 IoU (TIDE의 t_b).
+        workers (int, optional): 프로세스 수. None이면 이미지 수가 parallel_min_images 이상일 때 CPU 수만큼 사용.
+
+    Returns:
+        dict: error_breakdown() 결과. 카테고리 정보가 없으면 None.
+    """
+    if not categories:
+        print("오류: 카테고리 정보가 없습니다.")
+        return None
+    if image_ids is None:
+        image_ids = set(gt_annotations or {}) | set(pred_annotations or {})
+    image_ids = list(image_ids)
+    category_ids = frozenset(categories.keys())
+
+    if workers is None:
+        workers = (os.cpu_count() or 1) if len(image_ids) >= parallel_min_images else 1
+
+    init_args = (gt_annotations, pred_annotations, category_ids, iou_threshold, conf_threshold, background_threshold)
+    if workers <= 1:
+        _init_error_worker(*init_args)
+        chunks = [_classify_image_chunk(image_ids)]
+    else:
+        chunk_size = max(1, len(image_ids) // (workers * 4))
+        id_chunks = [image_ids[i:i + chunk_size] for i in range(0, len(image_ids), chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_error_worker, initargs=init_args) as executor:
+            chunks = list(executor.map(_classify_image_chunk, id_chunks))
+
+    return error_breakdown(_merge_chunks(chunks), category_ids)
+
+
+def format_breakdown(breakdown):
+    """오류 유형별 개수와 dAP 표 (GUI 패널/로그용)"""
+    lines = [
+        f"mAP: {breakdown['map']:.4f}   TP: {breakdown['num_tp']} / GT: {breakdown['num_gt']}"
+        f"   Predictions: {breakdown['num_predictions']}",
+        "",
+        f"{'error':<8}{'count':>8}{'dAP':>10}",
+    ]
+    for name in ERROR_TYPES:
+        lines.append(f"{name:<8}{breakdown['counts'][name]:>8}{breakdown['delta_ap'][name] * 100:>9.2f}%")
+    return "\n".join(lines)
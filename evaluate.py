@@ -0,0 +1,226 @@
+# evaluate.py
+"""
+GUI 없이 GT/예측 파일로 데이터셋 mAP를 계산하는 명령행 도구 (CI, 야간 회귀 테스트용).
+
+사용 예:
+    python evaluate.py --gt instances_val2017.json --pred predictions.json \
+        --iou 0.5 --conf 0.05 --output report.json --min-map 0.35
+    python evaluate.py --gt ... --pred ... --profile profiles/   # cProfile 기록 (worker 포함)
+    python evaluate.py --gt ... --pred ... --coco               # COCO 12개 요약 지표 추가
+    python evaluate.py --gt ... --pred ... --bootstrap 1000 --seed 0   # mAP bootstrap 95% 신뢰구간 추가
+
+종료 코드:
+    0: 평가 성공, 모든 회귀 조건 통과
+    1: 회귀 조건(--min-map, --baseline/--max-drop 등) 실패
+    2: 입력 파일 로드 실패 등 평가 불가
+"""
+import argparse
+import contextlib
+import json
+import sys
+import time
+
+import coco_loader
+import coco_metrics
+import map_calculator
+import profiling
+
+EXIT_OK = 0
+EXIT_GATE_FAILED = 1
+EXIT_ERROR = 2
+
+
+def run_evaluation(gt_path, pred_path, iou_threshold=0.5, conf_threshold=0.0, workers=None, coco=False,
+                   bootstrap_samples=0, bootstrap_seed=0):
+    """
+    GT와 예측 파일을 로드하여 데이터셋을 평가하고, JSON으로 저장 가능한 리포트를 반환합니다.
+
+    coco=True이면 COCO 12개 요약 지표(AP, AP50, AP75, APs/m/l, AR1/10/100, ARs/m/l)를 "coco_metrics"에 추가합니다.
+    bootstrap_samples > 0이면 이미지 복원 추출로 계산한 mAP 95% 신뢰구간을 "bootstrap"에 추가합니다.
+
+    Returns:
+        dict: 리포트. 파일 로드에 실패하면 None.
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    images, gt_annotations, categories = coco_loader.load_coco_annotations(gt_path)
+    timings["load_gt"] = time.perf_counter() - start
+    if images is None or categories is None:
+        return None
+
+    start = time.perf_counter()
+    predictions = coco_loader.load_predictions(pred_path)
+    timings["load_predictions"] = time.perf_counter() - start
+    if predictions is None:
+        return None
+
+    start = time.perf_counter()
+    mean_ap, class_aps, match_cache = map_calculator.evaluate_dataset(
+        gt_annotations, predictions, categories,
+        iou_threshold=iou_threshold, conf_threshold=conf_threshold,
+        image_ids=images.keys(), workers=workers
+    )
+    timings["evaluate"] = time.perf_counter() - start
+
+    bootstrap = None
+    if bootstrap_samples > 0:
+        start = time.perf_counter()
+        bootstrap = map_calculator.bootstrap_map(match_cache, num_samples=bootstrap_samples,
+                                                 seed=bootstrap_seed, workers=workers)
+        timings["bootstrap"] = time.perf_counter() - start
+
+    coco_stats = None
+    if coco:
+        start = time.perf_counter()
+        coco_result = coco_metrics.evaluate_coco(gt_annotations, predictions, categories,
+                                                 image_ids=images.keys(), workers=workers)
+        timings["evaluate_coco"] = time.perf_counter() - start
+        if coco_result is not None:
+            coco_stats = coco_result["stats"]
+            print(coco_metrics.format_summary(coco_stats))
+    timings["total"] = sum(timings.values())
+
+    per_class = []
+    for cat_id in sorted(class_aps):
+        cache = match_cache["per_class"][cat_id]
+        per_class.append({
+            "category_id": cat_id,
+            "name": categories.get(cat_id, {}).get("name", f"ID:{cat_id}"),
+            "ap": class_aps[cat_id],
+            "num_gt": cache["num_gt"],
+            "num_predictions": int(len(cache["scores"])),
+        })
+        if bootstrap is not None:
+            per_class[-1]["ap_ci"] = [bootstrap["per_class"][cat_id]["ci_low"], bootstrap["per_class"][cat_id]["ci_high"]]
+
+    report = {
+        "gt_file": gt_path,
+        "pred_file": pred_path,
+        "iou_threshold": iou_threshold,
+        "conf_threshold": conf_threshold,
+        "num_images": len(images),
+        "num_gt": sum(len(anns) for anns in gt_annotations.values()),
+        "num_predictions": sum(len(preds) for preds in predictions.values()),
+        "map": mean_ap,
+        "per_class": per_class,
+        "timings": timings,
+    }
+    if bootstrap is not None:
+        report["bootstrap"] = {key: bootstrap[key] for key in
+                               ("mean", "std", "ci_low", "ci_high", "confidence", "num_samples", "seed")}
+    if coco_stats is not None:
+        report["coco_metrics"] = coco_stats
+    return report
+
+
+def check_gates(report, min_map=None, baseline=None, max_drop=None, max_class_drop=None):
+    """
+    회귀 조건을 검사합니다.
+
+    Args:
+        report (dict): run_evaluation() 결과.
+        min_map (float, optional): 허용되는 최소 mAP.
+        baseline (dict, optional): 비교 기준 리포트 (이전 run_evaluation() 결과).
+        max_drop (float, optional): baseline 대비 허용되는 최대 mAP 감소량.
+        max_class_drop (float, optional): baseline 대비 허용되는 클래스별 최대 AP 감소량.
+
+    Returns:
+        list: 실패한 조건에 대한 메시지 목록. 비어 있으면 통과.
+    """
+    failures = []
+    if min_map is not None and report["map"] < min_map:
+        failures.append(f"mAP {report['map']:.4f} < min-map {min_map:.4f}")
+
+    if baseline is not None:
+        if max_drop is not None:
+            drop = baseline["map"] - report["map"]
+            if drop > max_drop:
+                failures.append(f"mAP dropped by {drop:.4f} (baseline {baseline['map']:.4f} -> {report['map']:.4f}, max-drop {max_drop:.4f})")
+        if max_class_drop is not None:
+            baseline_aps = {c["category_id"]: c for c in baseline.get("per_class", [])}
+            for cls in report["per_class"]:
+                base = baseline_aps.get(cls["category_id"])
+                if base is None:
+                    continue
+                drop = base["ap"] - cls["ap"]
+                if drop > max_class_drop:
+                    failures.append(f"AP of '{cls['name']}' dropped by {drop:.4f} ({base['ap']:.4f} -> {cls['ap']:.4f})")
+    return failures
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Headless COCO-style mAP evaluation.")
+    parser.add_argument("--gt", required=True, help="GT COCO annotation JSON 경로")
+    parser.add_argument("--pred", required=True, help="예측 결과 파일 경로 (.json, .json.gz, .npz)")
+    parser.add_argument("--iou", type=float, default=0.5, help="IoU 임계값 (기본값: 0.5)")
+    parser.add_argument("--conf", type=float, default=0.0, help="confidence 임계값 (기본값: 0.0)")
+    parser.add_argument("--workers", type=int, default=None, help="평가 프로세스 수 (기본값: 자동)")
+    parser.add_argument("--output", help="JSON 리포트 저장 경로 (생략 시 표준 출력)")
+    parser.add_argument("--min-map", type=float, default=None, help="이 값보다 mAP가 낮으면 실패")
+    parser.add_argument("--baseline", help="비교 기준 JSON 리포트 경로")
+    parser.add_argument("--max-drop", type=float, default=None, help="baseline 대비 허용되는 최대 mAP 감소량")
+    parser.add_argument("--max-class-drop", type=float, default=None, help="baseline 대비 허용되는 클래스별 최대 AP 감소량")
+    parser.add_argument("--coco", action="store_true", help="COCO 12개 요약 지표(IoU 0.50:0.95, area range, maxDets)도 계산")
+    parser.add_argument("--bootstrap", nargs="?", type=int, const=map_calculator.BOOTSTRAP_SAMPLES, default=0, metavar="B",
+                        help="이미지를 B번 복원 추출하여 mAP 95%% 신뢰구간 계산 (기본값: 1000, 매칭은 다시 하지 않음)")
+    parser.add_argument("--seed", type=int, default=0, help="bootstrap 난수 seed (기본값: 0)")
+    parser.add_argument("--profile", nargs="?", const=profiling.DEFAULT_PROFILE_DIR, default=None, metavar="DIR",
+                        help="평가를 cProfile로 기록하여 DIR에 저장 (기본값: ./profiles, 환경 변수 ANNOTATOR_PROFILE과 동일)")
+    return parser
+
+
+def main(argv=None):
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    if (args.max_drop is not None or args.max_class_drop is not None) and not args.baseline:
+        parser.error("--max-drop/--max-class-drop에는 --baseline이 필요합니다")
+    if args.profile:
+        profiling.enable(args.profile)
+
+    # 평가/리포트 저장 중 예기치 못한 예외도 회귀(1)가 아닌 평가 불가(2)로 종료
+    try:
+        return _run(args)
+    except Exception as e:
+        print(f"오류: 평가 중 예외가 발생했습니다 - {type(e).__name__}: {e}", file=sys.stderr)
+        return EXIT_ERROR
+
+
+def _run(args):
+    # 로더의 진행 메시지가 표준 출력의 JSON 리포트와 섞이지 않도록 stderr로 보냄
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run_evaluation(args.gt, args.pred, iou_threshold=args.iou, conf_threshold=args.conf,
+                                workers=args.workers, coco=args.coco,
+                                bootstrap_samples=args.bootstrap, bootstrap_seed=args.seed)
+    if report is None:
+        print("오류: 평가에 필요한 파일을 로드하지 못했습니다.", file=sys.stderr)
+        return EXIT_ERROR
+
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline, 'r') as f:
+                baseline = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"오류: baseline 리포트를 읽을 수 없습니다 - {e}", file=sys.stderr)
+            return EXIT_ERROR
+
+    failures = check_gates(report, min_map=args.min_map, baseline=baseline,
+                           max_drop=args.max_drop, max_class_drop=args.max_class_drop)
+    report["gates"] = {"passed": not failures, "failures": failures}
+
+    report_text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(report_text)
+        print(f"mAP (IoU={args.iou:.2f}, Conf={args.conf:.2f}): {report['map']:.4f} -> {args.output}")
+    else:
+        print(report_text)
+
+    for failure in failures:
+        print(f"GATE FAILED: {failure}", file=sys.stderr)
+    return EXIT_GATE_FAILED if failures else EXIT_OK
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,217 @@
+# explorer_metadata.py
+import itertools
+import re
+
+import numpy as np
+
+# 정렬 기준 -> 배열 이름 (filename은 파일명 순위)
+SORT_FIELDS = ("filename", "ap", "delta_ap", "classes", "instances")
+# 필터에서 비교할 수 있는 숫자 필드
+FILTER_FIELDS = ("ap", "ap_b", "delta_ap", "classes", "instances")
+_COMPARE_OPS = {
+    "<": np.less, "<=": np.less_equal, ">": np.greater, ">=": np.greater_equal,
+    "==": np.equal, "=": np.equal, "!=": np.not_equal,
+}
+_COMPARE_PATTERN = re.compile(r"^(\w+)\s*(<=|>=|!=|==|<|>|=)\s*(\S+)$")
+_CLASS_PATTERN = re.compile(r"^(?:contains\s+|has\s+)?class\s+(.+)$", re.IGNORECASE)
+_FILE_PATTERN = re.compile(r"^file\s*(\^|~|:)\s*(.+)$", re.IGNORECASE)
+_SCORE_PATTERN = re.compile(r"^(unmatched\s+|fp\s+)?score\s*(>=|>)\s*(\S+)$", re.IGNORECASE)
+# coco_loader.ImageIndex(와 unmatched는 map_calculator)로 처리하는 조건 종류
+INDEX_PREDICATES = ("class", "file_prefix", "file_contains", "score", "unmatched")
+
+_generations = itertools.count() # 인스턴스마다 다른 값 (메타데이터를 새로 만들면 문자열 캐시가 모두 무효화되도록)
+
+
+class ExplorerMetadata:
+    """
+    탐색기에 표시할 이미지별 메타데이터를 이미지 순서대로 나란히 놓인 NumPy 배열로 저장합니다.
+
+    - filename_rank: 소문자 파일명의 정렬 순위 (같은 파일명은 같은 순위)
+    - ap, ap_b, delta_ap: float 배열. 계산되지 않았으면 NaN ("N/A", 비교 세트가 없으면 ΔAP 없음)
+    - classes, instances: GT 클래스 수 / annotation 수
+    - versions: 이미지별 변경 횟수. AP 값이 바뀔 때 증가하므로 표시 문자열 캐시의 key로 사용
+
+    파일명 순서는 한 번만 lexsort로 만들어 두고, 다른 기준은 그 순서 위에서 stable argsort 한 번으로 정렬합니다.
+    필터는 배열 비교로 처리하므로 10만 장도 수 ms 안에 다시 정렬/필터링됩니다.
+    기존 dict 메타데이터처럼 get(image_id)로 이미지별 dict를 얻을 수 있습니다. (탐색기 텍스트 표시용)
+    """
+
+    def __init__(self, image_ids, filenames, classes, instances):
+        self.image_ids = list(image_ids)
+        self._id_array = np.empty(len(self.image_ids), dtype=object) # 정렬 결과를 image_id로 바꿀 때 사용
+        self._id_array[:] = self.image_ids
+        self._position = {image_id: pos for pos, image_id in enumerate(self.image_ids)}
+        self.filenames = list(filenames)
+        _, self.filename_rank = np.unique([name.lower() for name in self.filenames], return_inverse=True)
+        self.filename_rank = self.filename_rank.astype(np.int64).reshape(-1)
+        positions = np.arange(len(self.image_ids))
+        self._filename_order = np.lexsort((positions, self.filename_rank))
+        self._filename_order_desc = np.lexsort((positions, -self.filename_rank))
+        self.classes = np.asarray(classes, dtype=np.int64)
+        self.instances = np.asarray(instances, dtype=np.int64)
+        self.ap = np.full(len(self.image_ids), np.nan)
+        self.ap_b = np.full(len(self.image_ids), np.nan)
+        self.delta_ap = np.full(len(self.image_ids), np.nan)
+        self.versions = np.zeros(len(self.image_ids), dtype=np.int64)
+        self.generation = next(_generations)
+
+    @classmethod
+    def from_gt(cls, gt_images, gt_annotations):
+        """GT 이미지/annotation으로 파일명, 클래스 수, 인스턴스 수를 채웁니다. (AP는 N/A)"""
+        image_ids = list(gt_images.keys())
+        filenames, classes, instances = [], [], []
+        for image_id in image_ids:
+            anns = gt_annotations.get(image_id, [])
+            filenames.append(gt_images[image_id].get('file_name', f'Image ID: {image_id}'))
+            classes.append(len(set(ann['category_id'] for ann in anns)))
+            instances.append(len(anns))
+        return cls(image_ids, filenames, classes, instances)
+
+    @classmethod
+    def empty(cls):
+        return cls([], [], [], [])
+
+    # --- dict 메타데이터와 같은 방식의 조회 ---
+    def __len__(self):
+        return len(self.image_ids)
+
+    def __contains__(self, image_id):
+        return image_id in self._position
+
+    def get(self, image_id, default=None):
+        """이미지 하나의 메타데이터 dict ("ap"는 계산 전이면 "N/A", 비교 세트가 있을 때만 "ap_b"/"delta_ap")"""
+        pos = self._position.get(image_id)
+        if pos is None:
+            return default
+        metadata = {
+            "filename": self.filenames[pos],
+            "ap": "N/A" if np.isnan(self.ap[pos]) else float(self.ap[pos]),
+            "classes": int(self.classes[pos]),
+            "instances": int(self.instances[pos]),
+        }
+        if not np.isnan(self.delta_ap[pos]):
+            metadata["ap_b"] = float(self.ap_b[pos])
+            metadata["delta_ap"] = float(self.delta_ap[pos])
+        return metadata
+
+    def version_of(self, image_id):
+        """이미지 메타데이터의 버전 (generation, 변경 횟수). 없는 이미지는 (generation, -1)"""
+        pos = self._position.get(image_id)
+        return (self.generation, -1 if pos is None else int(self.versions[pos]))
+
+    def set_image(self, image_id, ap=None, ap_b=None, delta_ap=None):
+        """이미지 하나의 AP 값을 바꿉니다. (threshold 변경 시 현재 이미지만 다시 계산하는 경우)"""
+        pos = self._position.get(image_id)
+        if pos is None:
+            return
+        self.versions[pos] += 1
+        self.ap[pos] = np.nan if ap is None else ap
+        self.ap_b[pos] = np.nan if ap_b is None else ap_b
+        self.delta_ap[pos] = np.nan if delta_ap is None else delta_ap
+
+    def set_aps(self, ap_by_image, field="ap"):
+        """image_id -> 값 dict로 한 필드를 채웁니다. (없는 이미지는 그대로)"""
+        values = getattr(self, field)
+        for image_id, value in ap_by_image.items():
+            pos = self._position.get(image_id)
+            if pos is not None:
+                values[pos] = value
+                self.versions[pos] += 1
+
+    # --- 정렬 / 필터 ---
+    def order(self, criterion="filename", descending=False):
+        """
+        정렬된 이미지 위치 배열을 반환합니다.
+        값이 없는(NaN) 이미지는 방향과 관계없이 끝으로 보내고, 같은 값은 파일명 순서로 정렬합니다.
+        """
+        if criterion not in SORT_FIELDS or criterion == "filename":
+            return self._filename_order_desc if descending else self._filename_order
+        # 파일명 순서로 놓은 뒤 값으로 stable 정렬하므로 같은 값은 파일명 순서를 유지
+        base = self._filename_order
+        values = getattr(self, criterion)[base].astype(np.float64)
+        sorted_idx = np.argsort(-values if descending else values, kind='stable')
+        order, missing = base[sorted_idx], np.isnan(values[sorted_idx])
+        return np.concatenate((order[~missing], order[missing]))
+
+    def filter_mask(self, predicates):
+        """
+        숫자 필드 조건(필드, 연산자, 값)을 모두 만족하는(and) 이미지 mask를 계산합니다.
+        색인으로 처리하는 조건(INDEX_PREDICATES)은 무시합니다.
+
+        Args:
+            predicates (list): parse_filter() 결과. 비교 대상 값이 NaN(N/A)인 이미지는 조건을 만족하지 않습니다.
+        """
+        mask = np.ones(len(self.image_ids), dtype=bool)
+        for predicate in predicates:
+            if predicate[0] in INDEX_PREDICATES:
+                continue
+            field, op, value = predicate
+            values = getattr(self, field)
+            with np.errstate(invalid='ignore'):
+                mask &= _COMPARE_OPS[op](values, value) & ~np.isnan(values.astype(np.float64))
+        return mask
+
+    def ordered_ids(self, criterion="filename", descending=False, predicates=(), image_id_subset=None):
+        """정렬 + 필터를 적용한 image_id 리스트 (image_id_subset이 있으면 그 이미지만)"""
+        order = self.order(criterion, descending)
+        mask = self.filter_mask(predicates) if predicates else None
+        if image_id_subset is not None:
+            subset_mask = np.zeros(len(self.image_ids), dtype=bool)
+            subset_mask[[self._position[i] for i in image_id_subset if i in self._position]] = True
+            mask = subset_mask if mask is None else mask & subset_mask
+        if mask is not None:
+            order = order[mask[order]]
+        return self._id_array[order].tolist()
+
+
+def parse_filter(text, categories):
+    """
+    탐색기 필터 문자열을 predicate 리스트로 바꿉니다. 조건은 "and"로 연결합니다.
+
+    예: "ap < 0.3 and class person", "instances >= 10 and delta_ap < 0", "contains class traffic light",
+        "file^000012" (파일명 prefix), "file~night" (파일명 포함), "score > 0.9" (예측 score),
+        "unmatched score > 0.9" (GT와 매칭되지 않은 score > 0.9 예측이 있는 이미지)
+
+    Raises:
+        ValueError: 알 수 없는 필드/클래스이거나 형식이 잘못된 경우.
+    """
+    name_to_id = {cat.get('name', '').lower(): cat_id for cat_id, cat in (categories or {}).items()}
+    predicates = []
+    for clause in re.split(r"\s+and\s+", text.strip(), flags=re.IGNORECASE):
+        if not clause:
+            continue
+        file_match = _FILE_PATTERN.match(clause)
+        if file_match:
+            kind = "file_prefix" if file_match.group(1) == "^" else "file_contains"
+            predicates.append((kind, file_match.group(2).strip()))
+            continue
+        score_match = _SCORE_PATTERN.match(clause)
+        if score_match:
+            try:
+                threshold = float(score_match.group(3))
+            except ValueError:
+                raise ValueError(f"숫자가 아닙니다: {score_match.group(3)}") from None
+            predicates.append(("unmatched" if score_match.group(1) else "score", score_match.group(2), threshold))
+            continue
+        class_match = _CLASS_PATTERN.match(clause)
+        if class_match:
+            name = class_match.group(1).strip().lower()
+            if name in name_to_id:
+                predicates.append(("class", name_to_id[name]))
+            elif name.isdigit() and int(name) in (categories or {}):
+                predicates.append(("class", int(name)))
+            else:
+                raise ValueError(f"알 수 없는 클래스입니다: {class_match.group(1).strip()}")
+            continue
+        compare_match = _COMPARE_PATTERN.match(clause)
+        if not compare_match:
+            raise ValueError(f"필터 형식이 잘못되었습니다: {clause}")
+        field, op, value = compare_match.groups()
+        field = field.lower()
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"알 수 없는 필드입니다: {field} (사용 가능: {', '.join(FILTER_FIELDS)})")
+        try:
+            predicates.append((field, op, float(value)))
+        except ValueError:
+            raise ValueError(f"숫자가 아닙니다: {value}") from None
+    return predicates
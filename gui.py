@@ -4,18 +4,28 @@ from tkinter import ttk
 from tkinter import filedialog, messagebox, simpledialog
 from PIL import Image, ImageTk
 import os
-import copy
+import queue
+import threading
 import numpy as np  # For PR curve data
 
-# Matplotlib imports for PR Curve
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.figure import Figure
+# Matplotlib(PR Curve)은 시작 시간을 줄이기 위해 창이 표시된 뒤 _ensure_pr_panel()에서 import
 
 # 다른 모듈 임포트
 import coco_loader
 import map_calculator
+import error_analysis
+import confusion_matrix
 from interactive_canvas import InteractiveCanvas
+from prediction_store import PredictionStore
+from edit_history import EditHistory
+from explorer_metadata import ExplorerMetadata, parse_filter
+import edit_journal
+import results_writer
+import instrumentation
+import profiling
+
+# IoU 슬라이더를 멈춘 뒤 탐색기의 unmatched 필터를 다시 계산하기까지 기다리는 시간
+UNMATCHED_REFRESH_DELAY_MS = 300
 
 
 class AnnotatorGUI:
@@ -29,12 +39,15 @@ class AnnotatorGUI:
         # 데이터 변수
         self.gt_images = None
         self.gt_annotations = None
+        self.gt_buckets = {} # image_id -> {category_id: [GT annotation, ...]} (GT 로드 시 한 번 생성)
         self.categories = None
         self.pred_annotations_all = None
+        self.pred_annotations_compare = None # 비교용 두 번째 예측 세트 (B, 같은 GT 기준, 편집하지 않음)
         self.current_image_id = None
         self.current_image_path = None
         self.current_gt_anns = []
         self.current_pred_anns = []
+        self.current_compare_anns = []
         self.image_dir = ""
         self.class_visibility = {}
         self.instance_visibility = {}
@@ -43,9 +56,17 @@ class AnnotatorGUI:
         self.current_pr_rec = None
         self.selected_pr_class_id = None
         self.instance_numbers = {}
+        self.edit_history = EditHistory() # bbox/label 편집 Undo/Redo 기록
+        self.edit_journal = None # 편집 즉시 기록용 append-only 저널
+        self.stats_window = None # 계측(instrumentation) 통계 패널
+        self.stats_text = None
+        # 백그라운드 파일 로드 (worker 스레드 -> load_queue -> Tk 스레드에서 polling)
+        self.load_queue = queue.Queue()
+        self.load_cancel_event = None
+        self.load_thread = None
 
         # 이미지 메타데이터
-        self.image_metadata = {}  # 이미지 ID를 키로, 메타데이터 딕셔너리를 값으로 가짐
+        self.image_metadata = ExplorerMetadata.empty() # 이미지별 파일명/AP/클래스 수/인스턴스 수 (NumPy 배열)
 
         # 썸네일 관련 변수
         self.thumbnail_cache = {}
@@ -57,7 +78,18 @@ class AnnotatorGUI:
         self.explorer_canvas = None
         self.explorer_scrollbar_y = None
         self.all_image_ids_ordered = [] # 정렬된 이미지 ID 목록
-        self.canvas_item_map = {} # image_id -> {'thumb': canvas_id, 'text': canvas_id, 'bg': canvas_id}
+        self.explorer_filter_ids = None # 탐색기에 표시할 이미지 ID 집합 (None이면 전체, 혼동 행렬 칸 클릭 등으로 설정)
+        self.explorer_filter_desc = ""
+        self.explorer_predicates = [] # 필터 입력란의 조건 (explorer_metadata.parse_filter 결과)
+        self.image_index = None # GT 로드 시 만드는 역색인 (coco_loader.ImageIndex)
+        self.explorer_index_ids = None # 색인 조건(class/file/score/unmatched)을 만족하는 이미지 집합 (None이면 조건 없음)
+        self.explorer_filter_iou = None # explorer_index_ids의 unmatched 조건을 계산한 IoU 임계값
+        self.unmatched_refresh_id = None # IoU 변경 후 unmatched 조건 재계산 예약 (after id)
+        # 재사용하는 행 아이템 풀 (보이는 행 수 + 버퍼 크기). 목록 인덱스 i는 explorer_rows[i % 풀 크기]에 그려짐
+        self.explorer_rows = [] # {'bg', 'thumb', 'text': canvas_id, 'index', 'image_id', 'text_key', 'selected'}
+        self.explorer_row_by_image = {} # image_id -> 그 이미지를 표시 중인 행
+        self.explorer_rendered_range = (0, 0) # 현재 행에 배치된 목록 인덱스 범위 [start, end)
+        self.explorer_text_cache = {} # image_id -> ((metadata generation, version), 표시 문자열)
         self.item_height_in_explorer = self.thumbnail_size[1] + 40 # 각 아이템의 높이 (썸네일 + 텍스트 + 메타데이터 + 패딩)
         self.item_padding = 2
         self.selected_explorer_image_id = None
@@ -75,6 +107,9 @@ class AnnotatorGUI:
         # 초기 상태 설정
         self._update_ui_state()
 
+        # 창이 먼저 표시되도록 PR Curve 패널(matplotlib)은 이벤트 루프가 시작된 뒤 생성
+        self.master.after(200, self._ensure_pr_panel)
+
     def _create_placeholder_thumbnail(self):
         # 로드 전 또는 실패 시 표시할 기본 이미지 생성
         try:
@@ -99,8 +134,12 @@ class AnnotatorGUI:
 
         btn_load_gt = ttk.Button(top_frame, text="Load GT Annotations", command=self.load_gt_data)
         btn_load_gt.pack(side=tk.LEFT, padx=5)
+        self.load_gt_btn = btn_load_gt
         btn_load_pred = ttk.Button(top_frame, text="Load Predictions", command=self.load_pred_data)
         btn_load_pred.pack(side=tk.LEFT, padx=5)
+        self.load_pred_btn = btn_load_pred
+        self.load_compare_btn = ttk.Button(top_frame, text="Load Compare Preds", command=self.load_compare_pred_data)
+        self.load_compare_btn.pack(side=tk.LEFT, padx=5)
         btn_load_img_dir = ttk.Button(top_frame, text="Select Image Directory", command=self.select_image_dir)
         btn_load_img_dir.pack(side=tk.LEFT, padx=5)
 
@@ -108,16 +147,40 @@ class AnnotatorGUI:
         btn_reset.pack(side=tk.LEFT, padx=5)
         self.reset_btn = btn_reset
 
+        self.undo_btn = ttk.Button(top_frame, text="Undo", command=self.undo_edit, state=tk.DISABLED)
+        self.undo_btn.pack(side=tk.LEFT, padx=5)
+        self.redo_btn = ttk.Button(top_frame, text="Redo", command=self.redo_edit, state=tk.DISABLED)
+        self.redo_btn.pack(side=tk.LEFT, padx=5)
+        # Caps Lock이 켜져 있으면 Ctrl+Z의 keysym이 "Z"이므로 대소문자 모두 undo로 묶고, redo는 Shift를 명시
+        for sequence in ("<Control-z>", "<Control-Z>"):
+            self.master.bind(sequence, lambda e: self._on_edit_shortcut(e, self.undo_edit))
+        for sequence in ("<Control-y>", "<Control-Y>", "<Control-Shift-z>", "<Control-Shift-Z>"):
+            self.master.bind(sequence, lambda e: self._on_edit_shortcut(e, self.redo_edit))
+
         # 전체 map계산 버튼
         self.calc_dataset_map_btn = ttk.Button(top_frame, text="Calculate Dataset mAP", command=self.calculate_dataset_map, 
                                                state=tk.DISABLED)
         self.calc_dataset_map_btn.pack(side=tk.LEFT, padx=5)
+        # 체크 시 dataset mAP와 함께 bootstrap 95% 신뢰구간(B=1000, seed 고정)을 계산
+        self.bootstrap_ci_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(top_frame, text="Bootstrap CI", variable=self.bootstrap_ci_var).pack(side=tk.LEFT, padx=(0, 5))
+        # 오류 유형별(cls/loc/both/dupe/bkg/missed) 개수와 dAP 요약
+        self.error_analysis_btn = ttk.Button(top_frame, text="Error Analysis", command=self.show_error_analysis,
+                                             state=tk.DISABLED)
+        self.error_analysis_btn.pack(side=tk.LEFT, padx=5)
+        self.confusion_matrix_btn = ttk.Button(top_frame, text="Confusion Matrix", command=self.show_confusion_matrix,
+                                               state=tk.DISABLED)
+        self.confusion_matrix_btn.pack(side=tk.LEFT, padx=5)
 
         help_button = ttk.Button(top_frame,
                                 text="Help",
                                 command=self.show_help)
         help_button.pack(side=tk.LEFT, padx=5)
 
+        stats_button = ttk.Button(top_frame, text="Stats", command=self.toggle_stats_panel)
+        stats_button.pack(side=tk.LEFT, padx=5)
+        self.master.bind("<F12>", lambda e: self.toggle_stats_panel())
+
         # ▶ Top Frame 우측에 Status 레이블 & ProgressBar 배치
         status_frame = ttk.Frame(top_frame)
         status_frame.pack(side=tk.RIGHT)
@@ -131,6 +194,9 @@ class AnnotatorGUI:
                                             mode='determinate')
         self.progress_bar.pack(side=tk.LEFT, padx=(0, 10))
 
+        self.cancel_load_btn = ttk.Button(status_frame, text="Cancel", command=self.cancel_loading, state=tk.DISABLED)
+        self.cancel_load_btn.pack(side=tk.LEFT, padx=(0, 10))
+
         # --- Main Frame (Left, Center, Right 분할) ---
         main_frame = ttk.Frame(self.master, padding="5 5 5 5")
         main_frame.pack(fill="both", expand=True)
@@ -155,7 +221,7 @@ class AnnotatorGUI:
         ttk.Label(sort_frame, text="Sort by:").pack(side="left", padx=(0, 5))
         
         self.sort_var = tk.StringVar(value="filename")
-        sort_options = ["filename", "ap", "classes", "instances"]
+        sort_options = ["filename", "ap", "delta_ap", "classes", "instances"]
         self.sort_combobox = ttk.Combobox(sort_frame, textvariable=self.sort_var, 
                                          values=sort_options, state="readonly", width=10)
         self.sort_combobox.pack(side="left", padx=(0, 5))
@@ -167,6 +233,20 @@ class AnnotatorGUI:
                                                  command=self.on_sort_change)
         self.sort_desc_checkbox.pack(side="left")
 
+        # 탐색기 필터: 조건 입력 (예: "ap < 0.3 and class person", Enter로 적용) + 현재 필터 표시
+        filter_frame = ttk.Frame(left_frame)
+        filter_frame.pack(fill="x", pady=(0, 2))
+        ttk.Label(filter_frame, text="Filter:").pack(side="left", padx=(0, 5))
+        self.filter_text_var = tk.StringVar()
+        filter_entry = ttk.Entry(filter_frame, textvariable=self.filter_text_var, width=20)
+        filter_entry.pack(side="left", fill="x", expand=True, padx=(0, 5))
+        filter_entry.bind("<Return>", lambda e: self.apply_filter_text())
+        self.clear_filter_btn = ttk.Button(filter_frame, text="Clear", command=self.clear_explorer_filter,
+                                           state=tk.DISABLED)
+        self.clear_filter_btn.pack(side="left")
+        self.explorer_filter_label = ttk.Label(left_frame, text="Filter: none")
+        self.explorer_filter_label.pack(anchor="w", pady=(0, 5))
+
         explorer_outer_frame = ttk.Frame(left_frame)
         explorer_outer_frame.pack(fill="both", expand=True, pady=(0, 10))
 
@@ -203,19 +283,13 @@ class AnnotatorGUI:
         self.pr_class_combobox.pack(side=tk.LEFT, fill=tk.X, expand=True)
         self.pr_class_combobox.bind("<<ComboboxSelected>>", self.on_pr_class_select)
 
-        # Matplotlib 캔버스(왼쪽 PR Curve)
-        self.pr_fig = Figure(figsize=(3, 2.5), dpi=100)
-        self.pr_ax = self.pr_fig.add_subplot(111)
-        self.pr_canvas_widget = FigureCanvasTkAgg(self.pr_fig, master=pr_curve_frame)
-        self.pr_canvas_widget.get_tk_widget().pack(fill="both", expand=True)
-        self.pr_ax.set_title("PR Curve")
-        self.pr_ax.set_xlabel("Recall")
-        self.pr_ax.set_ylabel("Precision")
-        self.pr_ax.set_xlim(0, 1)
-        self.pr_ax.set_ylim(0, 1.05)
-        self.pr_ax.grid(True)
-        self.pr_fig.tight_layout()
-        self.pr_canvas_widget.draw()
+        # Matplotlib 캔버스(왼쪽 PR Curve)는 처음 사용할 때 또는 창이 표시된 직후 생성
+        self.pr_curve_frame = pr_curve_frame
+        self.pr_fig = None
+        self.pr_ax = None
+        self.pr_canvas_widget = None
+        self.pr_placeholder = ttk.Label(pr_curve_frame, text="PR Curve", anchor="center")
+        self.pr_placeholder.pack(fill="both", expand=True)
 
         # --- Right Frame: PR Curve ---
         right_frame = ttk.Frame(main_frame, padding="5")
@@ -225,6 +299,24 @@ class AnnotatorGUI:
         visibility_frame = ttk.LabelFrame(right_frame, text="Class Visibility", padding="5")
         visibility_frame.grid(row=0, column=0, sticky="nsew", padx=5, pady=(0,5))
 
+        # 인스턴스 번호 매칭 방식: 기본은 GT 순서 greedy, scipy가 있으면 IoU 합 최대(optimal) 선택 가능
+        self.optimal_matching_var = tk.BooleanVar(value=False)
+        optimal_check = ttk.Checkbutton(visibility_frame, text="Optimal instance matching",
+                                        variable=self.optimal_matching_var, command=self.on_matching_mode_change)
+        optimal_check.pack(side="top", anchor="w")
+        if not map_calculator.HAS_SCIPY: # requirements.txt의 선택 의존성
+            optimal_check.config(state=tk.DISABLED)
+
+        # 비교 세트가 로드되면 캔버스에 표시할 예측 세트 선택 (이미지를 다시 로드하지 않고 다시 그리기만 함)
+        layer_frame = ttk.Frame(visibility_frame)
+        layer_frame.pack(side="top", anchor="w", pady=(0, 5))
+        ttk.Label(layer_frame, text="Prediction layer:").pack(side="left", padx=(0, 5))
+        self.pred_layer_var = tk.StringVar(value="A")
+        self.pred_layer_combobox = ttk.Combobox(layer_frame, textvariable=self.pred_layer_var,
+                                                values=["A", "B", "A+B"], state=tk.DISABLED, width=6)
+        self.pred_layer_combobox.pack(side="left")
+        self.pred_layer_combobox.bind("<<ComboboxSelected>>", lambda e: self.update_visualization_and_map())
+
         # 현재 테마의 TFrame 배경색을 가져옴
         frame_bg_color = self.style.lookup('TFrame', 'background')
 
@@ -448,10 +540,92 @@ class AnnotatorGUI:
             if str(image_id) not in self.thumbnail_cache:
                 self.master.after_idle(lambda img_id=image_id: self._load_thumbnail(str(img_id)))
 
+    def _hide_explorer_rows(self):
+        """목록이 비었을 때 풀의 모든 행을 숨깁니다. (아이템은 지우지 않고 재사용)"""
+        for row in self.explorer_rows:
+            self.explorer_canvas.itemconfig(row['bg'], state="hidden")
+            self.explorer_canvas.itemconfig(row['thumb'], state="hidden")
+            self.explorer_canvas.itemconfig(row['text'], state="hidden")
+            row['index'] = -1
+            row['image_id'] = None
+        self.explorer_row_by_image.clear()
+        self.explorer_rendered_range = (0, 0)
+
+    def _reset_explorer_rows(self):
+        """정렬/필터/크기가 바뀌어 모든 행을 다시 배치해야 함을 표시합니다. (다음 갱신에서 범위 안의 행을 모두 다시 묶음)"""
+        self.explorer_rendered_range = (0, 0)
+        for row in self.explorer_rows:
+            row['index'] = -1
+
+    def _ensure_explorer_row_pool(self, pool_size):
+        """풀에 행이 pool_size개 이상 있도록 만듭니다. 클릭 binding은 행을 만들 때 한 번만 등록합니다."""
+        if len(self.explorer_rows) >= pool_size:
+            return
+        while len(self.explorer_rows) < pool_size:
+            row = {'index': -1, 'image_id': None, 'text_key': None, 'selected': None}
+            row['bg'] = self.explorer_canvas.create_rectangle(0, 0, 0, 0, outline="", state="hidden", tags=("item_bg",))
+            row['thumb'] = self.explorer_canvas.create_image(0, 0, state="hidden", tags=("item_thumb",))
+            row['text'] = self.explorer_canvas.create_text(0, 0, anchor="w", state="hidden", tags=("item_text",))
+            for item in (row['bg'], row['thumb'], row['text']):
+                self.explorer_canvas.tag_bind(item, "<Button-1>", lambda e, r=row: self._on_explorer_row_click(r))
+            self.explorer_rows.append(row)
+        self._reset_explorer_rows() # 풀 크기가 바뀌면 인덱스 -> 행 대응이 달라짐
+
+    def _on_explorer_row_click(self, row):
+        if row['image_id'] is not None:
+            self._handle_explorer_item_click(row['image_id'])
+
+    def _bind_explorer_row(self, row, index, canvas_width):
+        """행을 목록 인덱스 index의 이미지로 다시 묶고 위치/썸네일/텍스트를 갱신합니다."""
+        image_id = self.all_image_ids_ordered[index]
+        if self.explorer_row_by_image.get(row['image_id']) is row:
+            del self.explorer_row_by_image[row['image_id']]
+        row['index'] = index
+        row['image_id'] = image_id
+        self.explorer_row_by_image[image_id] = row
+
+        y_pos = index * self.item_height_in_explorer + self.item_padding
+        row_center_y = y_pos + (self.item_height_in_explorer - self.item_padding*2) / 2
+        self.explorer_canvas.coords(row['bg'], self.item_padding, y_pos, canvas_width - self.item_padding,
+                                    y_pos + self.item_height_in_explorer - self.item_padding * 2)
+        self.explorer_canvas.coords(row['thumb'], self.item_padding + self.thumbnail_size[0] / 2, row_center_y)
+        self.explorer_canvas.coords(row['text'], self.item_padding + self.thumbnail_size[0] + 10, row_center_y)
+        self.explorer_canvas.itemconfig(row['thumb'], image=self._load_thumbnail(str(image_id)), state="normal")
+        self.explorer_canvas.itemconfig(row['text'], width=canvas_width - (self.thumbnail_size[0] + 20), state="normal")
+        self.explorer_canvas.itemconfig(row['bg'], state="normal")
+        row['text_key'] = None
+        row['selected'] = None
+        self._refresh_explorer_row(row)
+
+    def _refresh_explorer_row(self, row):
+        """행의 텍스트(메타데이터 버전이 바뀐 경우)와 선택 색상(선택 상태가 바뀐 경우)만 갱신합니다."""
+        image_id = row['image_id']
+        text_key = self.image_metadata.version_of(image_id)
+        if row['text_key'] != text_key:
+            self.explorer_canvas.itemconfig(row['text'], text=self._explorer_item_text(image_id))
+            row['text_key'] = text_key
+        selected = image_id == self.selected_explorer_image_id
+        if row['selected'] != selected:
+            bg_color = "blue" if selected else self.style.lookup('TFrame', 'background')
+            text_color = "white" if selected else self.style.lookup('TLabel', 'foreground')
+            self.explorer_canvas.itemconfig(row['bg'], fill=bg_color)
+            self.explorer_canvas.itemconfig(row['text'], fill=text_color)
+            row['selected'] = selected
+
+    def _refresh_explorer_image(self, image_id):
+        """image_id를 표시 중인 행이 있으면 텍스트/선택 색상을 갱신합니다."""
+        row = self.explorer_row_by_image.get(image_id)
+        if row is not None:
+            self._refresh_explorer_row(row)
+
     def _update_explorer_view_items(self):
+        """
+        스크롤 위치에 맞춰 풀의 행을 배치합니다.
+        이전에 배치한 범위에 이미 있는 인덱스는 건드리지 않고, 새로 범위에 들어온 인덱스의 행만 옮겨 다시 묶으므로
+        스크롤 비용은 바뀐 행 수에 비례합니다. (아이템 생성/삭제, tag_bind 없음)
+        """
         if not self.image_dir or not self.gt_images or not self.all_image_ids_ordered:
-            self.explorer_canvas.delete("all_items")
-            self.canvas_item_map.clear()
+            self._hide_explorer_rows()
             # 스크롤 영역도 초기화
             self.explorer_canvas.config(scrollregion=(0, 0, self.explorer_canvas.winfo_width(), 0))
             return
@@ -477,6 +651,7 @@ class AnnotatorGUI:
         # 2. 렌더링/캐싱할 아이템 범위 결정 (현재 보이는 영역 + 위/아래 확장된 캐싱 영역)
         render_buffer = 10  # 현재 보이는 영역 주변에 그릴 아이템 수
         preload_buffer = 20  # 추가로 미리 로드할 아이템 수 (캐싱용)
+        self._ensure_explorer_row_pool(num_items_in_view_approx + render_buffer * 2)
         
         render_start_idx = max(0, first_visible_idx - render_buffer)
         render_end_idx = min(len(self.all_image_ids_ordered), first_visible_idx + num_items_in_view_approx + render_buffer)
@@ -485,131 +660,65 @@ class AnnotatorGUI:
         preload_start_idx = max(0, first_visible_idx - preload_buffer)
         preload_end_idx = min(len(self.all_image_ids_ordered), first_visible_idx + num_items_in_view_approx + preload_buffer)
 
-        # 3. 기존 아이템 정리 및 새 아이템 그리기
-        current_ids_to_render = set(self.all_image_ids_ordered[i] for i in range(render_start_idx, render_end_idx))
-        
-        # 삭제할 아이템 (현재 맵에 있지만 그릴 범위에 없는 것)
-        ids_to_remove = []
-        for img_id_str_map in self.canvas_item_map:
-            img_id_map = int(img_id_str_map)
-            if img_id_map not in current_ids_to_render:
-                ids_to_remove.append(img_id_str_map)
-
-        for img_id_str_map_to_remove in ids_to_remove:
-            item_refs = self.canvas_item_map.pop(img_id_str_map_to_remove)
-            if item_refs.get('bg'): self.explorer_canvas.delete(item_refs['bg'])
-            if item_refs.get('thumb'): self.explorer_canvas.delete(item_refs['thumb'])
-            if item_refs.get('text'): self.explorer_canvas.delete(item_refs['text'])
+        # 3. 새로 범위에 들어온 인덱스만 해당 행(인덱스 % 풀 크기)을 옮겨서 다시 묶음
+        pool_size = len(self.explorer_rows)
+        prev_start, prev_end = self.explorer_rendered_range
+        for i in range(render_start_idx, render_end_idx):
+            if prev_start <= i < prev_end:
+                continue
+            self._bind_explorer_row(self.explorer_rows[i % pool_size], i, canvas_width)
+        if (prev_start, prev_end) == (0, 0): # 전체 재배치 후 범위 밖에 남은 행(목록이 풀보다 짧은 경우)은 숨김
+            for row in self.explorer_rows:
+                if not render_start_idx <= row['index'] < render_end_idx:
+                    for item in (row['bg'], row['thumb'], row['text']):
+                        self.explorer_canvas.itemconfig(item, state="hidden")
+                    if self.explorer_row_by_image.get(row['image_id']) is row:
+                        del self.explorer_row_by_image[row['image_id']]
+                    row['index'] = -1
+                    row['image_id'] = None
+        self.explorer_rendered_range = (render_start_idx, render_end_idx)
 
         # 4. 백그라운드 썸네일 프리로딩 (캐싱 영역)
         preload_ids = [self.all_image_ids_ordered[i] for i in range(preload_start_idx, preload_end_idx)]
         self._preload_thumbnails_in_background(preload_ids)
-            
-        # 5. 현재 렌더링 영역의 아이템 그리기/업데이트
-        for i in range(render_start_idx, render_end_idx):
-            image_id = self.all_image_ids_ordered[i]
-            image_id_str = str(image_id)
-            
-            y_pos = i * self.item_height_in_explorer + self.item_padding
-
-            # 배경 사각형 (선택 및 클릭용)
-            bg_color = "blue" if image_id == self.selected_explorer_image_id else self.style.lookup('TFrame', 'background')
-            text_color = "white" if image_id == self.selected_explorer_image_id else self.style.lookup('TLabel', 'foreground')
-
-            if image_id_str not in self.canvas_item_map:
-                self.canvas_item_map[image_id_str] = {}
-                
-                bg_rect = self.explorer_canvas.create_rectangle(
-                    self.item_padding, y_pos, 
-                    canvas_width - self.item_padding, y_pos + self.item_height_in_explorer - self.item_padding * 2,
-                    fill=bg_color, outline="", tags=("item_bg", f"item_bg_{image_id_str}")
-                )
-                self.canvas_item_map[image_id_str]['bg'] = bg_rect
-                self.explorer_canvas.tag_bind(bg_rect, "<Button-1>", lambda e, img_id=image_id: self._handle_explorer_item_click(img_id))
-
-                thumbnail_obj = self._load_thumbnail(image_id_str)
-                thumb_item = self.explorer_canvas.create_image(
-                    self.item_padding + self.thumbnail_size[0] / 2, 
-                    y_pos + (self.item_height_in_explorer - self.item_padding*2) / 2, 
-                    image=thumbnail_obj, tags=("item_thumb", f"item_thumb_{image_id_str}")
-                )
-                self.canvas_item_map[image_id_str]['thumb'] = thumb_item
-
-                # 파일명과 메타데이터 정보를 포함한 텍스트 생성
-                filename = self.image_metadata.get(image_id, {}).get("filename", f"ID: {image_id}")
-                metadata = self.image_metadata.get(image_id, {})
-                ap_score = metadata.get("ap", "N/A")
-                class_count = metadata.get("classes", 0)
-                instance_count = metadata.get("instances", 0)
-                
-                # AP score를 숫자로 포맷팅 (N/A가 아닌 경우)
-                if ap_score != "N/A" and isinstance(ap_score, (int, float)):
-                    ap_display = f"{ap_score:.3f}"
-                else:
-                    ap_display = str(ap_score)
-                
-                # 멀티라인 텍스트 생성
-                display_text = f"{filename}\nAP: {ap_display} | Classes: {class_count} | Instances: {instance_count}"
-                
-                text_item = self.explorer_canvas.create_text(
-                    self.item_padding + self.thumbnail_size[0] + 10, 
-                    y_pos + (self.item_height_in_explorer - self.item_padding*2) / 2,
-                    text=display_text, anchor="w", fill=text_color,
-                    width=canvas_width - (self.thumbnail_size[0] + 20), # 텍스트 줄바꿈 너비
-                    tags=("item_text", f"item_text_{image_id_str}")
-                )
-                self.canvas_item_map[image_id_str]['text'] = text_item
-            else: # 이미 아이템이 존재하면 색상 등 업데이트
-                self.explorer_canvas.itemconfig(self.canvas_item_map[image_id_str]['bg'], fill=bg_color)
-                
-                # 텍스트 내용도 업데이트 (메타데이터가 변경될 수 있음)
-                filename = self.image_metadata.get(image_id, {}).get("filename", f"ID: {image_id}")
-                metadata = self.image_metadata.get(image_id, {})
-                ap_score = metadata.get("ap", "N/A")
-                class_count = metadata.get("classes", 0)
-                instance_count = metadata.get("instances", 0)
-                
-                if ap_score != "N/A" and isinstance(ap_score, (int, float)):
-                    ap_display = f"{ap_score:.3f}"
-                else:
-                    ap_display = str(ap_score)
-                
-                display_text = f"{filename}\nAP: {ap_display} | Classes: {class_count} | Instances: {instance_count}"
-                
-                self.explorer_canvas.itemconfig(self.canvas_item_map[image_id_str]['text'], 
-                                               fill=text_color, text=display_text)
-                
-                # 썸네일이 플레이스홀더였다가 실제 이미지로 변경된 경우 업데이트
-                current_thumb_on_canvas = self.explorer_canvas.itemcget(self.canvas_item_map[image_id_str]['thumb'], "image")
-                new_thumb_obj = self._load_thumbnail(image_id_str) # 캐시에서 가져오거나 로드
-                if str(new_thumb_obj) != current_thumb_on_canvas : # PhotoImage 객체는 문자열 표현로 비교
-                     self.explorer_canvas.itemconfig(self.canvas_item_map[image_id_str]['thumb'], image=new_thumb_obj)
 
         # 스크롤 영역 업데이트
         self.explorer_canvas.config(scrollregion=(0, 0, canvas_width, content_height))
-        self.explorer_canvas.addtag_all("all_items")
 
 
+    def _explorer_item_text(self, image_id):
+        """탐색기 아이템에 표시할 두 줄 텍스트 (파일명 / AP, ΔAP, 클래스 수, 인스턴스 수). 메타데이터 버전별로 캐시합니다."""
+        version = self.image_metadata.version_of(image_id)
+        cached = self.explorer_text_cache.get(image_id)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        metadata = self.image_metadata.get(image_id, {})
+        filename = metadata.get("filename", f"ID: {image_id}")
+        ap_score = metadata.get("ap", "N/A")
+        class_count = metadata.get("classes", 0)
+        instance_count = metadata.get("instances", 0)
+
+        # AP score를 숫자로 포맷팅 (N/A가 아닌 경우)
+        if ap_score != "N/A" and isinstance(ap_score, (int, float)):
+            ap_display = f"{ap_score:.3f}"
+        else:
+            ap_display = str(ap_score)
+        if "delta_ap" in metadata:
+            ap_display += f" | ΔAP: {metadata['delta_ap']:+.3f}"
+
+        text = f"{filename}\nAP: {ap_display} | Classes: {class_count} | Instances: {instance_count}"
+        self.explorer_text_cache[image_id] = (version, text)
+        return text
+
     def _handle_explorer_item_click(self, image_id):
         if self.selected_explorer_image_id == image_id: # 이미 선택된 아이템 다시 클릭
             return
 
-        # 이전 선택 해제
-        if self.selected_explorer_image_id is not None:
-            old_id_str = str(self.selected_explorer_image_id)
-            if old_id_str in self.canvas_item_map and self.canvas_item_map[old_id_str].get('bg'):
-                self.explorer_canvas.itemconfig(self.canvas_item_map[old_id_str]['bg'], fill=self.style.lookup('TFrame', 'background'))
-                self.explorer_canvas.itemconfig(self.canvas_item_map[old_id_str]['text'], fill=self.style.lookup('TLabel', 'foreground'))
-
-
+        # 이전 선택 해제 후 새 아이템 선택 표시 (두 행만 갱신)
+        old_image_id = self.selected_explorer_image_id
         self.selected_explorer_image_id = image_id
-        
-        # 새 아이템 선택 표시
-        new_id_str = str(image_id)
-        if new_id_str in self.canvas_item_map and self.canvas_item_map[new_id_str].get('bg'):
-            self.explorer_canvas.itemconfig(self.canvas_item_map[new_id_str]['bg'], fill="blue") # 선택 색상
-            self.explorer_canvas.itemconfig(self.canvas_item_map[new_id_str]['text'], fill="white")
-
+        self._refresh_explorer_image(old_image_id)
+        self._refresh_explorer_image(image_id)
 
         self.on_image_select_logic(image_id) # 실제 이미지 로딩 및 처리 로직 호출
         self._update_ui_state()
@@ -663,21 +772,44 @@ class AnnotatorGUI:
         #dataset-map계산 버튼 로직
         can_calc_dataset = self.gt_images is not None and self.pred_annotations_all is not None
         self.calc_dataset_map_btn.config(state=tk.NORMAL if can_calc_dataset else tk.DISABLED)
+        self.error_analysis_btn.config(state=tk.NORMAL if can_calc_dataset else tk.DISABLED)
+        self.confusion_matrix_btn.config(state=tk.NORMAL if can_calc_dataset else tk.DISABLED)
 
         can_reset = (self.current_image_id is not None and self.pred_annotations_all is not None)
         self.reset_btn.config(state=tk.NORMAL if can_reset else tk.DISABLED)
 
+        self.undo_btn.config(state=tk.NORMAL if pred_loaded and self.edit_history.can_undo() else tk.DISABLED)
+        self.redo_btn.config(state=tk.NORMAL if pred_loaded and self.edit_history.can_redo() else tk.DISABLED)
+
+        # 파일 로드 중에는 다른 로드를 막고 Cancel만 허용
+        loading = self.is_loading()
+        self.load_gt_btn.config(state=tk.DISABLED if loading else tk.NORMAL)
+        self.load_pred_btn.config(state=tk.DISABLED if loading else tk.NORMAL)
+        self.load_compare_btn.config(state=tk.DISABLED if loading or not gt_loaded else tk.NORMAL)
+        self.pred_layer_combobox.config(state="readonly" if self.pred_annotations_compare is not None else tk.DISABLED)
+        self.cancel_load_btn.config(state=tk.NORMAL if loading else tk.DISABLED)
+
     def load_gt_data(self):
         filepath = filedialog.askopenfilename(
             title="Select Ground Truth COCO JSON",
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+            filetypes=[("JSON files", "*.json"), ("Gzipped JSON", "*.json.gz"), ("All files", "*.*")]
         )
         if not filepath:
             return
-
-        self.update_status("Loading GT annotations...", 0)
-        self.gt_images, self.gt_annotations, self.categories = coco_loader.load_coco_annotations(filepath)
-        self.update_status("Processing GT data...", 50)
+        self._start_background_load("GT annotations", coco_loader.load_coco_annotations, filepath, self._on_gt_loaded)
+
+    def _on_gt_loaded(self, filepath, result):
+        """백그라운드 GT 로드가 끝난 뒤 Tk 스레드에서 호출됩니다."""
+        self.gt_images, self.gt_annotations, self.categories = result
+        self.update_status("Processing GT data...", 100)
+        self.gt_buckets = coco_loader.build_category_buckets(self.gt_annotations) if self.gt_annotations else {}
+        self.image_index = coco_loader.ImageIndex(self.gt_images, self.gt_annotations) if self.gt_images else None
+        if self.image_index is not None and self.pred_annotations_all is not None:
+            self.image_index.set_predictions(self.pred_annotations_all)
+        self.explorer_filter_ids = None # 이전 GT 기준 필터는 의미가 없으므로 해제
+        self.explorer_predicates = []
+        self.explorer_index_ids = None
+        self.filter_text_var.set("")
 
         if self.gt_images and self.categories:
             if self.pred_annotations_all:  # 예측도 로드된 경우에만 메타데이터 계산
@@ -730,13 +862,12 @@ class AnnotatorGUI:
             pred for pred in self.current_pred_anns 
             if pred.get('score', 0.0) >= conf_thresh
         ]
+        # 클래스별 bucket (예측은 store가 클래스별 score 내림차순을 유지하므로 다시 정렬하지 않음)
+        gt_by_cat = self.gt_buckets.get(self.current_image_id, {})
+        pred_by_cat = self._pred_buckets(self.current_image_id, conf_thresh)
 
         # 3) 화면에 등장하는 클래스 ID들을 이름순으로 정렬 (필터링된 예측 기준)
-        present_cats = {
-            ann['category_id'] for ann in self.current_gt_anns
-        } | {
-            ann['category_id'] for ann in filtered_pred_anns  # 필터링된 예측 사용
-        }
+        present_cats = gt_by_cat.keys() | pred_by_cat.keys()
         sorted_categories = sorted(
             ((cid, info) for cid, info in self.categories.items() if cid in present_cats),
             key=lambda item: item[1]['name']
@@ -749,13 +880,13 @@ class AnnotatorGUI:
             is_expanded = prev_expanded_states.get(cat_id, True)
 
             # 3-2) 해당 클래스의 AP 계산 (현재 IoU & Confidence 슬라이더 값 기준)
-            gt_cat  = [ann for ann in self.current_gt_anns   if ann['category_id'] == cat_id]
-            pr_cat  = [ann for ann in filtered_pred_anns if ann['category_id'] == cat_id]  # 이미 필터링된 예측 사용
+            gt_cat  = gt_by_cat.get(cat_id, [])
+            pr_cat  = pred_by_cat.get(cat_id, [])  # 이미 필터링된 예측 사용
             iou_thr = self.iou_slider.get()
             prec, rec, _ = map_calculator.get_pr_arrays(
                 gt_cat, pr_cat,
-                category_id=cat_id,
-                iou_threshold=iou_thr
+                iou_threshold=iou_thr,
+                presorted=True
             )
             ap_value = map_calculator.calculate_ap(rec, prec) if (prec is not None and rec is not None) else 0.0
 
@@ -898,14 +1029,23 @@ class AnnotatorGUI:
     def load_pred_data(self):
         filepath = filedialog.askopenfilename(
             title="Select Prediction COCO JSON",
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+            filetypes=[("JSON files", "*.json"), ("Gzipped JSON", "*.json.gz"), ("Columnar (NumPy)", "*.npz"), ("All files", "*.*")]
         )
         if not filepath:
             return
+        self._start_background_load("predictions", coco_loader.load_predictions, filepath, self._on_pred_loaded)
 
-        self.update_status("Loading predictions...", 0)
-        self.pred_annotations_all = coco_loader.load_predictions(filepath)
-        self.update_status("Processing predictions...", 50)
+    def _on_pred_loaded(self, filepath, predictions_by_image):
+        """백그라운드 예측 로드가 끝난 뒤 Tk 스레드에서 호출됩니다."""
+        # 원본 예측은 공유/불변으로 두고, 편집은 이미지별 overlay로만 기록
+        self.pred_annotations_all = PredictionStore(predictions_by_image) if predictions_by_image is not None else None
+        self.edit_history.clear()
+        if self.pred_annotations_all is not None:
+            self._open_edit_journal(filepath)
+        self.update_status("Processing predictions...", 100)
+        if self.image_index is not None:
+            self.image_index.set_predictions(predictions_by_image)
+            self._refresh_index_filter() # score/unmatched 조건은 새 예측 기준으로 다시 계산
 
         if self.pred_annotations_all is not None:
             messagebox.showinfo("Success", f"Loaded predictions for {len(self.pred_annotations_all)} images.")
@@ -922,6 +1062,149 @@ class AnnotatorGUI:
             self.update_status("Error loading predictions.", 0)
         self._update_ui_state()
 
+    def load_compare_pred_data(self):
+        """같은 GT에 대해 비교할 두 번째 예측 세트(B)를 로드합니다."""
+        filepath = filedialog.askopenfilename(
+            title="Select Prediction File to Compare",
+            filetypes=[("JSON files", "*.json"), ("Gzipped JSON", "*.json.gz"), ("Columnar (NumPy)", "*.npz"), ("All files", "*.*")]
+        )
+        if not filepath:
+            return
+        self._start_background_load("comparison predictions", coco_loader.load_predictions, filepath, self._on_compare_pred_loaded)
+
+    def _on_compare_pred_loaded(self, filepath, predictions_by_image):
+        """비교 예측 로드가 끝난 뒤 Tk 스레드에서 호출됩니다. GT 인덱스(gt_buckets)는 그대로 공유합니다."""
+        if predictions_by_image is None:
+            messagebox.showerror("Error", "Failed to load comparison predictions.")
+            self.update_status("Error loading comparison predictions.", 0)
+            self._update_ui_state()
+            return
+
+        self.pred_annotations_compare = PredictionStore(predictions_by_image)
+        self.pred_layer_var.set("A+B")
+        self.update_status(f"Comparison predictions loaded for {len(self.pred_annotations_compare)} images.", 100)
+
+        if self.gt_images:
+            self._calculate_all_images_metadata() # 이미지별 ΔAP 계산 후 탐색기 갱신
+        if self.current_image_id:
+            self.load_annotations_for_current_image()
+            self.update_visualization_and_map()
+        self._update_ui_state()
+
+    def is_loading(self):
+        return self.load_thread is not None and self.load_thread.is_alive()
+
+    def _start_background_load(self, label, loader, filepath, on_loaded):
+        """
+        loader(filepath, progress_callback, cancel_event)를 worker 스레드에서 실행합니다.
+        worker는 Tk 위젯을 건드리지 않고 load_queue에 메시지만 넣으며, _poll_load_queue()가 Tk 스레드에서 처리합니다.
+        """
+        if self.is_loading():
+            return
+        cancel_event = threading.Event()
+        self.load_cancel_event = cancel_event
+        load_queue = self.load_queue
+        last_percent = [-1]
+
+        def report_progress(bytes_read, total_bytes):
+            percent = int(bytes_read * 100 / total_bytes) if total_bytes else 100
+            if percent != last_percent[0]: # 진행률이 바뀔 때만 전달 (queue 폭주 방지)
+                last_percent[0] = percent
+                load_queue.put(("progress", label, bytes_read, total_bytes))
+
+        def worker():
+            try:
+                result = loader(filepath, progress_callback=report_progress, cancel_event=cancel_event)
+                load_queue.put(("done", label, filepath, result, on_loaded))
+            except coco_loader.LoadCancelled:
+                load_queue.put(("cancelled", label))
+            except Exception as e:
+                load_queue.put(("error", label, str(e)))
+
+        self.load_thread = threading.Thread(target=worker, name=f"load-{label}", daemon=True)
+        self.load_thread.start()
+        self.update_status(f"Loading {label}...", 0)
+        self._update_ui_state()
+        self.master.after(50, self._poll_load_queue)
+
+    def _poll_load_queue(self):
+        """worker 스레드가 보낸 진행률/완료 메시지를 Tk 스레드에서 처리합니다."""
+        finished = False
+        try:
+            while True:
+                message = self.load_queue.get_nowait()
+                kind, label = message[0], message[1]
+                if kind == "progress":
+                    bytes_read, total_bytes = message[2], message[3]
+                    percent = bytes_read * 100 / total_bytes if total_bytes else 100
+                    if bytes_read >= total_bytes:
+                        self.update_status(f"Parsing {label}...", 100)
+                    else:
+                        self.update_status(f"Loading {label}... {bytes_read / 2**20:.1f}/{total_bytes / 2**20:.1f} MB", percent)
+                elif kind == "done":
+                    finished = True
+                    self.load_thread = None
+                    self.load_cancel_event = None
+                    filepath, result, on_loaded = message[2], message[3], message[4]
+                    on_loaded(filepath, result)
+                elif kind == "cancelled":
+                    finished = True
+                    self.load_thread = None
+                    self.load_cancel_event = None
+                    self.update_status(f"Loading {label} cancelled.", 0)
+                elif kind == "error":
+                    finished = True
+                    self.load_thread = None
+                    self.load_cancel_event = None
+                    messagebox.showerror("Error", f"Failed to load {label}: {message[2]}")
+                    self.update_status(f"Error loading {label}.", 0)
+        except queue.Empty:
+            pass
+
+        if finished:
+            self._update_ui_state()
+        elif self.load_thread is not None:
+            self.master.after(50, self._poll_load_queue)
+
+    def cancel_loading(self):
+        """진행 중인 파일 로드를 취소합니다. (다음 청크를 읽을 때 중단됨)"""
+        if self.load_cancel_event is not None:
+            self.load_cancel_event.set()
+            self.update_status("Cancelling...", None)
+
+    def _open_edit_journal(self, predictions_path):
+        """예측 파일에 대응하는 편집 저널을 열고, 이전 세션의 편집이 남아 있으면 복원 여부를 묻습니다."""
+        if self.edit_journal is not None:
+            self.edit_journal.close()
+            self.edit_journal = None
+
+        journal = edit_journal.EditJournal(
+            edit_journal.journal_path_for(predictions_path),
+            source_path=predictions_path,
+            prediction_count=self.pred_annotations_all.count_predictions()
+        )
+        try:
+            if journal.has_entries():
+                restore = messagebox.askyesno(
+                    "Restore Session",
+                    "Unsaved edits from a previous session were found for these predictions.\nRestore them?"
+                )
+                if restore:
+                    applied = journal.replay(self.pred_annotations_all)
+                    if applied < 0:
+                        messagebox.showwarning("Restore Session", "The edit journal does not match these predictions and was discarded.")
+                        self.pred_annotations_all.reset_all()
+                        journal.truncate()
+                    else:
+                        self.update_status(f"Restored {applied} edits from journal.", 100)
+                else:
+                    journal.truncate()
+            journal.open()
+            self.edit_journal = journal
+        except OSError as e:
+            print(f"Warning: Could not open edit journal ({journal.path}): {e}")
+            self.edit_journal = None
+
     def select_image_dir(self):
         dirpath = filedialog.askdirectory(title="Select Image Directory")
         if not dirpath:
@@ -954,9 +1237,10 @@ class AnnotatorGUI:
             messagebox.showwarning("Warning", "Please select the image directory first.")
             # 선택 해제 로직 필요 시 추가
             self.current_image_id = None
+            old_image_id = self.selected_explorer_image_id
             self.selected_explorer_image_id = None # UI 선택도 해제
             # 이전 선택 UI 복원
-            self._update_explorer_view_items() # 선택 효과 업데이트
+            self._refresh_explorer_image(old_image_id) # 선택 효과 업데이트
             self.update_status("Select image directory first.", 0)
             return
 
@@ -1004,9 +1288,14 @@ class AnnotatorGUI:
         self.current_gt_anns = self.gt_annotations.get(self.current_image_id, []) if self.gt_annotations else []
 
         if self.pred_annotations_all:
-            self.current_pred_anns = copy.deepcopy(self.pred_annotations_all.get(self.current_image_id, []))
+            # overlay가 적용된 뷰 (원본 dict는 공유되므로 직접 수정하지 않음)
+            self.current_pred_anns = self.pred_annotations_all.get(self.current_image_id, [])
         else:
             self.current_pred_anns = []
+        if self.pred_annotations_compare:
+            self.current_compare_anns = self.pred_annotations_compare.get(self.current_image_id, [])
+        else:
+            self.current_compare_anns = []
 
         print(f"Loaded {len(self.current_gt_anns)} GT annotations and {len(self.current_pred_anns)} predictions for image {self.current_image_id}")
 
@@ -1024,24 +1313,38 @@ class AnnotatorGUI:
         visible_insts = {
             k for k, var in self.instance_visibility.items() if var.get()
         }
+        layer = self.pred_layer_var.get() if self.pred_annotations_compare is not None else "A"
         self.canvas.set_data(
             self.current_gt_anns,
             self.current_pred_anns,
             self.categories,
             conf_thresh,
             visible_class_ids,
-            visible_insts      
+            visible_insts,
+            compare_annotations=self.current_compare_anns if layer in ("B", "A+B") else None,
+            show_predictions=layer in ("A", "A+B")
         )
 
-        filtered_preds_for_map = [p for p in self.current_pred_anns if p['score'] >= conf_thresh]
+        pred_by_cat = self._pred_buckets(self.current_image_id, conf_thresh)
 
-        if self.current_gt_anns and filtered_preds_for_map:
-            mean_ap, class_aps = map_calculator.calculate_map(
-                self.current_gt_anns, filtered_preds_for_map, self.categories, iou_thresh_map
-            )
-            self.map_label.config(text=f"Current Image AP (IoU={iou_thresh_map:.2f}): {mean_ap:.4f}")
+        if self.current_gt_anns and pred_by_cat:
+            with instrumentation.span("ap.image"):
+                mean_ap, class_aps = map_calculator.calculate_map_buckets(
+                    self.gt_buckets.get(self.current_image_id, {}), pred_by_cat,
+                    self.categories, iou_thresh_map
+                )
+            map_text = f"Current Image AP (IoU={iou_thresh_map:.2f}): {mean_ap:.4f}"
         else:
-            self.map_label.config(text=f"Current Image AP (IoU={iou_thresh_map:.2f}): N/A")
+            mean_ap = 0.0
+            map_text = f"Current Image AP (IoU={iou_thresh_map:.2f}): N/A"
+        if self.pred_annotations_compare is not None and self.current_gt_anns:
+            compare_ap, _ = map_calculator.calculate_map_buckets(
+                self.gt_buckets.get(self.current_image_id, {}),
+                self.pred_annotations_compare.get_by_category(self.current_image_id, min_score=conf_thresh),
+                self.categories, iou_thresh_map
+            )
+            map_text += f" | B: {compare_ap:.4f} (ΔAP {compare_ap - mean_ap:+.4f})"
+        self.map_label.config(text=map_text)
 
         self.draw_pr_curve(iou_thresh_pr)
 
@@ -1054,6 +1357,8 @@ class AnnotatorGUI:
 
             self.conf_value_label.config(text=f"{self.conf_slider.get():.2f}")
             self.iou_value_label.config(text=f"{self.iou_slider.get():.2f}")
+            if self.explorer_filter_iou is not None and self.iou_slider.get() != self.explorer_filter_iou:
+                self._refresh_unmatched_filter()
 
             if self.current_image_id:
                 # threshold 변경 시 체크박스를 재구성하여 필터링된 객체를 반영
@@ -1067,13 +1372,15 @@ class AnnotatorGUI:
                     # 여기서는 현재 이미지의 메타데이터만 업데이트
                     current_metadata = self._calculate_image_metadata(self.current_image_id)
                     if current_metadata:
-                        self.image_metadata[self.current_image_id] = current_metadata
+                        self.image_metadata.set_image(self.current_image_id, ap=current_metadata["ap"],
+                                                      ap_b=current_metadata.get("ap_b"),
+                                                      delta_ap=current_metadata.get("delta_ap"))
                         # 정렬 기준이 AP인 경우 목록 재정렬
-                        if self.sort_criterion == "ap":
+                        if self.sort_criterion in ("ap", "delta_ap"):
                             self._populate_explorer_view()
                         else:
                             # AP가 아닌 경우 현재 아이템의 텍스트만 업데이트
-                            self._update_explorer_view_items()
+                            self._refresh_explorer_image(self.current_image_id)
                 
         except Exception as e:
             print(f"Error in on_threshold_change: {e}")
@@ -1081,9 +1388,20 @@ class AnnotatorGUI:
     def on_annotation_update(self, index, updated_annotation):
         print(f"GUI: Prediction {index} updated in canvas: {updated_annotation}")
         if 0 <= index < len(self.current_pred_anns):
-            self.current_pred_anns[index] = updated_annotation
+            # 편집 전 상태는 overlay 기준으로 가져옴 (캔버스가 리스트 항목을 이미 교체했을 수 있음)
+            previous_annotation = self.pred_annotations_all.get_prediction(self.current_image_id, index)
+            # 변경된 필드만 현재 이미지의 overlay에 기록
+            self.current_pred_anns[index] = self.pred_annotations_all.apply_edit(
+                self.current_image_id, index,
+                bbox=updated_annotation['bbox'],
+                category_id=updated_annotation['category_id']
+            )
+            self.edit_history.record(self.current_image_id, index, previous_annotation, self.current_pred_anns[index])
+            self._journal_edit(self.current_image_id, index, self.current_pred_anns[index])
+            self._update_ui_state()
 
             self.update_visualization_and_map()
+            self._refresh_unmatched_filter(self.current_image_id)
             self.update_status(f"Annotation {index} updated. Recalculating AP.", 50)
         else:
             print(f"Error: Invalid prediction index {index}")
@@ -1111,10 +1429,14 @@ class AnnotatorGUI:
             iou_thresh_pr = self.iou_slider.get()
             self.draw_pr_curve(iou_thresh_pr)
 
+    @instrumentation.traced("pr_curve.draw")
     def draw_pr_curve(self, iou_threshold):
         if not self.current_image_id or not self.categories or self.selected_pr_class_id is None:
             self.clear_pr_curve()
             return
+        if self.pr_fig is None:
+            self._ensure_pr_panel() # 생성 후 다시 draw_pr_curve를 호출함
+            return
 
         calc_cat_id = None if self.selected_pr_class_id == "Overall" else self.selected_pr_class_id
         
@@ -1129,7 +1451,8 @@ class AnnotatorGUI:
             self.current_gt_anns,
             filtered_pred_anns,  # 필터링된 예측 전달
             category_id=calc_cat_id,
-            iou_threshold=iou_threshold
+            iou_threshold=iou_threshold,
+            presorted=True  # 예측은 로드 시 score 내림차순으로 정렬됨
         )
 
         self.pr_ax.clear()
@@ -1152,10 +1475,32 @@ class AnnotatorGUI:
         self.pr_ax.set_xlim(0, 1)
         self.pr_ax.set_ylim(0, 1.05)
         self.pr_ax.grid(True)
-        self.pr_fig.tight_layout()
-        self.pr_canvas_widget.draw()
+        with instrumentation.span("pr_curve.render"):
+            self.pr_fig.tight_layout()
+            self.pr_canvas_widget.draw()
+
+    def _ensure_pr_panel(self):
+        """PR Curve용 matplotlib Figure를 처음 한 번만 생성합니다."""
+        if self.pr_fig is not None:
+            return
+        with instrumentation.span("pr_curve.init"):
+            from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+            from matplotlib.figure import Figure
+
+            self.pr_fig = Figure(figsize=(3, 2.5), dpi=100)
+            self.pr_ax = self.pr_fig.add_subplot(111)
+            self.pr_placeholder.destroy()
+            self.pr_canvas_widget = FigureCanvasTkAgg(self.pr_fig, master=self.pr_curve_frame)
+            self.pr_canvas_widget.get_tk_widget().pack(fill="both", expand=True)
+        if self.current_image_id and self.categories and self.selected_pr_class_id is not None:
+            self.draw_pr_curve(self.iou_slider.get())
+        else:
+            self.clear_pr_curve()
 
     def clear_pr_curve(self):
+        if self.pr_fig is None:
+            self._ensure_pr_panel()
+            return
         self.pr_ax.clear()
         self.pr_ax.set_title("PR Curve")
         self.pr_ax.set_xlabel("Recall")
@@ -1227,9 +1572,9 @@ class AnnotatorGUI:
         if new_cat_id is not None and new_cat_id != current_cat_id:
             new_label_name = self.categories.get(new_cat_id, {}).get('name', f'ID:{new_cat_id}')
             print(f"Updating label for prediction {selected_pred_idx}: {current_label} -> {new_label_name} (ID: {new_cat_id})")
-            self.current_pred_anns[selected_pred_idx]['category_id'] = new_cat_id
+            updated_ann = dict(current_ann, category_id=new_cat_id)
 
-            self.on_annotation_update(selected_pred_idx, self.current_pred_anns[selected_pred_idx])
+            self.on_annotation_update(selected_pred_idx, updated_ann)
             self.update_status(f"Label updated for annotation {selected_pred_idx}.", 100)
 
     def save_annotations(self):
@@ -1241,40 +1586,45 @@ class AnnotatorGUI:
         save_path = filedialog.asksaveasfilename(
             title="Save Modified Predictions",
             defaultextension=".json",
-            filetypes=[("JSON files", "*.json")]
+            filetypes=[("JSON files", "*.json"), ("Gzipped JSON", "*.json.gz"), ("Columnar (NumPy)", "*.npz")]
         )
         if not save_path:
             self.update_status("Save cancelled.", 0)
             return
 
-        self.update_status("Preparing data for saving...", 0)
-        if self.current_image_id is not None and self.current_image_id in self.pred_annotations_all:
-            self.pred_annotations_all[self.current_image_id] = copy.deepcopy(self.current_pred_anns)
+        self.update_status("Saving annotations...", 0)
 
-        output_predictions = []
-        for img_id, preds in self.pred_annotations_all.items():
-            for p in preds:
-                clean_p = {k: v for k, v in p.items() if k not in ['canvas_ids']}
-                output_predictions.append(clean_p)
+        def report_progress(written, total):
+            percent = int(written / total * 100) if total else 100
+            self.update_status(f"Saving annotations... {written}/{total}", percent)
 
-        self.update_status("Saving annotations...", 50)
         try:
-            import json
-            with open(save_path, 'w') as f:
-                json.dump(output_predictions, f, indent=4)
+            # 편집 내용은 overlay에 있으므로 레코드 단위로 스트리밍 저장 (원본 파일에 덮어쓴 경우에만 저널을 비움)
+            if self.edit_journal is not None:
+                self.edit_journal.compact(self.pred_annotations_all, save_path, progress_callback=report_progress)
+            else:
+                results_writer.write_results(
+                    self.pred_annotations_all.iter_predictions(), save_path,
+                    total=self.pred_annotations_all.count_predictions(), progress_callback=report_progress
+                )
             messagebox.showinfo("Success", f"Modified predictions saved to:\n{save_path}")
             self.update_status(f"Annotations saved to {os.path.basename(save_path)}", 100)
         except Exception as e:
             messagebox.showerror("Error", f"Failed to save annotations: {e}")
             self.update_status(f"Error saving annotations: {e}", 0)
 
+    def _pred_buckets(self, image_id, conf_thresh):
+        """conf_thresh 이상인 예측을 클래스별 score 내림차순 리스트로 반환합니다. (편집 내용 반영)"""
+        if not self.pred_annotations_all:
+            return {}
+        return self.pred_annotations_all.get_by_category(image_id, min_score=conf_thresh)
+
     def _calculate_image_metadata(self, image_id):
         """단일 이미지에 대한 메타데이터를 계산합니다."""
         if not self.gt_images or image_id not in self.gt_images:
             return None
 
         gt_anns_img = self.gt_annotations.get(image_id, [])
-        pred_anns_img = self.pred_annotations_all.get(image_id, []) if self.pred_annotations_all else []
         categories_img = self.categories
         iou_thresh = self.iou_slider.get()
 
@@ -1283,58 +1633,74 @@ class AnnotatorGUI:
         class_count = len(set(ann['category_id'] for ann in gt_anns_img))
 
         ap_score = 0.0
-        if gt_anns_img and pred_anns_img and categories_img:
-            conf_thresh = self.conf_slider.get()
-            filtered_preds = [p for p in pred_anns_img if p['score'] >= conf_thresh]
-            if filtered_preds:
-                mean_ap, _ = map_calculator.calculate_map(gt_anns_img, filtered_preds, categories_img, iou_thresh)
+        if gt_anns_img and categories_img:
+            pred_by_cat = self._pred_buckets(image_id, self.conf_slider.get())
+            if pred_by_cat:
+                mean_ap, _ = map_calculator.calculate_map_buckets(
+                    self.gt_buckets.get(image_id, {}), pred_by_cat, categories_img, iou_thresh
+                )
                 ap_score = mean_ap
-            elif not gt_anns_img:
-                ap_score = 0.0
         elif not gt_anns_img:
             ap_score = 0.0
 
-        return {
+        metadata = {
             "filename": filename,
             "ap": ap_score,
             "classes": class_count,
             "instances": instance_count
         }
-
+        if self.pred_annotations_compare is not None and gt_anns_img and categories_img:
+            compared = map_calculator.compare_image_aps(
+                self.gt_buckets, self.pred_annotations_all, self.pred_annotations_compare, categories_img,
+                iou_threshold=iou_thresh, conf_threshold=self.conf_slider.get(), image_ids=[image_id], workers=1
+            ).get(image_id)
+            if compared:
+                metadata["ap_b"] = compared["ap_b"]
+                metadata["delta_ap"] = compared["delta_ap"]
+        return metadata
+
+    @profiling.profiled("image_metadata")
     def _calculate_all_images_metadata(self):
         """모든 이미지에 대한 메타데이터를 계산하여 self.image_metadata에 저장하고, 탐색기 뷰를 채웁니다."""
-        self.image_metadata.clear()
-        
         # GT 이미지가 로드되지 않았으면 아무것도 하지 않음
         if not self.gt_images:
+            self.image_metadata = ExplorerMetadata.empty()
             self.all_image_ids_ordered.clear()
             self._populate_explorer_view() # 탐색기 뷰 클리어
             return
 
-        # GT 이미지는 있지만, 예측이나 카테고리가 없을 경우 기본 메타데이터 생성
+        # 파일명, 클래스 수, 인스턴스 수는 GT만으로 계산 (AP는 N/A)
+        self.image_metadata = ExplorerMetadata.from_gt(self.gt_images, self.gt_annotations)
+
+        # 예측이나 카테고리가 없으면 기본 메타데이터만 표시
         if not self.pred_annotations_all or not self.categories:
-            self.update_status("Calculating basic metadata for images...", 0)
-            for i, img_id in enumerate(self.gt_images.keys()):
-                gt_anns_img = self.gt_annotations.get(img_id, [])
-                self.image_metadata[img_id] = {
-                    "filename": self.gt_images[img_id].get('file_name', f'Image ID: {img_id}'),
-                    "ap": "N/A", # AP 계산 불가
-                    "classes": len(set(ann['category_id'] for ann in gt_anns_img)),
-                    "instances": len(gt_anns_img)
-                }
-                if (i + 1) % 20 == 0 or (i + 1) == len(self.gt_images):
-                    self.update_status(f"Basic metadata... {i+1}/{len(self.gt_images)}", int((i+1)/len(self.gt_images)*100))
             self.update_status("Basic metadata calculation complete.", 100)
             self._populate_explorer_view() # 탐색기 뷰 채우기
             return
 
+        # 비교 세트가 있으면 두 세트의 이미지별 AP를 (이미지가 많으면 병렬로) 한 번에 계산
+        if self.pred_annotations_compare is not None:
+            self.update_status("Comparing predictions per image...", 0)
+            compared = map_calculator.compare_image_aps(
+                self.gt_buckets, self.pred_annotations_all, self.pred_annotations_compare, self.categories,
+                iou_threshold=self.iou_slider.get(), conf_threshold=self.conf_slider.get(),
+                image_ids=self.gt_images.keys()
+            )
+            self.image_metadata.set_aps(dict.fromkeys(self.gt_images, 0.0), "ap") # GT가 없어 비교하지 않은 이미지는 AP 0
+            self.image_metadata.set_aps({img_id: info["ap_a"] for img_id, info in compared.items()}, "ap")
+            self.image_metadata.set_aps({img_id: info["ap_b"] for img_id, info in compared.items()}, "ap_b")
+            self.image_metadata.set_aps({img_id: info["delta_ap"] for img_id, info in compared.items()}, "delta_ap")
+            self.update_status("Per-image comparison complete.", 100)
+            self._populate_explorer_view()
+            return
+
         # 모든 데이터가 있을 경우 AP 포함 전체 메타데이터 계산
         self.update_status("Calculating full metadata for all images...", 0)
         total_images = len(self.gt_images)
         for i, img_id in enumerate(self.gt_images.keys()):
             metadata = self._calculate_image_metadata(img_id) # 기존 AP 계산 로직 사용
             if metadata:
-                self.image_metadata[img_id] = metadata
+                self.image_metadata.set_image(img_id, ap=metadata["ap"])
             if (i + 1) % 10 == 0 or (i + 1) == total_images:
                 self.update_status(f"Calculating full metadata... {i+1}/{total_images}", int((i+1)/total_images*100))
         self.update_status("Full metadata calculation complete.", 100)
@@ -1343,50 +1709,27 @@ class AnnotatorGUI:
 
     def _populate_explorer_view(self):
         """
-        self.image_metadata를 기반으로 self.all_image_ids_ordered를 설정하고,
+        self.image_metadata 배열을 정렬/필터링하여 self.all_image_ids_ordered를 설정하고,
         캔버스의 스크롤 영역을 설정한 후 _update_explorer_view_items를 호출합니다.
+        (캔버스 아이템은 지우지 않고 행 풀을 새 순서로 다시 배치)
         """
-        if not self.image_metadata and self.gt_images: # 메타데이터는 없지만 GT 이미지는 있는 경우 (예: 초기 로드)
-            # 파일 이름 순으로 정렬된 ID 목록 생성
-            sorted_gt_items = sorted(self.gt_images.items(), key=lambda item: item[1].get('file_name', str(item[0])))
-            self.all_image_ids_ordered = [img_id for img_id, _ in sorted_gt_items]
-        elif self.image_metadata:
-            # 정렬 기준에 따라 정렬
-            def get_sort_key(item):
-                img_id, metadata = item
-                if self.sort_criterion == "filename":
-                    return metadata.get("filename", str(img_id)).lower()
-                elif self.sort_criterion == "ap":
-                    ap_val = metadata.get("ap", "N/A")
-                    if ap_val == "N/A":
-                        return -1 if self.sort_descending else float('inf')  # N/A를 끝으로 보냄
-                    return float(ap_val) if isinstance(ap_val, (int, float, str)) else 0.0
-                elif self.sort_criterion == "classes":
-                    return metadata.get("classes", 0)
-                elif self.sort_criterion == "instances":
-                    return metadata.get("instances", 0)
-                else:
-                    return metadata.get("filename", str(img_id)).lower()
-            
-            try:
-                sorted_meta_items = sorted(self.image_metadata.items(), 
-                                         key=get_sort_key, 
-                                         reverse=self.sort_descending)
-                self.all_image_ids_ordered = [img_id for img_id, _ in sorted_meta_items]
-            except (ValueError, TypeError) as e:
-                print(f"Sorting error: {e}, falling back to filename sort")
-                # 정렬 실패 시 파일명으로 폴백
-                sorted_meta_items = sorted(self.image_metadata.items(), 
-                                         key=lambda item: item[1].get("filename", str(item[0])).lower())
-                self.all_image_ids_ordered = [img_id for img_id, _ in sorted_meta_items]
+        if self.gt_images and not self.image_metadata: # 메타데이터 계산 전 (예: 초기 로드)
+            self.image_metadata = ExplorerMetadata.from_gt(self.gt_images, self.gt_annotations)
+        if self.gt_images:
+            # 혼동 행렬 칸 필터와 색인 조건의 교집합으로 대상을 좁힌 뒤 숫자 조건과 정렬을 배열 연산으로 적용
+            subset = self.explorer_filter_ids
+            if self.explorer_index_ids is not None:
+                subset = self.explorer_index_ids if subset is None else subset & self.explorer_index_ids
+            self.all_image_ids_ordered = self.image_metadata.ordered_ids(
+                self.sort_criterion, self.sort_descending, self.explorer_predicates, subset
+            )
         else:
             self.all_image_ids_ordered = []
+        self._update_filter_label()
 
-        # 기존 캔버스 아이템 모두 삭제 및 맵 초기화
-        self.explorer_canvas.delete("all_items") # 이 태그를 가진 모든 아이템 삭제
-        self.canvas_item_map.clear()
-
+        self._reset_explorer_rows() # 순서가 바뀌었을 수 있으므로 범위 안의 행을 모두 다시 묶음 (아이템은 재사용)
         if not self.all_image_ids_ordered:
+            self._hide_explorer_rows()
             self.explorer_canvas.config(scrollregion=(0,0,self.explorer_canvas.winfo_width(),0))
             return
 
@@ -1406,84 +1749,246 @@ class AnnotatorGUI:
         self._update_explorer_view_items() # 실제 아이템 그리기/업데이트
 
 
+    def set_explorer_filter(self, image_ids, description):
+        """탐색기에 image_ids에 해당하는 이미지만 (현재 정렬 순서와 필터 조건으로) 표시합니다."""
+        self.explorer_filter_ids = set(image_ids)
+        self.explorer_filter_desc = description
+        self.explorer_canvas.yview_moveto(0)
+        self._populate_explorer_view()
+
+    def apply_filter_text(self):
+        """필터 입력란의 조건을 적용합니다. (빈 문자열이면 조건 해제)"""
+        try:
+            self.explorer_predicates = parse_filter(self.filter_text_var.get(), self.categories)
+        except ValueError as e:
+            messagebox.showerror("Filter", str(e))
+            return
+        self._refresh_index_filter()
+        self.explorer_canvas.yview_moveto(0)
+        self._populate_explorer_view()
+
+    def _refresh_index_filter(self, image_ids=None):
+        """
+        색인 조건을 정렬된 image_id 배열의 교집합으로 계산해 둡니다. (정렬 변경 시에는 다시 계산하지 않음)
+        unmatched 조건은 score 색인으로 후보 이미지를 좁힌 뒤 그 이미지들만 현재 IoU 임계값으로 매칭해 확인합니다.
+
+        Args:
+            image_ids (iterable, optional): 주어지면 이 이미지들만 다시 판정하여 기존 결과를 고칩니다. (편집된 이미지)
+        """
+        ids = self.image_index.query(self.explorer_predicates) if self.image_index is not None else None
+        if ids is not None:
+            if image_ids is not None and self.explorer_index_ids is not None:
+                image_ids = set(image_ids)
+                ids = ids[np.isin(ids, list(image_ids))]
+            ids = ids.tolist()
+            self.explorer_filter_iou = self.iou_slider.get()
+            for predicate in self.explorer_predicates:
+                if predicate[0] == "unmatched":
+                    ids = map_calculator.images_with_unmatched_predictions(
+                        self.gt_buckets, self.pred_annotations_all, self.categories, ids, predicate[2],
+                        iou_threshold=self.explorer_filter_iou, inclusive=predicate[1] == ">="
+                    )
+            ids = set(ids)
+            if image_ids is not None and self.explorer_index_ids is not None:
+                ids = (self.explorer_index_ids - image_ids) | ids
+        self.explorer_index_ids = ids
+
+    def _has_unmatched_filter(self):
+        return any(predicate[0] == "unmatched" for predicate in self.explorer_predicates)
+
+    def _refresh_unmatched_filter(self, image_id=None):
+        """
+        unmatched 조건은 IoU 임계값과 편집 내용에 따라 달라지므로 적용 중이면 다시 계산합니다.
+        편집/undo/redo/reset은 해당 이미지만 바로, IoU 변경은 슬라이더를 움직이는 동안 모아서 전체를 다시 계산합니다.
+        """
+        if not self._has_unmatched_filter():
+            return
+        if image_id is not None:
+            self._refresh_index_filter([image_id])
+            self._populate_explorer_view()
+            return
+        if self.unmatched_refresh_id:
+            self.master.after_cancel(self.unmatched_refresh_id)
+        self.unmatched_refresh_id = self.master.after(UNMATCHED_REFRESH_DELAY_MS, self._run_unmatched_refresh)
+
+    def _run_unmatched_refresh(self):
+        self.unmatched_refresh_id = None
+        if self._has_unmatched_filter():
+            self._refresh_index_filter()
+            self._populate_explorer_view()
+
+    def clear_explorer_filter(self):
+        self.explorer_filter_ids = None
+        self.explorer_predicates = []
+        self.explorer_index_ids = None
+        self.filter_text_var.set("")
+        self._populate_explorer_view()
+
+    def _update_filter_label(self):
+        parts = []
+        if self.explorer_predicates:
+            parts.append(self.filter_text_var.get().strip())
+        if self.explorer_filter_ids is not None:
+            parts.append(self.explorer_filter_desc)
+        if parts:
+            self.explorer_filter_label.config(
+                text=f"Filter: {' & '.join(parts)} ({len(self.all_image_ids_ordered)}/{len(self.image_metadata)})")
+            self.clear_filter_btn.config(state=tk.NORMAL)
+        else:
+            self.explorer_filter_label.config(text="Filter: none")
+            self.clear_filter_btn.config(state=tk.DISABLED)
+
     def _sort_treeview_column(self, column_id):  # column_name 대신 column_id (Treeview 컬럼 식별자) 사용
         """Treeview 컬럼 헤더 클릭 시 정렬 수행 (기능 제거됨)"""
         pass # 정렬 기능 제거
 
     def calculate_dataset_map(self):
         #전체 이미지에 대해 mAP를 계산하여 다이얼로그로 보여줌.
-        import copy
         from tkinter import messagebox
         # 현재 설정된 임계값
         conf_thresh = self.conf_slider.get()
         iou_thresh = self.iou_slider.get()
 
-        # 모든 GT, Preds 리스트로 병합
-        all_gt = []
-        for anns in self.gt_annotations.values():
-            all_gt.extend(anns)
-        all_pred = []
-        for preds in self.pred_annotations_all.values():
-            for p in preds:
-                if p['score'] >= conf_thresh:
-                    all_pred.append(copy.deepcopy(p))
-
-        # mAP 계산 (map_calculator.calculate_map 을 사용)
-        mean_ap, _ = map_calculator.calculate_map(
-            all_gt, all_pred, self.categories, iou_threshold=iou_thresh
+        # 이미지별로 매칭한 뒤 클래스별로 누적 (overlay를 통해 읽기만 하므로 복사하지 않음)
+        self.update_status("Calculating dataset mAP...", 0)
+        mean_ap, _, match_cache = map_calculator.evaluate_dataset(
+            self.gt_annotations, self.pred_annotations_all, self.categories,
+            iou_threshold=iou_thresh, conf_threshold=conf_thresh, image_ids=self.gt_images.keys()
         )
+        result_text = f"Dataset mAP (IoU={iou_thresh:.2f}), (Conf={conf_thresh:.2f}): {mean_ap:.4f}"
+
+        # 캐시된 매칭 결과로 이미지를 복원 추출하여 신뢰구간 계산 (매칭은 다시 하지 않음)
+        if self.bootstrap_ci_var.get():
+            self.update_status("Bootstrapping dataset mAP...", 50)
+            ci = map_calculator.bootstrap_map(match_cache)
+            if ci is not None:
+                result_text += (f" [{ci['confidence'] * 100:.0f}% CI {ci['ci_low']:.4f}-{ci['ci_high']:.4f},"
+                                f" B={ci['num_samples']}]")
+        self.update_status("Dataset mAP calculation complete.", 100)
 
         # 결과 표시
-        self.dataset_map_label.config(
-            text=f"Dataset mAP (IoU={iou_thresh:.2f}), (Conf={conf_thresh:.2f}): {mean_ap:.4f}"
+        self.dataset_map_label.config(text=result_text)
+        messagebox.showinfo("Dataset mAP", result_text)
+
+    def show_error_analysis(self):
+        """전체 이미지의 오류 유형별 개수와 dAP(해당 오류를 고쳤을 때의 mAP 증가량)를 팝업으로 보여줍니다."""
+        conf_thresh = self.conf_slider.get()
+        iou_thresh = self.iou_slider.get()
+
+        self.update_status("Analyzing errors...", 0)
+        breakdown = error_analysis.analyze_dataset(
+            self.gt_annotations, self.pred_annotations_all, self.categories,
+            iou_threshold=iou_thresh, conf_threshold=conf_thresh, image_ids=self.gt_images.keys()
         )
-        messagebox.showinfo(
-            "Dataset mAP",
-            f"Dataset mAP (IoU={iou_thresh:.2f}), (Conf={conf_thresh:.2f}): {mean_ap:.4f}"
+        if breakdown is None:
+            self.update_status("Error analysis failed.", 0)
+            return
+        self.update_status("Error analysis complete.", 100)
+
+        win = tk.Toplevel(self.master)
+        win.title(f"Error Analysis (IoU={iou_thresh:.2f}, Conf={conf_thresh:.2f})")
+        win.geometry("420x260")
+        text_widget = tk.Text(win, wrap="none", font=("Courier", 9), padx=5, pady=5)
+        text_widget.insert("1.0", error_analysis.format_breakdown(breakdown))
+        text_widget.config(state="disabled")
+        text_widget.pack(fill="both", expand=True, padx=5, pady=5)
+        ttk.Button(win, text="Close", command=win.destroy).pack(pady=(0, 5))
+
+    def show_confusion_matrix(self):
+        """
+        전체 이미지의 클래스 혼동 행렬을 heatmap으로 보여줍니다.
+        칸을 클릭하면 그 칸에 해당하는 (GT 클래스, 예측 클래스) 쌍이 있는 이미지만 탐색기에 표시합니다.
+        """
+        conf_thresh = self.conf_slider.get()
+        iou_thresh = self.iou_slider.get()
+
+        self.update_status("Computing confusion matrix...", 0)
+        result = confusion_matrix.compute_confusion_matrix(
+            self.gt_annotations, self.pred_annotations_all, self.categories,
+            iou_threshold=iou_thresh, conf_threshold=conf_thresh, image_ids=self.gt_images.keys()
         )
+        if result is None:
+            self.update_status("Confusion matrix failed.", 0)
+            return
+        self.update_status("Confusion matrix complete.", 100)
+
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        from matplotlib.figure import Figure
+
+        names = [self.categories.get(cat_id, {}).get('name', f"ID:{cat_id}") if cat_id is not None else "background"
+                 for cat_id in result["labels"]]
+        matrix = result["matrix"]
+        # 색은 GT 클래스(행)별 비율, 글자는 개수 (클래스마다 GT 수가 달라도 혼동 정도를 비교할 수 있도록)
+        row_sums = matrix.sum(axis=1, keepdims=True)
+        normalized = matrix / np.maximum(row_sums, 1)
+
+        win = tk.Toplevel(self.master)
+        win.title(f"Confusion Matrix (IoU={iou_thresh:.2f}, Conf={conf_thresh:.2f})")
+        size = min(12, 3 + 0.45 * len(names))
+        fig = Figure(figsize=(size, size), dpi=100)
+        ax = fig.add_subplot(111)
+        ax.imshow(normalized, cmap="Blues", vmin=0, vmax=1)
+        ax.set_xticks(range(len(names)))
+        ax.set_yticks(range(len(names)))
+        ax.set_xticklabels(names, rotation=90, fontsize=7)
+        ax.set_yticklabels(names, fontsize=7)
+        ax.set_xlabel("Predicted")
+        ax.set_ylabel("Ground truth")
+        if len(names) <= 30: # 클래스가 많으면 글자가 겹치므로 개수 표시 생략
+            for (gt_idx, pred_idx), count in np.ndenumerate(matrix):
+                if count:
+                    ax.text(pred_idx, gt_idx, str(count), ha="center", va="center", fontsize=6,
+                            color="white" if normalized[gt_idx, pred_idx] > 0.5 else "black")
+        fig.tight_layout()
+
+        canvas_widget = FigureCanvasTkAgg(fig, master=win)
+        canvas_widget.get_tk_widget().pack(fill="both", expand=True)
+        ttk.Label(win, text="Click a cell to show its images in the explorer.").pack(pady=(0, 5))
+
+        def on_cell_click(event):
+            if event.inaxes is not ax or event.xdata is None or event.ydata is None:
+                return
+            gt_idx, pred_idx = int(round(event.ydata)), int(round(event.xdata))
+            if not (0 <= gt_idx < len(names) and 0 <= pred_idx < len(names)):
+                return
+            image_ids = confusion_matrix.cell_image_ids(result, gt_idx, pred_idx)
+            self.set_explorer_filter(image_ids, f"GT {names[gt_idx]} / Pred {names[pred_idx]}")
+            self.update_status(f"{len(image_ids)} images: GT {names[gt_idx]} -> Pred {names[pred_idx]}", 100)
+
+        canvas_widget.mpl_connect("button_press_event", on_cell_click)
+        canvas_widget.draw()
 
     def _compute_instance_numbers(self, iou_thresh=0.5):
         """GT↔PR 박스 매칭 후, 클래스별로 동일 번호 부여"""
         self.instance_numbers.clear()
+        mode = map_calculator.MATCH_OPTIMAL if self.optimal_matching_var.get() else map_calculator.MATCH_GREEDY
+        gt_by_cat, pr_by_cat = {}, {}
+        for i, ann in enumerate(self.current_gt_anns):
+            gt_by_cat.setdefault(ann['category_id'], []).append((i, ann))
+        for i, ann in enumerate(self.current_pred_anns):
+            pr_by_cat.setdefault(ann['category_id'], []).append((i, ann))
         # 클래스별 처리
-        present_cats = {
-            ann['category_id'] for ann in self.current_gt_anns
-        } | {
-            ann['category_id'] for ann in self.current_pred_anns
-        }
-        for cat_id in present_cats:
-            # 해당 클래스만 추출
-            gt_list = [(i,ann) for i,ann in enumerate(self.current_gt_anns) if ann['category_id']==cat_id]
-            pr_list = [(i,ann) for i,ann in enumerate(self.current_pred_anns) if ann['category_id']==cat_id]
-            matched_gt = set()
-            matched_pr = set()
+        for cat_id in gt_by_cat.keys() | pr_by_cat.keys():
+            gt_list = gt_by_cat.get(cat_id, [])
+            pr_list = pr_by_cat.get(cat_id, [])
             counter = 0
 
-            # IoU 함수
-            def iou(a, b):
-                x1 = max(a[0], b[0]); y1 = max(a[1], b[1])
-                x2 = min(a[0]+a[2], b[0]+b[2]); y2 = min(a[1]+a[3], b[1]+b[3])
-                inter = max(0, x2-x1) * max(0, y2-y1)
-                union = a[2]*a[3] + b[2]*b[3] - inter
-                return inter/union if union>0 else 0
-
-            # 1) GT↔PR 매칭
-            for gt_idx, gt_ann in gt_list:
-                best_pr = None; best_iou = 0
-                for pr_idx, pr_ann in pr_list:
-                    if pr_idx in matched_pr: continue
-                    val = iou(gt_ann['bbox'], pr_ann['bbox'])
-                    if val>best_iou:
-                        best_iou, best_pr = val, pr_idx
-                if best_iou >= iou_thresh:
-                    counter += 1
-                    self.instance_numbers[f"gt_{gt_idx}"]   = counter
-                    self.instance_numbers[f"pred_{best_pr}"] = counter
-                    matched_gt.add(gt_idx); matched_pr.add(best_pr)
+            # 1) GT↔PR 매칭 (GT 순서대로 남은 예측 중 IoU가 가장 큰 것, 또는 IoU 합 최대 매칭)
+            matches = map_calculator.match_boxes(
+                [ann['bbox'] for _, ann in gt_list], [ann['bbox'] for _, ann in pr_list], iou_thresh, mode
+            )
+            matched_pr = set()
+            for (gt_idx, _), pr_pos in zip(gt_list, matches.tolist()):
+                if pr_pos < 0: continue
+                pr_idx = pr_list[pr_pos][0]
+                counter += 1
+                self.instance_numbers[f"gt_{gt_idx}"]   = counter
+                self.instance_numbers[f"pred_{pr_idx}"] = counter
+                matched_pr.add(pr_idx)
 
             # 2) 매칭되지 않은 GT
-            for gt_idx, _ in gt_list:
-                if gt_idx in matched_gt: continue
+            for (gt_idx, _), pr_pos in zip(gt_list, matches.tolist()):
+                if pr_pos >= 0: continue
                 counter += 1
                 self.instance_numbers[f"gt_{gt_idx}"] = counter
 
@@ -1493,15 +1998,138 @@ class AnnotatorGUI:
                 counter += 1
                 self.instance_numbers[f"pred_{pr_idx}"] = counter
 
+    def on_matching_mode_change(self):
+        """인스턴스 번호 매칭 방식(greedy/optimal)이 바뀌면 번호와 체크박스를 다시 만듭니다."""
+        if self.current_image_id:
+            self._compute_instance_numbers()
+            self._populate_visibility_checkboxes()
+            self.update_visualization_and_map()
+
     def reset_annotations(self):
         """현재 선택한 이미지에 대해, 편집 전(로드 직후) 상태로 되돌립니다."""
         if not self.current_image_id:
             return
-        # predictions를 다시 로드
+        # 현재 이미지의 overlay를 버리고 원본 예측 뷰를 다시 가져옴
+        if self.pred_annotations_all is not None:
+            self.pred_annotations_all.reset(self.current_image_id)
+            self.edit_history.discard_image(self.current_image_id)
+            self._journal_reset(self.current_image_id)
         self.load_annotations_for_current_image()
         # 화면 갱신
         self.update_visualization_and_map()
         self.update_status("Annotations have been reset.", 100)
+        self._update_ui_state()
+        self._refresh_unmatched_filter(self.current_image_id)
+
+    def _on_edit_shortcut(self, event, action):
+        """undo/redo 단축키 처리. 텍스트 입력 위젯(필터 입력 등)에서 누른 경우는 bbox 편집에 적용하지 않습니다."""
+        if isinstance(event.widget, (tk.Entry, tk.Text, tk.Spinbox)): # ttk.Entry/Combobox도 tk.Entry 하위 클래스
+            return None
+        action()
+        return "break"
+
+    def undo_edit(self):
+        """가장 최근 bbox/label 편집을 되돌립니다."""
+        if self.pred_annotations_all is None:
+            return
+        entry = self.edit_history.undo()
+        if entry is None:
+            self.update_status("Nothing to undo.")
+            return
+        self._apply_history_entry(entry, entry.old_bbox, entry.old_category_id)
+        self.update_status(f"Undo: annotation {entry.index} of image {entry.image_id}.", 100)
+
+    def redo_edit(self):
+        """되돌린 편집을 다시 적용합니다."""
+        if self.pred_annotations_all is None:
+            return
+        entry = self.edit_history.redo()
+        if entry is None:
+            self.update_status("Nothing to redo.")
+            return
+        self._apply_history_entry(entry, entry.new_bbox, entry.new_category_id)
+        self.update_status(f"Redo: annotation {entry.index} of image {entry.image_id}.", 100)
+
+    def _journal_edit(self, image_id, index, annotation):
+        if self.edit_journal is None:
+            return
+        try:
+            self.edit_journal.record_edit(image_id, index, annotation['bbox'], annotation['category_id'])
+        except OSError as e:
+            print(f"Warning: Failed to write edit journal: {e}")
+
+    def _journal_reset(self, image_id):
+        if self.edit_journal is None:
+            return
+        try:
+            self.edit_journal.record_reset(image_id)
+        except OSError as e:
+            print(f"Warning: Failed to write edit journal: {e}")
+
+    def _apply_history_entry(self, entry, bbox, category_id):
+        """Undo/Redo 기록 하나를 overlay에 적용합니다. 이미지 전체를 다시 로드하지 않습니다."""
+        updated = self.pred_annotations_all.apply_edit(
+            entry.image_id, entry.index, bbox=list(bbox), category_id=category_id
+        )
+        self._journal_edit(entry.image_id, entry.index, updated)
+        if entry.image_id == self.current_image_id and 0 <= entry.index < len(self.current_pred_anns):
+            self.current_pred_anns[entry.index] = updated
+            self.update_visualization_and_map()
+        self._update_ui_state()
+        self._refresh_unmatched_filter(entry.image_id)
+
+    def toggle_stats_panel(self):
+        """구간별 소요 시간(last/p95)을 보여주는 통계 패널을 열거나 닫습니다."""
+        if self.stats_window is not None and self.stats_window.winfo_exists():
+            self.stats_window.destroy()
+            self.stats_window = None
+            return
+
+        self.stats_window = tk.Toplevel(self.master)
+        self.stats_window.title("Performance Stats")
+        self.stats_window.geometry("520x360")
+        self.stats_window.protocol("WM_DELETE_WINDOW", self.toggle_stats_panel)
+
+        control_frame = ttk.Frame(self.stats_window)
+        control_frame.pack(side=tk.TOP, fill=tk.X, padx=5, pady=5)
+        self.stats_enabled_var = tk.BooleanVar(value=instrumentation.is_enabled())
+        ttk.Checkbutton(control_frame, text="Enable instrumentation", variable=self.stats_enabled_var,
+                        command=lambda: instrumentation.enable(self.stats_enabled_var.get())).pack(side=tk.LEFT)
+        ttk.Button(control_frame, text="Reset", command=instrumentation.reset).pack(side=tk.LEFT, padx=5)
+        ttk.Button(control_frame, text="Export Trace...", command=self.export_trace).pack(side=tk.LEFT, padx=5)
+
+        self.stats_text = tk.Text(self.stats_window, wrap="none", font=("Courier", 9), padx=5, pady=5)
+        self.stats_text.pack(fill="both", expand=True, padx=5, pady=(0, 5))
+        self._refresh_stats_panel()
+
+    def _refresh_stats_panel(self):
+        """통계 패널이 열려 있는 동안 주기적으로 내용을 갱신합니다."""
+        if self.stats_window is None or not self.stats_window.winfo_exists():
+            return
+        if instrumentation.is_enabled() or instrumentation.stats():
+            content = instrumentation.format_stats()
+        else:
+            content = "Instrumentation is disabled. Enable it above (or start with ANNOTATOR_TRACE=1)."
+        self.stats_text.config(state="normal")
+        self.stats_text.delete("1.0", tk.END)
+        self.stats_text.insert("1.0", content)
+        self.stats_text.config(state="disabled")
+        self.stats_window.after(500, self._refresh_stats_panel)
+
+    def export_trace(self):
+        """기록된 구간을 Chrome trace-event JSON으로 저장합니다. (chrome://tracing 또는 Perfetto에서 열기)"""
+        filepath = filedialog.asksaveasfilename(
+            title="Export Chrome Trace",
+            defaultextension=".json",
+            filetypes=[("Trace JSON", "*.json"), ("All files", "*.*")]
+        )
+        if not filepath:
+            return
+        try:
+            event_count = instrumentation.export_chrome_trace(filepath)
+            self.update_status(f"Trace exported: {os.path.basename(filepath)} ({event_count} events)", 100)
+        except OSError as e:
+            messagebox.showerror("Error", f"Failed to export trace: {e}")
 
     def show_help(self):
         # 팝업 창 생성
@@ -1514,10 +2142,18 @@ class AnnotatorGUI:
             "Directions\n"
             "1. Click Load GT Annotations button.\n"
             "2. Click Load Predictions button.\n"
+            "   (Optional) Load Compare Preds: load a second prediction set (B) for the same GT.\n"
             "3. Click Select Image Directory button.\n"
             "4. Choose image on the left side.\n\n"
             "Reset Bbox Button: revert the bounding boxes you edited back to their original state.\n"
+            "Undo/Redo Buttons (Ctrl+Z / Ctrl+Y or Ctrl+Shift+Z, ignored while typing in a text field): step back and forth through bbox and label edits.\n"
             "Calculate Dataset mAP Button: mAP calculation for the entire image.\n"
+            "Error Analysis Button: count of cls/loc/both/dupe/bkg/missed errors and the mAP gain (dAP) from fixing each.\n"
+            "Image filter: e.g. 'ap < 0.3 and class person', 'instances >= 10', 'delta_ap < 0' (Enter to apply).\n"
+            "   'file^prefix', 'file~text' search file names; 'unmatched score > 0.9' finds confident predictions with no GT.\n"
+            "Confusion Matrix Button: GT class vs predicted class counts (with background); click a cell to filter the image list.\n"
+            "Prediction layer: show predictions A, B or both; sort images by delta_ap (B - A) to find regressions.\n"
+            "Stats Button (F12): per-operation timings (last/p95) and Chrome trace export.\n"
             "Edit Selected Label Button: change the label of the selected bounding box.\n"
             "Save Modified Annotations Button: save the annotation in its edited state.\n\n"
             "Class Visibility: class/instance checkbox, and AP score for each class.\n"
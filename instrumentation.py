@@ -0,0 +1,172 @@
+# instrumentation.py
+"""
+주요 경로(이미지 디코딩, 리사이즈, annotation 그리기, AP 계산, PR 곡선 그리기)의 소요 시간을 측정하는 가벼운 계측 모듈.
+
+- span(name): with 문으로 구간 시간을 측정
+- traced(name): 함수 전체를 측정하는 decorator
+- count(name, value): 카운터 증가
+- 비활성화 상태에서는 플래그 확인 한 번만 하므로 오버헤드가 거의 없습니다.
+- 환경 변수 ANNOTATOR_TRACE=1 로 시작 시 활성화할 수 있습니다.
+- export_chrome_trace(path)로 chrome://tracing, Perfetto에서 열 수 있는 trace-event JSON을 저장합니다.
+"""
+import functools
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+HISTORY_SIZE = 512          # span별로 보관하는 최근 측정값 수 (p95 계산용)
+MAX_TRACE_EVENTS = 200000   # Chrome trace로 내보낼 최대 이벤트 수
+
+_enabled = os.environ.get("ANNOTATOR_TRACE", "") not in ("", "0")
+_lock = threading.Lock()
+_durations = defaultdict(lambda: deque(maxlen=HISTORY_SIZE)) # name -> 최근 소요 시간(초)
+_span_counts = defaultdict(int)
+_counters = defaultdict(int)
+_trace_events = deque(maxlen=MAX_TRACE_EVENTS)
+_origin = time.perf_counter()
+
+
+def enable(flag=True):
+    global _enabled
+    _enabled = bool(flag)
+
+def is_enabled():
+    return _enabled
+
+def reset():
+    with _lock:
+        _durations.clear()
+        _span_counts.clear()
+        _counters.clear()
+        _trace_events.clear()
+
+
+def _record(name, start, end):
+    with _lock:
+        _durations[name].append(end - start)
+        _span_counts[name] += 1
+        _trace_events.append((name, start, end - start, threading.get_ident()))
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _record(self.name, self.start, time.perf_counter())
+        return False
+
+
+def span(name):
+    """구간 시간 측정용 context manager. 비활성화 상태에서는 아무 일도 하지 않는 공용 객체를 반환합니다."""
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name)
+
+
+def traced(name=None):
+    """함수 호출 시간을 측정하는 decorator."""
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _record(span_name, start, time.perf_counter())
+        return wrapper
+    return decorator
+
+
+def count(name, value=1):
+    if _enabled:
+        with _lock:
+            _counters[name] += value
+
+
+def stats():
+    """
+    span별 통계를 반환합니다.
+
+    Returns:
+        dict: name -> {"count", "last_ms", "p95_ms", "mean_ms", "max_ms"} (최근 HISTORY_SIZE개 기준)
+    """
+    with _lock:
+        snapshot = {name: list(values) for name, values in _durations.items()}
+        counts = dict(_span_counts)
+    result = {}
+    for name, values in snapshot.items():
+        if not values:
+            continue
+        ordered = sorted(values)
+        p95_index = min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))
+        result[name] = {
+            "count": counts.get(name, len(values)),
+            "last_ms": values[-1] * 1000,
+            "p95_ms": ordered[p95_index] * 1000,
+            "mean_ms": sum(values) / len(values) * 1000,
+            "max_ms": ordered[-1] * 1000,
+        }
+    return result
+
+
+def counters():
+    with _lock:
+        return dict(_counters)
+
+
+def format_stats():
+    """stats()와 counters()를 표 형태의 문자열로 만듭니다. (GUI 통계 패널용)"""
+    lines = [f"{'span':<32}{'n':>7}{'last ms':>10}{'p95 ms':>10}"]
+    for name, s in sorted(stats().items()):
+        lines.append(f"{name:<32}{s['count']:>7}{s['last_ms']:>10.2f}{s['p95_ms']:>10.2f}")
+    counter_values = counters()
+    if counter_values:
+        lines.append("")
+        lines.append(f"{'counter':<32}{'value':>7}")
+        for name, value in sorted(counter_values.items()):
+            lines.append(f"{name:<32}{value:>7}")
+    return "\n".join(lines)
+
+
+def export_chrome_trace(path):
+    """기록된 span을 Chrome trace-event 형식(JSON)으로 저장합니다."""
+    pid = os.getpid()
+    with _lock:
+        events = list(_trace_events)
+        counter_values = dict(_counters)
+    trace = [
+        {"name": name, "ph": "X", "ts": (start - _origin) * 1e6, "dur": duration * 1e6, "pid": pid, "tid": tid}
+        for name, start, duration, tid in events
+    ]
+    end_ts = (time.perf_counter() - _origin) * 1e6
+    for name, value in counter_values.items():
+        trace.append({"name": name, "ph": "C", "ts": end_ts, "pid": pid, "args": {"value": value}})
+    with open(path, 'w') as f:
+        json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+    return len(trace)
@@ -4,6 +4,8 @@ from PIL import Image, ImageTk, ImageDraw # ImageDraw 추가
 import math
 import os
 
+import instrumentation
+
 # visualizer 모듈의 색상 함수 재사용 또는 여기서 정의
 DEFAULT_COLORS = [
     '#FF0000', '#00FF00', '#0000FF', '#FFFF00', '#FF00FF', '#00FFFF',
@@ -31,6 +33,8 @@ class InteractiveCanvas(tk.Canvas):
 
         self.gt_annotations = []
         self.pred_annotations = []
+        self.compare_annotations = [] # 비교용 두 번째 예측 세트 (읽기 전용 overlay)
+        self.show_predictions = True
         self.categories = {}
         self.confidence_threshold = 0.5
         self.visible_class_ids = set()
@@ -88,9 +92,11 @@ class InteractiveCanvas(tk.Canvas):
         canvas_y = img_y * self.display_scale + self.display_offset[1]
         return canvas_x, canvas_y
 
+    @instrumentation.traced("canvas.load_image")
     def load_image(self, image_path):
         try:
             self.original_pil_image = Image.open(image_path).convert("RGB")
+            instrumentation.count("canvas.decoded_pixels", self.original_pil_image.width * self.original_pil_image.height)
             self.tk_image = None # 이전 tk 이미지 해제
             if self.image_on_canvas:
                 self.delete(self.image_on_canvas)
@@ -140,6 +146,7 @@ class InteractiveCanvas(tk.Canvas):
 
         self._update_display()
 
+    @instrumentation.traced("canvas.update_display")
     def _update_display(self):
         """현재 display_scale과 display_offset을 사용하여 이미지를 그리고 annotation을 업데이트합니다."""
         if not self.original_pil_image:
@@ -165,8 +172,9 @@ class InteractiveCanvas(tk.Canvas):
         
         try:
             # 원본 이미지에서 현재 스케일에 맞게 리사이즈
-            self.display_pil_image = self.original_pil_image.resize((scaled_w, scaled_h), Image.Resampling.LANCZOS)
-            self.tk_image = ImageTk.PhotoImage(self.display_pil_image)
+            with instrumentation.span("canvas.resize"):
+                self.display_pil_image = self.original_pil_image.resize((scaled_w, scaled_h), Image.Resampling.LANCZOS)
+                self.tk_image = ImageTk.PhotoImage(self.display_pil_image)
         except Exception as e:
             # print(f"Debug: Error resizing image for display: {e}, scaled_w={scaled_w}, scaled_h={scaled_h}")
             # 오류 발생 시, 이전 tk_image를 유지하거나, 이미지를 지울 수 있습니다.
@@ -277,16 +285,24 @@ class InteractiveCanvas(tk.Canvas):
             self.on_mouse_motion(event) # 패닝 종료 후 커서 즉시 업데이트
 
 
-    def set_data(self, gt_annotations, pred_annotations, categories, confidence_threshold, visible_class_ids,visible_instances=None):
-        """데이터 설정 및 다시 그리기"""
+    def set_data(self, gt_annotations, pred_annotations, categories, confidence_threshold, visible_class_ids,visible_instances=None,
+                 compare_annotations=None, show_predictions=True):
+        """데이터 설정 및 다시 그리기 (이미지는 다시 로드하지 않음)
+
+        compare_annotations: 비교용 예측 세트 (score 내림차순). 편집할 수 없는 점선 박스로 겹쳐 그림
+        show_predictions: False면 기본 예측 세트를 숨김 (비교 세트만 보기)
+        """
         self.gt_annotations = gt_annotations
         self.pred_annotations = pred_annotations
+        self.compare_annotations = compare_annotations or []
+        self.show_predictions = show_predictions
         self.categories = categories
         self.confidence_threshold = confidence_threshold
         self.visible_class_ids = visible_class_ids
         self.visible_instances = visible_instances or set()
         self.redraw_annotations()
 
+    @instrumentation.traced("canvas.redraw_annotations")
     def redraw_annotations(self):
         """Annotations를 현재 스케일과 오프셋에 맞게 다시 그립니다."""
         self.delete("annotation")
@@ -326,12 +342,13 @@ class InteractiveCanvas(tk.Canvas):
             self.create_text(xmin_c + 2, ymin_c + 2, anchor="nw", text=text_content, fill=color, font=("Arial", 8), tags=("annotation", "gt", gt_tag, "label"))
 
         # 예측 그리기
-        for idx, ann in enumerate(self.pred_annotations):
+        for idx, ann in enumerate(self.pred_annotations if self.show_predictions else []):
             cat_id = ann['category_id']
             score = ann['score']
             key = f"pred_{idx}"
-            if (score < self.confidence_threshold
-                    or cat_id not in self.visible_class_ids
+            if score < self.confidence_threshold:
+                break # 예측은 score 내림차순이므로 이후 예측도 모두 threshold 미만
+            if (cat_id not in self.visible_class_ids
                     or key not in self.visible_instances):
                 continue
 
@@ -364,6 +381,31 @@ class InteractiveCanvas(tk.Canvas):
                 self.create_rectangle(hx - handle_size/2, hy - handle_size/2, hx + handle_size/2, hy + handle_size/2,
                                       fill=color, outline='black', tags=("annotation", "pred", pred_tag, htype, "handle"))
 
+        # 비교 예측 세트 그리기 (인스턴스 체크박스/편집 대상이 아니므로 클래스 가시성과 threshold만 적용)
+        for ann in self.compare_annotations:
+            cat_id = ann['category_id']
+            score = ann['score']
+            if score < self.confidence_threshold:
+                break
+            if cat_id not in self.visible_class_ids:
+                continue
+
+            xmin_img, ymin_img, w_img, h_img = ann['bbox']
+            if w_img < min_bbox_size or h_img < min_bbox_size: continue
+            xmin_c, ymin_c = self._image_to_canvas_coords(xmin_img, ymin_img)
+            xmax_c, ymax_c = self._image_to_canvas_coords(xmin_img + w_img, ymin_img + h_img)
+
+            label = self.categories.get(cat_id, {}).get('name', f'ID:{cat_id}')
+            color = get_color(cat_id, is_gt=False)
+            self.create_rectangle(xmin_c, ymin_c, xmax_c, ymax_c, outline=color, width=1, dash=(1, 3),
+                                  tags=("annotation", "compare", "bbox"))
+            # 기본 예측 라벨(박스 위쪽)과 겹치지 않도록 박스 아래쪽 안에 표시
+            self.create_text(xmin_c + 2, ymax_c - 2, anchor="sw", text=f"B: {label} ({score:.2f})", fill=color,
+                             font=("Arial", 8, "italic"), tags=("annotation", "compare", "label"))
+        # 클릭 시 편집 가능한 기본 예측이 먼저 잡히도록 비교 세트는 그 아래에 둠
+        if self.compare_annotations and self.find_withtag("pred"):
+            self.tag_lower("compare", "pred")
+
     def clear_annotations(self):
         self.delete("annotation")
         self._selected_pred_idx = -1
@@ -572,13 +614,15 @@ class InteractiveCanvas(tk.Canvas):
             new_bbox_img[3] = max(min_size_img, h_img + img_dy)
 
         final_bbox_img = [round(c, 2) for c in new_bbox_img]
-        self.pred_annotations[pred_idx]['bbox'] = final_bbox_img
+        # 예측 dict는 다른 뷰와 공유될 수 있으므로 직접 수정하지 않고 새 dict로 교체
+        updated_annotation = dict(self.pred_annotations[pred_idx], bbox=final_bbox_img)
+        self.pred_annotations[pred_idx] = updated_annotation
         # print(f"Prediction {pred_idx} {drag_type} finished. New image bbox: {final_bbox_img}")
 
         self.update_canvas_objects(pred_idx, final_bbox_img)
 
         if self.annotation_update_callback:
-            self.annotation_update_callback(pred_idx, self.pred_annotations[pred_idx])
+            self.annotation_update_callback(pred_idx, updated_annotation)
 
         self._drag_data = {"x": 0, "y": 0, "item": None, "type": None, "ann_idx": -1, "is_gt": False, "original_bbox": None, "start_canvas_coords": (0,0)}
 
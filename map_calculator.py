@@ -1,6 +1,23 @@
 # map_calculator.py
+import importlib.util
 import numpy as np
+import os
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import coco_loader
+import profiling
+
+# scipy는 선택 의존성 (MATCH_OPTIMAL에만 사용). scipy.optimize import는 느리므로 실제로 쓸 때만 import하고,
+# 여기서는 설치 여부만 확인 (없으면 MATCH_OPTIMAL 대신 MATCH_GREEDY 사용)
+HAS_SCIPY = importlib.util.find_spec("scipy") is not None
+
+# match_boxes() 매칭 방식
+MATCH_VOC = "voc"           # row(예측) 순서대로 IoU가 가장 큰 column을 고르고, 이미 매칭된 column이면 매칭 실패 (AP 계산용)
+MATCH_GREEDY = "greedy"     # row 순서대로 아직 매칭되지 않은 column 중 IoU가 가장 큰 것을 고름 (배타적 greedy)
+MATCH_OPTIMAL = "optimal"   # IoU 합이 최대가 되는 1:1 매칭 (scipy.optimize.linear_sum_assignment)
+MATCH_MODES = (MATCH_VOC, MATCH_GREEDY, MATCH_OPTIMAL)
+IOU_BLOCK_ROWS = 1024       # IoU 행렬을 나누어 계산하는 row 단위 (메모리 사용량 제한)
 
 def calculate_iou(box1, box2):
     """
@@ -43,16 +60,15 @@ def calculate_ap(rec, prec):
     mrec = np.concatenate(([0.], rec, [1.]))
     mpre = np.concatenate(([0.], prec, [0.]))
 
-    # Precision 값을 오른쪽에서 왼쪽으로 가면서 누적 최댓값으로 만듭니다.
-    for i in range(len(mpre) - 2, -1, -1):
-        mpre[i] = max(mpre[i], mpre[i+1])
+    # Precision 값을 오른쪽에서 왼쪽으로 가면서 누적 최댓값으로 만듭니다. (역순 누적 최댓값, 벡터 연산)
+    mpre = np.maximum.accumulate(mpre[::-1])[::-1]
 
     # 구간별 면적 계산
     i = np.where(mrec[1:] != mrec[:-1])[0] # Recall 값이 변하는 지점
     ap = np.sum((mrec[i + 1] - mrec[i]) * mpre[i + 1])
     return ap
 
-def get_pr_arrays(gt_annotations_img, pred_annotations_img, category_id=None, iou_threshold=0.5):
+def get_pr_arrays(gt_annotations_img, pred_annotations_img, category_id=None, iou_threshold=0.5, presorted=False):
     """
     주어진 클래스 ID 또는 전체 예측에 대한 Precision 및 Recall 배열을 계산합니다.
 
@@ -61,10 +77,12 @@ def get_pr_arrays(gt_annotations_img, pred_annotations_img, category_id=None, io
         pred_annotations_img (list): Prediction annotations.
         category_id (int, optional): 특정 클래스 ID. None이면 모든 클래스를 대상으로 합니다.
         iou_threshold (float): TP/FP 판정을 위한 IoU 임계값.
+        presorted (bool): 예측이 이미 score 내림차순이면 True (coco_loader.load_predictions 결과는 항상 정렬됨).
 
     Returns:
         tuple: (precision 배열, recall 배열, 총 GT 개수)
                계산할 수 없는 경우 (None, None, 0) 반환.
+               crowd/ignore GT(is_ignored_gt)는 GT 개수에 넣지 않고, 그 영역에 떨어진 예측은 TP/FP에서 제외합니다.
     """
     if category_id is not None:
         gt = [ann for ann in gt_annotations_img if ann['category_id'] == category_id]
@@ -73,46 +91,53 @@ def get_pr_arrays(gt_annotations_img, pred_annotations_img, category_id=None, io
         gt = gt_annotations_img
         preds = pred_annotations_img
 
+    gt, ignored = split_ignored(gt)
     if not gt and not preds:
         return None, None, 0
     if not preds:
         return np.array([0.]), np.array([0.]), len(gt) # 예측 없으면 P=0, R=0
     # GT가 없으면 모든 예측은 FP, Recall은 0
-    if not gt:
+    if not gt and not ignored:
         nd = 0
         tp = np.zeros(len(preds))
         fp = np.ones(len(preds))
     else:
-        # 예측을 score 기준으로 내림차순 정렬
-        preds.sort(key=lambda x: x['score'], reverse=True)
+        # 예측을 score 기준으로 내림차순 정렬 (입력 리스트는 공유될 수 있으므로 제자리 정렬하지 않음)
+        if not presorted:
+            preds = sorted(preds, key=lambda x: x['score'], reverse=True)
 
-        nd = len(gt) # 해당 클래스(또는 전체)의 총 GT 개수
+        nd = len(gt) # 해당 클래스(또는 전체)의 총 GT 개수 (crowd/ignore 제외)
         tp = np.zeros(len(preds))
-        fp = np.zeros(len(preds))
-        gt_matched = np.zeros(len(gt)) # 각 GT가 매칭되었는지 추적
-
-        # 각 예측에 대해 가장 잘 맞는 GT 찾기 (같은 클래스 내에서만)
-        gt_map = {i: gt_ann for i, gt_ann in enumerate(gt)} # 인덱스 매핑
+        keep = np.ones(len(preds), dtype=bool)
 
+        # 각 예측은 같은 카테고리의 GT 중 IoU가 가장 큰 GT를 고르고, 그 GT가 이미 매칭되었다면 FP (MATCH_VOC)
+        pred_positions = defaultdict(list)
         for i, pred in enumerate(preds):
-            best_iou = 0.0
-            best_gt_idx = -1
-            pred_cat_id = pred['category_id'] # 현재 예측의 카테고리 ID
-
-            # 현재 예측과 같은 카테고리의 GT 중에서만 매칭 시도
-            for j, gt_ann in gt_map.items():
-                if gt_ann['category_id'] == pred_cat_id: # 카테고리 일치 확인
-                    iou = calculate_iou(pred['bbox'], gt_ann['bbox'])
-                    if iou > best_iou:
-                        best_iou = iou
-                        best_gt_idx = j
-
-            # IoU 임계값을 넘고, 해당 GT가 아직 다른 예측과 매칭되지 않았다면 TP
-            if best_gt_idx != -1 and best_iou >= iou_threshold and not gt_matched[best_gt_idx]:
-                tp[i] = 1.
-                gt_matched[best_gt_idx] = 1
-            else:
-                fp[i] = 1.
+            pred_positions[pred['category_id']].append(i)
+        gt_boxes_by_cat = defaultdict(list)
+        for gt_ann in gt:
+            gt_boxes_by_cat[gt_ann['category_id']].append(gt_ann['bbox'])
+        ignore_by_cat = defaultdict(list)
+        for gt_ann in ignored:
+            ignore_by_cat[gt_ann['category_id']].append(gt_ann)
+
+        for cat_id, positions in pred_positions.items():
+            gt_boxes = gt_boxes_by_cat.get(cat_id, [])
+            ignore_anns = ignore_by_cat.get(cat_id, [])
+            if not gt_boxes and not ignore_anns:
+                continue
+            positions = np.asarray(positions)
+            tp_cat, keep_cat = _match_category(
+                gt_boxes, [preds[i]['bbox'] for i in positions], iou_threshold,
+                [ann['bbox'] for ann in ignore_anns], [bool(ann.get('iscrowd', 0)) for ann in ignore_anns]
+            )
+            tp[positions] = tp_cat
+            keep[positions] = keep_cat
+        # crowd/ignore 영역에 떨어진 예측은 누적 전에 제외
+        tp = tp[keep]
+        if len(tp) == 0:
+            return np.array([0.]), np.array([0.]), nd
+        fp = 1. - tp
 
     # Precision, Recall 계산
     tp_cumsum = np.cumsum(tp)
@@ -123,7 +148,7 @@ def get_pr_arrays(gt_annotations_img, pred_annotations_img, category_id=None, io
 
     return prec, rec, nd
 
-def calculate_map(gt_annotations_img, pred_annotations_img, categories, iou_threshold=0.5):
+def calculate_map(gt_annotations_img, pred_annotations_img, categories, iou_threshold=0.5, presorted=False):
     """
     단일 이미지 또는 전체 데이터셋에 대한 mAP를 계산합니다.
     (여기서는 단일 이미지 처리를 가정하고 단순화된 예시를 제공합니다.
@@ -136,29 +161,48 @@ def calculate_map(gt_annotations_img, pred_annotations_img, categories, iou_thre
                                      각 annotation은 {'bbox': [...], 'category_id': ..., 'score': ...} 포함.
         categories (dict): 카테고리 ID와 정보를 매핑하는 딕셔너리.
         iou_threshold (float): TP/FP 판정을 위한 IoU 임계값.
+        presorted (bool): 예측이 이미 score 내림차순이면 True.
 
     Returns:
         float: 계산된 mAP 값 (여기서는 단일 클래스 AP 또는 단순 평균 AP).
         dict: 클래스별 AP 값.
     """
-    aps = {}
     if not categories:
         print("오류: 카테고리 정보가 없습니다.")
         return 0.0, {}
 
-    all_prec = []
-    all_rec = []
-    total_gt_count = 0
+    # 박스를 한 번만 훑어 클래스별로 나눔 (클래스 수 x 박스 수 만큼 필터링하지 않음)
+    gt_by_cat = coco_loader.bucket_by_category(gt_annotations_img)
+    pred_by_cat = coco_loader.bucket_by_category(pred_annotations_img, sort_by_score=not presorted)
+    return calculate_map_buckets(gt_by_cat, pred_by_cat, categories, iou_threshold)
+
+def calculate_map_buckets(gt_by_cat, pred_by_cat, categories, iou_threshold=0.5):
+    """
+    클래스별로 나뉜 GT/예측(coco_loader.bucket_by_category 결과)으로 mAP를 계산합니다.
+    이미지에 실제로 등장하는 클래스만 순회합니다.
+
+    Args:
+        gt_by_cat (dict): category_id -> GT annotation 리스트.
+        pred_by_cat (dict): category_id -> score 내림차순으로 정렬된 예측 리스트.
+        categories (dict): 평가 대상 카테고리 정보. 여기에 없는 클래스는 무시합니다.
+        iou_threshold (float): TP/FP 판정을 위한 IoU 임계값.
 
-    for category_id, category_info in categories.items():
-        # 현재 클래스에 해당하는 GT와 예측 필터링
-        gt_cat = [ann for ann in gt_annotations_img if ann['category_id'] == category_id]
-        preds_cat = [pred for pred in pred_annotations_img if pred['category_id'] == category_id]
+    Returns:
+        float: mAP.
+        dict: 클래스별 AP 값.
+    """
+    aps = {}
+    for category_id in gt_by_cat.keys() | pred_by_cat.keys():
+        if category_id not in categories:
+            continue
+        gt_cat = gt_by_cat.get(category_id, [])
+        preds_cat = pred_by_cat.get(category_id, [])
 
         if not gt_cat and not preds_cat:
             continue # 이 클래스에 대한 GT와 예측이 모두 없으면 건너뜀
 
-        prec, rec, nd = get_pr_arrays(gt_cat, preds_cat, category_id, iou_threshold)
+        # 이미 한 클래스로 나뉜 리스트이므로 get_pr_arrays에서 다시 필터링하지 않음 (category_id=None)
+        prec, rec, nd = get_pr_arrays(gt_cat, preds_cat, None, iou_threshold, presorted=True)
 
         if prec is None or rec is None:
              if not gt_cat: # GT가 없으면 AP는 0 (예측만 있는 경우)
@@ -175,6 +219,607 @@ def calculate_map(gt_annotations_img, pred_annotations_img, categories, iou_thre
 
     return mean_ap, aps
 
+def box_iou_matrix(boxes1, boxes2, crowd=None):
+    """
+    두 박스 집합 간의 IoU 행렬을 한 번에 계산합니다.
+    box 형식: [xmin, ymin, width, height]
+
+    Args:
+        boxes1 (array-like): [N, 4] (예측)
+        boxes2 (array-like): [M, 4] (GT)
+        crowd (array-like, optional): [M] bool. True인 column(crowd GT)은 합집합 대신 boxes1 면적으로 나눕니다.
+            (intersection over prediction area, COCO iscrowd 규칙)
+
+    Returns:
+        np.ndarray: [N, M] IoU 행렬.
+    """
+    b1 = np.asarray(boxes1, dtype=np.float64).reshape(-1, 4)
+    b2 = np.asarray(boxes2, dtype=np.float64).reshape(-1, 4)
+    if len(b1) == 0 or len(b2) == 0:
+        return np.zeros((len(b1), len(b2)))
+
+    x1_min, y1_min = b1[:, 0:1], b1[:, 1:2]
+    x1_max, y1_max = x1_min + b1[:, 2:3], y1_min + b1[:, 3:4]
+    x2_min, y2_min = b2[:, 0], b2[:, 1]
+    x2_max, y2_max = x2_min + b2[:, 2], y2_min + b2[:, 3]
+
+    inter_w = np.clip(np.minimum(x1_max, x2_max) - np.maximum(x1_min, x2_min), 0, None)
+    inter_h = np.clip(np.minimum(y1_max, y2_max) - np.maximum(y1_min, y2_min), 0, None)
+    inter = inter_w * inter_h
+
+    area1 = b1[:, 2:3] * b1[:, 3:4]
+    area2 = b2[:, 2] * b2[:, 3]
+    union = area1 + area2 - inter
+    if crowd is not None:
+        union = np.where(np.asarray(crowd, dtype=bool), area1, union)
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+def iou_candidates(boxes1, boxes2, iou_threshold=0.5, block_rows=IOU_BLOCK_ROWS, crowd=None):
+    """
+    IoU가 iou_threshold 이상(그리고 0보다 큰)인 박스 쌍만 골라 반환합니다.
+    [N, M] IoU 행렬을 block_rows개 row씩 나누어 계산하므로 N, M이 수천이어도 메모리가 block_rows x M으로 제한됩니다.
+    crowd는 box_iou_matrix와 같습니다.
+
+    Returns:
+        tuple: (rows, cols, ious) 배열. row 오름차순, 같은 row에서는 col 오름차순.
+    """
+    b1 = np.asarray(boxes1, dtype=np.float64).reshape(-1, 4)
+    b2 = np.asarray(boxes2, dtype=np.float64).reshape(-1, 4)
+    rows, cols, ious = [], [], []
+    for start in range(0, len(b1), block_rows):
+        iou = box_iou_matrix(b1[start:start + block_rows], b2, crowd)
+        r, c = np.nonzero((iou >= iou_threshold) & (iou > 0))
+        rows.append(r + start)
+        cols.append(c)
+        ious.append(iou[r, c])
+    if not rows:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(ious)
+
+def match_boxes(row_boxes, col_boxes, iou_threshold=0.5, mode=MATCH_VOC):
+    """
+    두 박스 집합을 IoU 기준으로 1:1 매칭합니다. row는 우선순위 순서(예: score 내림차순 예측)로 주어야 합니다.
+
+    Args:
+        row_boxes (array-like): [N, 4] 박스 (xywh). MATCH_VOC/MATCH_GREEDY에서는 앞선 row가 우선합니다.
+        col_boxes (array-like): [M, 4] 박스 (xywh).
+        iou_threshold (float): 매칭으로 인정하는 최소 IoU. (IoU 0인 쌍은 매칭하지 않음)
+        mode (str): MATCH_VOC, MATCH_GREEDY, MATCH_OPTIMAL 중 하나.
+            - MATCH_VOC: 각 row는 IoU가 가장 큰 column만 고려하고, 그 column을 앞선 row가 가져갔으면 매칭 실패.
+              (PASCAL VOC/get_pr_arrays의 TP 판정 규칙)
+            - MATCH_GREEDY: 각 row는 아직 남아 있는 column 중 IoU가 가장 큰 것을 가져감.
+            - MATCH_OPTIMAL: 매칭된 쌍의 IoU 합이 최대가 되도록 선택. scipy가 없으면 MATCH_GREEDY로 대체.
+
+    Returns:
+        np.ndarray: [N] 각 row에 매칭된 column 인덱스, 매칭되지 않았으면 -1.
+
+    성능:
+        IoU는 IOU_BLOCK_ROWS 단위 블록으로 벡터화하여 계산하고 임계값 이상인 쌍(후보)만 남깁니다.
+        MATCH_VOC는 후보 정렬만으로 처리되어 완전히 벡터화되어 있고, MATCH_GREEDY는 후보 수만큼만 순회합니다.
+        MATCH_OPTIMAL은 후보가 있는 row/column으로 줄인 행렬에 대해 linear_sum_assignment를 실행합니다.
+        참고 측정값(단일 코어, 2000x2000 이미지에 작은 박스가 밀집한 합성 데이터, N = M, 대부분 IoU 계산 시간):
+            N=1000: 약 0.04s / N=3000: 약 0.23s / N=5000: 약 0.9s (VOC, greedy 모두 비슷)
+        기존 get_pr_arrays의 파이썬 이중 루프(calculate_iou 호출)는 N=1000에서 약 2.8s였고 N^2로 증가합니다.
+    """
+    if mode not in MATCH_MODES:
+        raise ValueError(f"알 수 없는 매칭 방식입니다: {mode}")
+    num_rows = len(row_boxes)
+    matches = np.full(num_rows, -1, dtype=np.int64)
+    if num_rows == 0 or len(col_boxes) == 0:
+        return matches
+
+    rows, cols, ious = iou_candidates(row_boxes, col_boxes, iou_threshold)
+    if len(rows) == 0:
+        return matches
+
+    if mode == MATCH_OPTIMAL and not HAS_SCIPY:
+        mode = MATCH_GREEDY
+
+    if mode == MATCH_OPTIMAL:
+        from scipy.optimize import linear_sum_assignment
+        # 후보가 있는 row/column만 남긴 작은 행렬에서 IoU 합 최대화 (임계값 미만 쌍은 IoU 0으로 두고 결과에서 제외)
+        sub_rows, row_pos = np.unique(rows, return_inverse=True)
+        sub_cols, col_pos = np.unique(cols, return_inverse=True)
+        weight = np.zeros((len(sub_rows), len(sub_cols)))
+        weight[row_pos, col_pos] = ious
+        assigned_rows, assigned_cols = linear_sum_assignment(weight, maximize=True)
+        keep = weight[assigned_rows, assigned_cols] > 0
+        matches[sub_rows[assigned_rows[keep]]] = sub_cols[assigned_cols[keep]]
+        return matches
+
+    # row 오름차순, 같은 row에서는 IoU 내림차순 (같은 IoU는 앞선 column 우선)
+    order = np.lexsort((cols, -ious, rows))
+    rows, cols = rows[order], cols[order]
+
+    if mode == MATCH_VOC:
+        # 각 row의 최고 IoU column만 남기고, 같은 column을 고른 row 중 가장 앞선 row만 매칭
+        first_of_row = np.concatenate(([True], rows[1:] != rows[:-1]))
+        best_rows, best_cols = rows[first_of_row], cols[first_of_row]
+        _, first = np.unique(best_cols, return_index=True)
+        matches[best_rows[first]] = best_cols[first]
+        return matches
+
+    # MATCH_GREEDY: 후보 목록(이미 정렬됨)을 한 번 훑으며 남은 column 중 최선을 가져감
+    taken = np.zeros(len(col_boxes), dtype=bool)
+    for row, col in zip(rows.tolist(), cols.tolist()):
+        if matches[row] < 0 and not taken[col]:
+            matches[row] = col
+            taken[col] = True
+    return matches
+
+def is_ignored_gt(ann):
+    """crowd 영역(iscrowd=1)이나 ignore 플래그가 있는 GT는 평가에서 무시합니다. (COCO 규칙)"""
+    return bool(ann.get('iscrowd', 0) or ann.get('ignore', 0))
+
+def split_ignored(gt_annotations):
+    """
+    GT를 일반 GT와 ignore 영역으로 나눕니다.
+
+    Returns:
+        list: 일반 GT (GT 개수/recall 계산 대상)
+        list: ignore 영역 GT (iscrowd 또는 ignore)
+    """
+    regular, ignored = [], []
+    for ann in gt_annotations:
+        (ignored if is_ignored_gt(ann) else regular).append(ann)
+    return regular, ignored
+
+def ignore_region_hits(pred_boxes, ignore_boxes, ignore_crowd, iou_threshold=0.5):
+    """
+    ignore 영역과 iou_threshold 이상 겹치는 예측을 찾습니다. crowd 영역은 예측 면적 대비 교집합(IoP)으로 판정합니다.
+
+    Returns:
+        np.ndarray: [N] bool, ignore 영역에 떨어진 예측이면 True.
+    """
+    hits = np.zeros(len(pred_boxes), dtype=bool)
+    if len(pred_boxes) == 0 or len(ignore_boxes) == 0:
+        return hits
+    rows, _, _ = iou_candidates(pred_boxes, ignore_boxes, iou_threshold, crowd=ignore_crowd)
+    hits[rows] = True
+    return hits
+
+def _match_category(gt_boxes, pred_boxes, iou_threshold, ignore_boxes=(), ignore_crowd=()):
+    """
+    score 내림차순으로 정렬된 예측과 GT를 get_pr_arrays와 같은 규칙(MATCH_VOC)으로 매칭합니다.
+    일반 GT와 매칭되지 않은 예측 중 ignore 영역에 떨어진 것은 TP/FP 집계에서 제외합니다.
+    (ignore 영역은 일반 GT보다 나중에 고려하고, 여러 예측이 같은 crowd 영역에 떨어질 수 있음 - COCO 규칙)
+
+    Returns:
+        np.ndarray: [N] TP 배열 (1 또는 0).
+        np.ndarray: [N] bool, 집계에 남길 예측이면 True.
+    """
+    tp = np.zeros(len(pred_boxes))
+    keep = np.ones(len(pred_boxes), dtype=bool)
+    if len(pred_boxes) == 0:
+        return tp, keep
+    if len(gt_boxes):
+        tp[match_boxes(pred_boxes, gt_boxes, iou_threshold, MATCH_VOC) >= 0] = 1.
+    if len(ignore_boxes):
+        unmatched = np.flatnonzero(tp == 0)
+        hits = ignore_region_hits([pred_boxes[i] for i in unmatched], ignore_boxes, ignore_crowd, iou_threshold)
+        keep[unmatched[hits]] = False
+    return tp, keep
+
+def gt_box_arrays(gt_by_cat):
+    """
+    클래스별 GT(coco_loader.bucket_by_category 결과)를 매칭용 배열로 한 번만 변환합니다.
+    같은 GT를 여러 예측 세트와 비교할 때 재사용합니다.
+
+    Returns:
+        dict: category_id -> (일반 GT 박스 [G, 4], ignore 영역 박스 [I, 4], ignore 영역의 crowd 여부 [I])
+    """
+    arrays = {}
+    for cat_id, anns in gt_by_cat.items():
+        regular, ignored = split_ignored(anns)
+        arrays[cat_id] = (
+            np.array([ann['bbox'] for ann in regular], dtype=np.float64).reshape(-1, 4),
+            np.array([ann['bbox'] for ann in ignored], dtype=np.float64).reshape(-1, 4),
+            np.array([bool(ann.get('iscrowd', 0)) for ann in ignored], dtype=bool),
+        )
+    return arrays
+
+_EMPTY_GT_ARRAYS = (np.zeros((0, 4)), np.zeros((0, 4)), np.zeros(0, dtype=bool))
+
+def build_gt_index(gt_annotations):
+    """
+    데이터셋 GT 전체를 이미지별 gt_box_arrays()로 한 번 변환합니다. (evaluate_dataset의 gt_index 인자)
+
+    Returns:
+        dict: image_id -> {category_id: (일반 GT 박스, ignore 영역 박스, crowd 여부)}
+    """
+    return {image_id: gt_box_arrays(coco_loader.bucket_by_category(anns))
+            for image_id, anns in (gt_annotations or {}).items()}
+
+def match_image(gt_annotations_img, pred_annotations_img, category_ids, iou_threshold=0.5, conf_threshold=0.0, gt_arrays=None):
+    """
+    이미지 하나에 대해 클래스별 매칭 결과를 계산합니다.
+    gt_arrays(gt_box_arrays 결과)가 주어지면 gt_annotations_img 대신 미리 변환해 둔 GT 배열을 사용합니다.
+
+    Returns:
+        dict: category_id -> (score 내림차순 scores 배열, tp 배열, GT 개수)
+              crowd/ignore GT는 GT 개수에 넣지 않고, 그 영역에 떨어진 예측은 배열에서 제외합니다.
+    """
+    if gt_arrays is None:
+        gt_arrays = gt_box_arrays(coco_loader.bucket_by_category(gt_annotations_img))
+    # 일반 GT가 있는 클래스만 결과에 포함 (ignore 영역만 있고 예측이 없는 클래스는 평가 대상이 아님)
+    gt_cat_ids = {cat_id for cat_id, (gt_boxes, _, _) in gt_arrays.items()
+                  if cat_id in category_ids and len(gt_boxes)}
+    pred_by_cat = defaultdict(list)
+    for pred in pred_annotations_img:
+        if pred['score'] >= conf_threshold and pred['category_id'] in category_ids:
+            pred_by_cat[pred['category_id']].append(pred)
+
+    results = {}
+    for cat_id in gt_cat_ids | pred_by_cat.keys():
+        preds = pred_by_cat.get(cat_id, [])
+        scores = np.array([p['score'] for p in preds], dtype=np.float64)
+        if np.all(scores[:-1] >= scores[1:]):
+            # load_predictions/PredictionStore가 보장하는 score 내림차순이면 정렬 생략
+            pred_boxes = [p['bbox'] for p in preds]
+        else:
+            order = np.argsort(-scores, kind='stable')
+            scores = scores[order]
+            pred_boxes = [preds[i]['bbox'] for i in order]
+        gt_boxes, ignore_boxes, ignore_crowd = gt_arrays.get(cat_id, _EMPTY_GT_ARRAYS)
+        tp, keep = _match_category(gt_boxes, pred_boxes, iou_threshold, ignore_boxes, ignore_crowd)
+        if not keep.all():
+            scores, tp = scores[keep], tp[keep]
+        results[cat_id] = (scores, tp, len(gt_boxes))
+    return results
+
+# 데이터셋 평가 worker 프로세스에서 공유하는 데이터 (initializer에서 한 번만 설정, fork 시 복사 없이 공유)
+_EVAL_CONTEXT = {}
+
+def _init_eval_worker(gt_annotations, pred_annotations, category_ids, iou_threshold, conf_threshold, gt_index=None):
+    _EVAL_CONTEXT.update(
+        gt_annotations=gt_annotations, pred_annotations=pred_annotations,
+        category_ids=category_ids, iou_threshold=iou_threshold, conf_threshold=conf_threshold,
+        gt_index=gt_index
+    )
+
+@profiling.profiled("evaluate_chunk")
+def _evaluate_image_chunk(chunk):
+    """(이미지 위치, image_id) 묶음을 평가하여 클래스별 부분 결과를 반환합니다."""
+    ctx = _EVAL_CONTEXT
+    partial = defaultdict(lambda: {"scores": [], "tp": [], "image_index": [], "gt_image_index": [], "gt_count": []})
+    for position, image_id in chunk:
+        gt_img = ctx["gt_annotations"].get(image_id, []) if ctx["gt_annotations"] else []
+        pred_img = ctx["pred_annotations"].get(image_id, []) if ctx["pred_annotations"] else []
+        if not gt_img and not pred_img:
+            continue
+        gt_arrays = ctx["gt_index"].get(image_id, {}) if ctx["gt_index"] is not None else None
+        matched = match_image(gt_img, pred_img, ctx["category_ids"], ctx["iou_threshold"], ctx["conf_threshold"], gt_arrays)
+        for cat_id, (scores, tp, num_gt) in matched.items():
+            entry = partial[cat_id]
+            if len(scores):
+                entry["scores"].append(scores)
+                entry["tp"].append(tp)
+                entry["image_index"].append(np.full(len(scores), position, dtype=np.int64))
+            if num_gt:
+                entry["gt_image_index"].append(position)
+                entry["gt_count"].append(num_gt)
+    return dict(partial)
+
+def _ap_from_matches(scores, tp, num_gt):
+    """score 내림차순으로 정렬된 TP 배열로 AP를 계산합니다."""
+    if num_gt == 0 or len(tp) == 0:
+        return 0.0
+    tp_cumsum = np.cumsum(tp)
+    fp_cumsum = np.cumsum(1. - tp)
+    rec = tp_cumsum / (num_gt + 1e-10)
+    prec = tp_cumsum / (tp_cumsum + fp_cumsum + 1e-10)
+    return float(calculate_ap(rec, prec))
+
+@profiling.profiled("evaluate_dataset")
+def evaluate_dataset(gt_annotations, pred_annotations, categories, iou_threshold=0.5, conf_threshold=0.0,
+                     image_ids=None, workers=None, parallel_min_images=2000, gt_index=None):
+    """
+    데이터셋 전체의 mAP를 이미지별 매칭 후 클래스별로 누적하여 계산합니다.
+    (서로 다른 이미지의 박스끼리 매칭되지 않음)
+
+    Args:
+        gt_annotations (dict): image_id -> GT annotation 리스트.
+        pred_annotations (Mapping): image_id -> 예측 리스트 (dict 또는 PredictionStore).
+        categories (dict): 카테고리 정보 딕셔너리. 여기에 있는 클래스만 평가합니다.
+        iou_threshold (float): TP/FP 판정을 위한 IoU 임계값.
+        conf_threshold (float): 이 값 미만의 예측은 제외합니다.
+        image_ids (iterable, optional): 평가할 이미지 ID. None이면 GT와 예측에 등장하는 모든 이미지.
+        workers (int, optional): 프로세스 수. None이면 이미지 수가 parallel_min_images 이상일 때 CPU 수만큼 사용.
+        parallel_min_images (int): workers가 None일 때 병렬 처리를 시작하는 최소 이미지 수.
+        gt_index (dict, optional): build_gt_index() 결과. 같은 GT로 여러 예측 파일을 평가할 때 GT 변환을 한 번만 하도록 재사용합니다.
+
+    Returns:
+        float: mAP.
+        dict: 클래스별 AP.
+        dict: 클래스별 매칭 결과 캐시 (score 내림차순 scores/tp/image_index, 이미지별 GT 개수).
+    """
+    if not categories:
+        print("오류: 카테고리 정보가 없습니다.")
+        return 0.0, {}, {}
+
+    if image_ids is None:
+        image_ids = set(gt_annotations or {}) | set(pred_annotations or {})
+    image_ids = list(image_ids)
+    category_ids = frozenset(categories.keys())
+    indexed_ids = list(enumerate(image_ids))
+
+    if workers is None:
+        workers = (os.cpu_count() or 1) if len(image_ids) >= parallel_min_images else 1
+
+    init_args = (gt_annotations, pred_annotations, category_ids, iou_threshold, conf_threshold, gt_index)
+    if workers <= 1:
+        _init_eval_worker(*init_args)
+        partials = [_evaluate_image_chunk(indexed_ids)]
+    else:
+        chunk_size = max(1, len(indexed_ids) // (workers * 4))
+        chunks = [indexed_ids[i:i + chunk_size] for i in range(0, len(indexed_ids), chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_eval_worker, initargs=init_args) as executor:
+            partials = list(executor.map(_evaluate_image_chunk, chunks))
+
+    # 클래스별로 부분 결과를 합치고 score 내림차순으로 정렬
+    per_class = {}
+    class_aps = {}
+    for cat_id in category_ids:
+        parts = [p[cat_id] for p in partials if cat_id in p]
+        if not parts:
+            continue
+        scores = np.concatenate([a for p in parts for a in p["scores"]] or [np.zeros(0)])
+        tp = np.concatenate([a for p in parts for a in p["tp"]] or [np.zeros(0)])
+        image_index = np.concatenate([a for p in parts for a in p["image_index"]] or [np.zeros(0, dtype=np.int64)])
+        gt_image_index = np.array([i for p in parts for i in p["gt_image_index"]], dtype=np.int64)
+        gt_count = np.array([c for p in parts for c in p["gt_count"]], dtype=np.int64)
+
+        order = np.argsort(-scores, kind='stable')
+        num_gt = int(gt_count.sum())
+        per_class[cat_id] = {
+            "scores": scores[order],
+            "tp": tp[order],
+            "image_index": image_index[order],
+            "gt_image_index": gt_image_index,
+            "gt_count": gt_count,
+            "num_gt": num_gt,
+        }
+        class_aps[cat_id] = _ap_from_matches(scores[order], tp[order], num_gt)
+
+    mean_ap = float(np.mean(list(class_aps.values()))) if class_aps else 0.0
+    match_cache = {
+        "image_ids": image_ids,
+        "iou_threshold": iou_threshold,
+        "conf_threshold": conf_threshold,
+        "per_class": per_class,
+    }
+    return mean_ap, class_aps, match_cache
+
+def image_map_from_arrays(gt_arrays, pred_by_cat, categories, iou_threshold=0.5):
+    """
+    gt_box_arrays() 결과와 클래스별 score 내림차순 예측으로 이미지 mAP를 계산합니다.
+    calculate_map_buckets와 같은 값을 반환합니다.
+    """
+    aps = {}
+    for cat_id in gt_arrays.keys() | pred_by_cat.keys():
+        if cat_id not in categories:
+            continue
+        gt_boxes, ignore_boxes, ignore_crowd = gt_arrays.get(cat_id, _EMPTY_GT_ARRAYS)
+        preds = pred_by_cat.get(cat_id, [])
+        if not preds:
+            aps[cat_id] = 0.0
+            continue
+        tp, keep = _match_category(gt_boxes, [p['bbox'] for p in preds], iou_threshold, ignore_boxes, ignore_crowd)
+        aps[cat_id] = _ap_from_matches(None, tp[keep], len(gt_boxes))
+    mean_ap = float(np.mean(list(aps.values()))) if aps else 0.0
+    return mean_ap, aps
+
+def _bucket_predictions(pred_annotations, image_id, conf_threshold):
+    """이미지 예측을 conf_threshold 이상만 클래스별(score 내림차순)로 나눕니다. PredictionStore면 overlay를 반영합니다."""
+    if not pred_annotations:
+        return {}
+    if hasattr(pred_annotations, "get_by_category"):
+        return pred_annotations.get_by_category(image_id, min_score=conf_threshold)
+    preds = [p for p in pred_annotations.get(image_id, []) if p['score'] >= conf_threshold]
+    return coco_loader.bucket_by_category(preds, sort_by_score=True)
+
+_COMPARE_CONTEXT = {}
+
+def _init_compare_worker(gt_buckets, pred_a, pred_b, categories, iou_threshold, conf_threshold):
+    _COMPARE_CONTEXT.update(
+        gt_buckets=gt_buckets, pred_a=pred_a, pred_b=pred_b, categories=categories,
+        iou_threshold=iou_threshold, conf_threshold=conf_threshold
+    )
+
+def _compare_image_chunk(image_ids):
+    """이미지 묶음에 대해 두 예측 세트의 이미지 AP를 계산합니다. GT 배열은 이미지마다 한 번만 만들어 두 세트가 공유합니다."""
+    ctx = _COMPARE_CONTEXT
+    results = {}
+    for image_id in image_ids:
+        gt_by_cat = ctx["gt_buckets"].get(image_id, {})
+        if not gt_by_cat:
+            continue # GT가 없는 이미지는 탐색기와 같이 AP를 비교하지 않음
+        gt_arrays = gt_box_arrays(gt_by_cat)
+        ap_a, _ = image_map_from_arrays(
+            gt_arrays, _bucket_predictions(ctx["pred_a"], image_id, ctx["conf_threshold"]),
+            ctx["categories"], ctx["iou_threshold"]
+        ) if ctx["pred_a"] else (0.0, {})
+        ap_b, _ = image_map_from_arrays(
+            gt_arrays, _bucket_predictions(ctx["pred_b"], image_id, ctx["conf_threshold"]),
+            ctx["categories"], ctx["iou_threshold"]
+        ) if ctx["pred_b"] else (0.0, {})
+        results[image_id] = (ap_a, ap_b)
+    return results
+
+def compare_image_aps(gt_buckets, pred_a, pred_b, categories, iou_threshold=0.5, conf_threshold=0.0,
+                      image_ids=None, workers=None, parallel_min_images=2000):
+    """
+    같은 GT에 대해 두 예측 세트(예: 두 checkpoint)의 이미지별 AP와 ΔAP(= B - A)를 계산합니다.
+
+    Args:
+        gt_buckets (dict): image_id -> {category_id: [GT annotation, ...]} (coco_loader.build_category_buckets 결과).
+        pred_a, pred_b (Mapping): image_id -> score 내림차순 예측 리스트 (dict 또는 PredictionStore).
+        categories (dict): 평가할 카테고리 정보.
+        iou_threshold (float): TP/FP 판정을 위한 IoU 임계값.
+        conf_threshold (float): 이 값 미만의 예측은 제외합니다.
+        image_ids (iterable, optional): 비교할 이미지 ID. None이면 GT가 있는 모든 이미지.
+        workers (int, optional): 프로세스 수. None이면 이미지 수가 parallel_min_images 이상일 때 CPU 수만큼 사용.
+
+    Returns:
+        dict: image_id -> {"ap_a", "ap_b", "delta_ap"} (GT가 없는 이미지는 제외)
+    """
+    image_ids = list(gt_buckets.keys() if image_ids is None else image_ids)
+    if workers is None:
+        workers = (os.cpu_count() or 1) if len(image_ids) >= parallel_min_images else 1
+
+    init_args = (gt_buckets, pred_a, pred_b, categories, iou_threshold, conf_threshold)
+    if workers <= 1:
+        _init_compare_worker(*init_args)
+        partials = [_compare_image_chunk(image_ids)]
+    else:
+        chunk_size = max(1, len(image_ids) // (workers * 4))
+        chunks = [image_ids[i:i + chunk_size] for i in range(0, len(image_ids), chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_compare_worker, initargs=init_args) as executor:
+            partials = list(executor.map(_compare_image_chunk, chunks))
+
+    results = {}
+    for partial in partials:
+        for image_id, (ap_a, ap_b) in partial.items():
+            results[image_id] = {"ap_a": ap_a, "ap_b": ap_b, "delta_ap": ap_b - ap_a}
+    return results
+
+def images_with_unmatched_predictions(gt_buckets, pred_annotations, categories, image_ids, min_score,
+                                      iou_threshold=0.5, inclusive=False):
+    """
+    score가 min_score보다 크고(inclusive면 이상) 어떤 GT와도 매칭되지 않은(FP) 예측이 있는 이미지를 찾습니다.
+    매칭은 evaluate_dataset과 같은 규칙(MATCH_VOC, ignore 영역에 떨어진 예측 제외)입니다.
+    score가 더 높은 예측만 매칭 결과에 영향을 주므로 min_score 이상의 예측만 매칭해도 결과가 같습니다.
+
+    Args:
+        image_ids (iterable): 확인할 이미지 (예: ImageIndex.images_with_score로 좁힌 후보).
+
+    Returns:
+        list: 조건을 만족하는 image_id (image_ids 순서).
+    """
+    found = []
+    for image_id in image_ids:
+        pred_by_cat = _bucket_predictions(pred_annotations, image_id, min_score)
+        gt_arrays = gt_box_arrays(gt_buckets.get(image_id, {}))
+        for cat_id, preds in pred_by_cat.items():
+            if cat_id not in categories:
+                continue
+            gt_boxes, ignore_boxes, ignore_crowd = gt_arrays.get(cat_id, _EMPTY_GT_ARRAYS)
+            tp, keep = _match_category(gt_boxes, [p['bbox'] for p in preds], iou_threshold, ignore_boxes, ignore_crowd)
+            above = np.array([p['score'] >= min_score if inclusive else p['score'] > min_score for p in preds])
+            if np.any((tp == 0) & keep & above):
+                found.append(image_id)
+                break
+    return found
+
+BOOTSTRAP_SAMPLES = 1000
+BOOTSTRAP_CHUNK = 25 # 한 번에 처리하는 bootstrap 표본 수 (worker 작업 단위, 메모리 사용량 제한)
+
+_BOOTSTRAP_CONTEXT = {}
+
+def _init_bootstrap_worker(per_class, num_images):
+    _BOOTSTRAP_CONTEXT.update(per_class=per_class, num_images=num_images)
+
+def _bootstrap_chunk(task):
+    """
+    (표본 수, SeedSequence) 하나에 대해 이미지를 복원 추출하고 클래스별 AP를 다시 계산합니다.
+    이미지가 뽑힌 횟수를 예측/GT의 가중치로 써서 누적 TP/FP를 만들므로 매칭은 다시 하지 않습니다.
+
+    Returns:
+        np.ndarray: [b] 표본별 mAP
+        dict: category_id -> [b] 표본별 AP (표본에 해당 클래스가 없으면 nan)
+    """
+    num_samples, seed_seq = task
+    ctx = _BOOTSTRAP_CONTEXT
+    num_images = ctx["num_images"]
+    rng = np.random.default_rng(seed_seq)
+    # counts[b, i]: b번째 표본에서 i번째 이미지가 뽑힌 횟수
+    counts = rng.multinomial(num_images, np.full(num_images, 1.0 / num_images), size=num_samples).astype(np.float64)
+
+    ap_sum = np.zeros(num_samples)
+    num_present = np.zeros(num_samples)
+    class_aps = {}
+    for cat_id, cache in ctx["per_class"].items():
+        weights = counts[:, cache["image_index"]] # [b, 예측 수], score 내림차순
+        num_gt = counts[:, cache["gt_image_index"]] @ cache["gt_count"] if len(cache["gt_count"]) else np.zeros(num_samples)
+        tp_weights = weights * cache["tp"]
+        tp_cumsum = np.cumsum(tp_weights, axis=1)
+        prec = tp_cumsum / (np.cumsum(weights, axis=1) + 1e-10) # 분모 = 누적 TP + 누적 FP
+        # calculate_ap와 같은 all-point 보간: precision envelope x recall 증가분
+        # (recall 증가분은 TP 가중치 / GT 수, 가중치 0인 예측은 증가분 0)
+        envelope = np.maximum.accumulate(prec[:, ::-1], axis=1)[:, ::-1]
+        ap = (tp_weights * envelope).sum(axis=1) / (num_gt + 1e-10)
+        ap[num_gt == 0] = 0. # _ap_from_matches와 동일
+        present = (num_gt > 0) | (weights.sum(axis=1) > 0)
+        ap_sum += np.where(present, ap, 0.)
+        num_present += present
+        class_aps[cat_id] = np.where(present, ap, np.nan)
+    sample_maps = np.divide(ap_sum, num_present, out=np.zeros(num_samples), where=num_present > 0)
+    return sample_maps, class_aps
+
+def bootstrap_map(match_cache, num_samples=BOOTSTRAP_SAMPLES, confidence=0.95, seed=0, workers=None):
+    """
+    evaluate_dataset()의 match_cache로 데이터셋 mAP의 bootstrap 신뢰구간을 계산합니다.
+    이미지를 복원 추출(num_samples회)하여 캐시된 이미지별/클래스별 TP, score 배열로 mAP를 다시 계산하며,
+    IoU 매칭은 다시 하지 않습니다. 같은 seed면 workers 수와 관계없이 같은 결과가 나옵니다.
+
+    Args:
+        match_cache (dict): evaluate_dataset()이 반환한 매칭 결과 캐시.
+        num_samples (int): bootstrap 표본 수 (B).
+        confidence (float): 신뢰 수준 (예: 0.95 -> 2.5%, 97.5% percentile).
+        seed (int): 난수 seed.
+        workers (int, optional): 프로세스 수. None이면 1 (표본 수가 많을 때 지정).
+
+    Returns:
+        dict: {"map", "mean", "std", "ci_low", "ci_high", "confidence", "num_samples", "seed",
+               "per_class": {category_id: {"ap", "ci_low", "ci_high"}}, "samples": [B] 표본별 mAP}
+              평가한 이미지가 없으면 None.
+    """
+    per_class = match_cache.get("per_class", {})
+    num_images = len(match_cache.get("image_ids", []))
+    if num_images == 0 or not per_class:
+        return None
+
+    chunk_sizes = [min(BOOTSTRAP_CHUNK, num_samples - start) for start in range(0, num_samples, BOOTSTRAP_CHUNK)]
+    # 작업 단위별로 독립된 난수 스트림을 미리 나누어 두므로 병렬 처리해도 결과가 같음
+    tasks = list(zip(chunk_sizes, np.random.SeedSequence(seed).spawn(len(chunk_sizes))))
+
+    init_args = (per_class, num_images)
+    if workers is None or workers <= 1:
+        _init_bootstrap_worker(*init_args)
+        results = [_bootstrap_chunk(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_bootstrap_worker, initargs=init_args) as executor:
+            results = list(executor.map(_bootstrap_chunk, tasks))
+
+    samples = np.concatenate([maps for maps, _ in results])
+    tail = (1. - confidence) / 2. * 100.
+    ci_low, ci_high = np.percentile(samples, [tail, 100. - tail])
+
+    class_ci = {}
+    for cat_id, cache in per_class.items():
+        values = np.concatenate([aps[cat_id] for _, aps in results])
+        values = values[~np.isnan(values)]
+        low, high = np.percentile(values, [tail, 100. - tail]) if len(values) else (np.nan, np.nan)
+        class_ci[cat_id] = {
+            "ap": _ap_from_matches(cache["scores"], cache["tp"], cache["num_gt"]),
+            "ci_low": float(low),
+            "ci_high": float(high),
+        }
+    class_aps = [c["ap"] for c in class_ci.values()]
+
+    return {
+        "map": float(np.mean(class_aps)) if class_aps else 0.0,
+        "mean": float(samples.mean()),
+        "std": float(samples.std(ddof=1)) if len(samples) > 1 else 0.0,
+        "ci_low": float(ci_low),
+        "ci_high": float(ci_high),
+        "confidence": confidence,
+        "num_samples": int(num_samples),
+        "seed": seed,
+        "per_class": class_ci,
+        "samples": samples,
+    }
+
 # 예시 사용법 (테스트용)
 if __name__ == '__main__':
     # 가상의 데이터 생성
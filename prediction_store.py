@@ -0,0 +1,195 @@
+# prediction_store.py
+import bisect
+from collections.abc import Mapping
+
+# overlay에 기록할 수 있는 수정 가능 필드
+EDITABLE_FIELDS = ("bbox", "category_id")
+
+
+class PredictionStore(Mapping):
+    """
+    원본 예측을 불변(immutable)으로 공유하고, 편집 내용은 이미지별 delta(overlay)로만 저장하는 저장소.
+
+    - 원본 예측 dict는 절대 수정하지 않습니다. 여러 뷰가 같은 dict 객체를 공유합니다.
+    - 편집은 {image_id: {pred_index: {"bbox": [...], "category_id": ...}}} 형태로 기록됩니다.
+    - store[image_id]는 overlay가 적용된 새 리스트를 반환합니다. (수정된 항목만 새 dict, 나머지는 원본 공유)
+      리스트의 원소(dict)는 공유 객체이므로 직접 수정하지 말고 apply_edit()를 사용해야 합니다.
+
+    coco_loader.load_predictions()가 반환하는 {image_id: [pred, ...]} 딕셔너리와 같은 방식(get, items, len, in)으로
+    사용할 수 있도록 Mapping 인터페이스를 구현합니다.
+
+    이미지별 예측 리스트는 score 내림차순이어야 합니다. (load_predictions가 보장, score는 편집 불가이므로 순서가 유지됨)
+    클래스별 score 순서는 get_by_category()가 처음 요청될 때 이미지 단위로 만들고, label 편집 시 해당 항목만 옮깁니다.
+    """
+
+    def __init__(self, predictions_by_image):
+        self._base = predictions_by_image if predictions_by_image is not None else {}
+        self._overlays = {}
+        self._class_order = {} # image_id -> {category_id: [(-score, index), ...]} (정렬 상태 유지)
+
+    # --- Mapping 인터페이스 ---
+    def __getitem__(self, image_id):
+        base_preds = self._base[image_id]
+        overlay = self._overlays.get(image_id)
+        if not overlay:
+            return list(base_preds)
+        return [self._merge(pred, overlay[idx]) if idx in overlay else pred
+                for idx, pred in enumerate(base_preds)]
+
+    def __iter__(self):
+        return iter(self._base)
+
+    def __len__(self):
+        return len(self._base)
+
+    def __contains__(self, image_id):
+        return image_id in self._base
+
+    @staticmethod
+    def _merge(pred, delta):
+        merged = dict(pred)
+        merged.update(delta)
+        return merged
+
+    # --- 편집 ---
+    def get_original(self, image_id, index):
+        """overlay를 적용하지 않은 원본 예측(dict, 공유 객체)을 반환합니다."""
+        return self._base[image_id][index]
+
+    def get_prediction(self, image_id, index):
+        """overlay가 적용된 단일 예측을 반환합니다."""
+        pred = self._base[image_id][index]
+        delta = self._overlays.get(image_id, {}).get(index)
+        return self._merge(pred, delta) if delta else pred
+
+    def apply_edit(self, image_id, index, **changes):
+        """
+        예측 하나에 대한 편집을 overlay에 기록합니다.
+
+        Args:
+            image_id: 이미지 ID.
+            index (int): 해당 이미지 예측 리스트 내 인덱스.
+            **changes: bbox, category_id 중 변경할 값.
+
+        Returns:
+            dict: overlay가 적용된 예측 (새 dict).
+        """
+        base_pred = self._base[image_id][index]
+        overlay = self._overlays.setdefault(image_id, {})
+        delta = dict(overlay.get(index, {}))
+        old_category_id = delta.get("category_id", base_pred.get("category_id"))
+
+        for field, value in changes.items():
+            if field not in EDITABLE_FIELDS:
+                raise KeyError(f"편집할 수 없는 필드입니다: {field}")
+            if field == "bbox":
+                value = [float(c) for c in value]
+            # 원본과 같아지면 delta에서 제거 (overlay를 최소로 유지)
+            if base_pred.get(field) == value:
+                delta.pop(field, None)
+            else:
+                delta[field] = value
+
+        if delta:
+            overlay[index] = delta
+        else:
+            overlay.pop(index, None)
+            if not overlay:
+                del self._overlays[image_id]
+
+        new_category_id = delta.get("category_id", base_pred.get("category_id"))
+        if new_category_id != old_category_id:
+            self._move_class_entry(image_id, index, base_pred.get("score", 0.0), old_category_id, new_category_id)
+        return self.get_prediction(image_id, index)
+
+    def reset(self, image_id):
+        """해당 이미지의 overlay를 버려 원본 상태로 되돌립니다."""
+        self._overlays.pop(image_id, None)
+        self._class_order.pop(image_id, None)
+
+    def reset_all(self):
+        self._overlays.clear()
+        self._class_order.clear()
+
+    # --- 클래스별 score 순서 ---
+    def _build_class_order(self, image_id):
+        order = {}
+        overlay = self._overlays.get(image_id, {})
+        for idx, pred in enumerate(self._base.get(image_id, [])):
+            cat_id = overlay.get(idx, {}).get("category_id", pred.get("category_id"))
+            order.setdefault(cat_id, []).append((-pred.get("score", 0.0), idx))
+        for entries in order.values():
+            entries.sort() # 이미 정렬된 입력이면 선형 시간
+        self._class_order[image_id] = order
+        return order
+
+    def _move_class_entry(self, image_id, index, score, old_category_id, new_category_id):
+        """label이 바뀐 예측 하나를 클래스별 순서에서 옮깁니다. (순서가 아직 만들어지지 않았으면 아무것도 하지 않음)"""
+        order = self._class_order.get(image_id)
+        if order is None:
+            return
+        entry = (-score, index)
+        old_entries = order.get(old_category_id, [])
+        pos = bisect.bisect_left(old_entries, entry)
+        if pos < len(old_entries) and old_entries[pos] == entry:
+            del old_entries[pos]
+            if not old_entries:
+                del order[old_category_id]
+        bisect.insort(order.setdefault(new_category_id, []), entry)
+
+    def get_by_category(self, image_id, min_score=None):
+        """
+        overlay가 적용된 예측을 클래스별로 나누어 score 내림차순으로 반환합니다.
+
+        Args:
+            min_score (float, optional): 이 값 이상인 예측만 포함합니다. (정렬되어 있으므로 앞부분만 잘라냄)
+
+        Returns:
+            dict: category_id -> 예측 리스트 (예측이 남아 있는 클래스만 포함)
+        """
+        if image_id not in self._base:
+            return {}
+        order = self._class_order.get(image_id)
+        if order is None:
+            order = self._build_class_order(image_id)
+        result = {}
+        for cat_id, entries in order.items():
+            if min_score is None:
+                end = len(entries)
+            else:
+                end = bisect.bisect_right(entries, (-min_score, float('inf')))
+            if end:
+                result[cat_id] = [self.get_prediction(image_id, idx) for _, idx in entries[:end]]
+        return result
+
+    def is_modified(self, image_id=None):
+        if image_id is None:
+            return bool(self._overlays)
+        return image_id in self._overlays
+
+    def modified_image_ids(self):
+        return list(self._overlays.keys())
+
+    def overlay(self, image_id):
+        """해당 이미지의 delta({index: {field: value}})를 반환합니다. (읽기 전용으로 사용)"""
+        return self._overlays.get(image_id, {})
+
+    # --- 데이터셋 단위 읽기 ---
+    def iter_predictions(self, image_ids=None):
+        """overlay를 적용한 예측을 리스트 복사 없이 하나씩 순회합니다."""
+        if image_ids is None:
+            image_ids = self._base.keys()
+        for image_id in image_ids:
+            base_preds = self._base.get(image_id)
+            if not base_preds:
+                continue
+            overlay = self._overlays.get(image_id)
+            if not overlay:
+                yield from base_preds
+                continue
+            for idx, pred in enumerate(base_preds):
+                delta = overlay.get(idx)
+                yield self._merge(pred, delta) if delta else pred
+
+    def count_predictions(self):
+        return sum(len(preds) for preds in self._base.values())
@@ -0,0 +1,124 @@
+# profiling.py
+"""
+데이터셋 평가/메타데이터 계산 경로용 opt-in cProfile 모드.
+
+환경 변수 ANNOTATOR_PROFILE에 출력 디렉토리를 지정하거나("1"이면 ./profiles), evaluate.py --profile로 활성화합니다.
+profiled(label)로 감싼 함수가 호출될 때마다 실행(run) 디렉토리 하나가 만들어지고,
+
+    <출력 디렉토리>/<label>-<시각>-<pid>/
+        main.prof            # 호출한 프로세스의 프로파일
+        worker-<pid>-<n>.prof  # 프로세스 풀 worker의 프로파일 (있는 경우)
+        summary.txt          # 모든 프로파일을 합친 상위 N개 hotspot 표
+
+가 저장됩니다. .prof 파일은 pstats, snakeviz 등으로 열 수 있습니다.
+"""
+import cProfile
+import functools
+import io
+import itertools
+import os
+import pstats
+import time
+
+PROFILE_ENV = "ANNOTATOR_PROFILE"
+RUN_DIR_ENV = "ANNOTATOR_PROFILE_RUN" # 실행 중인 run 디렉토리 (worker 프로세스에 상속됨)
+RUN_OWNER_ENV = "ANNOTATOR_PROFILE_OWNER" # run을 시작한 프로세스 pid
+DEFAULT_PROFILE_DIR = "profiles"
+DEFAULT_TOP_N = 30
+
+_active_pid = None # 프로파일러가 동작 중인 프로세스 pid (중첩 호출 방지, fork된 worker에는 해당하지 않음)
+_worker_seq = itertools.count()
+
+
+def enable(output_dir=DEFAULT_PROFILE_DIR):
+    """프로파일 모드를 켭니다. 환경 변수로 설정하므로 이후 생성되는 worker 프로세스에도 적용됩니다."""
+    os.environ[PROFILE_ENV] = output_dir
+
+def is_enabled():
+    return os.environ.get(PROFILE_ENV, "") not in ("", "0")
+
+def profile_dir():
+    value = os.environ.get(PROFILE_ENV, "")
+    return DEFAULT_PROFILE_DIR if value in ("", "1") else value
+
+
+def summarize(profile_paths, output_path=None, top_n=DEFAULT_TOP_N):
+    """
+    여러 .prof 파일을 합쳐 누적 시간(cumulative)과 자체 시간(tottime) 기준 상위 top_n개 함수 표를 만듭니다.
+
+    Returns:
+        str: 요약 텍스트. output_path가 주어지면 파일로도 저장합니다.
+    """
+    if not profile_paths:
+        return ""
+    stream = io.StringIO()
+    stats = pstats.Stats(*profile_paths, stream=stream)
+    stats.strip_dirs()
+    stream.write(f"Profiles merged: {len(profile_paths)}\n\n")
+    stream.write(f"=== Top {top_n} by cumulative time ===\n")
+    stats.sort_stats("cumulative").print_stats(top_n)
+    stream.write(f"\n=== Top {top_n} by own time (tottime) ===\n")
+    stats.sort_stats("tottime").print_stats(top_n)
+    summary = stream.getvalue()
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(summary)
+    return summary
+
+
+def _profile_call(func, args, kwargs, output_path):
+    global _active_pid
+    profiler = cProfile.Profile()
+    _active_pid = os.getpid()
+    profiler.enable()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        profiler.disable()
+        _active_pid = None
+        profiler.dump_stats(output_path)
+
+
+def _run_session(label, func, args, kwargs):
+    """새 run 디렉토리를 만들고 func를 프로파일링한 뒤 worker 프로파일과 함께 요약합니다."""
+    run_dir = os.path.join(profile_dir(), f"{label}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}")
+    os.makedirs(run_dir, exist_ok=True)
+    previous = {key: os.environ.get(key) for key in (RUN_DIR_ENV, RUN_OWNER_ENV)}
+    os.environ[RUN_DIR_ENV] = run_dir
+    os.environ[RUN_OWNER_ENV] = str(os.getpid())
+    try:
+        return _profile_call(func, args, kwargs, os.path.join(run_dir, "main.prof"))
+    finally:
+        for key, value in previous.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        paths = sorted(os.path.join(run_dir, name) for name in os.listdir(run_dir) if name.endswith(".prof"))
+        summary_path = os.path.join(run_dir, "summary.txt")
+        try:
+            summarize(paths, summary_path)
+            print(f"프로파일 저장: {run_dir} (요약: {summary_path})")
+        except (OSError, TypeError, ValueError) as e:
+            print(f"경고: 프로파일 요약을 만들 수 없습니다 - {e}")
+
+
+def profiled(label):
+    """
+    프로파일 모드일 때 함수 호출을 cProfile로 기록하는 decorator.
+
+    - 호출한 프로세스에서는 새 run을 시작합니다. (이미 프로파일 중이면 그대로 실행)
+    - 프로세스 풀 worker에서는 상속된 run 디렉토리에 worker-<pid>-<n>.prof를 추가합니다.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _active_pid == os.getpid() or not is_enabled():
+                return func(*args, **kwargs)
+            run_dir = os.environ.get(RUN_DIR_ENV)
+            if run_dir and os.environ.get(RUN_OWNER_ENV) != str(os.getpid()):
+                output_path = os.path.join(run_dir, f"worker-{os.getpid()}-{next(_worker_seq)}.prof")
+                return _profile_call(func, args, kwargs, output_path)
+            return _run_session(label, func, args, kwargs)
+        return wrapper
+    return decorator
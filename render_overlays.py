@@ -0,0 +1,106 @@
+# render_overlays.py
+"""
+GT/예측 overlay를 그린 리뷰용 이미지 묶음을 만드는 명령행 도구. (visualizer.render_dataset 사용)
+
+사용 예:
+    python render_overlays.py --gt instances_val2017.json --pred predictions.json \
+        --images val2017/ --output review/ --max-size 1280 --quality 85
+    python render_overlays.py --gt ... --images ... --output review/ --conf 0.3 --workers 8
+    python render_overlays.py --gt ... --images ... --output review/ --format PNG --no-gt
+
+    file_name에 하위 디렉토리가 있으면 (train/a.jpg) --output 아래에 같은 구조로 저장합니다.
+
+종료 코드:
+    0: 모든 이미지 저장 성공
+    2: 입력 파일 로드 실패, 또는 하나 이상의 이미지를 렌더링하지 못함 (원본 이미지 없음 등)
+"""
+import argparse
+import contextlib
+import sys
+import time
+
+import coco_loader
+import visualizer
+
+EXIT_OK = 0
+EXIT_ERROR = 2
+
+IMAGE_FORMATS = ("JPEG", "PNG", "WEBP")
+
+
+def _parse_size(text):
+    """"1280" 또는 "1280x720" 형식의 최대 크기를 (가로, 세로)로 바꿉니다."""
+    try:
+        parts = [int(v) for v in text.lower().split("x")]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"크기 형식이 잘못되었습니다: {text}") from None
+    if len(parts) == 1:
+        parts = parts * 2
+    if len(parts) != 2 or min(parts) <= 0:
+        raise argparse.ArgumentTypeError(f"크기 형식이 잘못되었습니다: {text}")
+    return tuple(parts)
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Render GT/prediction overlays to disk for review.")
+    parser.add_argument("--gt", required=True, help="GT COCO annotation JSON 경로")
+    parser.add_argument("--pred", help="예측 결과 파일 경로 (.json, .json.gz, .npz). 생략 시 GT만 그림")
+    parser.add_argument("--images", required=True, help="원본 이미지 디렉토리 (file_name 기준 경로)")
+    parser.add_argument("--output", required=True, help="결과 이미지 저장 디렉토리")
+    parser.add_argument("--conf", type=float, default=0.5, help="표시할 예측의 최소 confidence (기본값: 0.5)")
+    parser.add_argument("--max-size", type=_parse_size, default=None, metavar="W[xH]",
+                        help="출력 최대 크기. JPEG은 축소 디코딩을 사용 (기본값: 원본 크기)")
+    parser.add_argument("--quality", type=int, default=90, help="JPEG/WEBP 저장 품질 (기본값: 90)")
+    parser.add_argument("--format", choices=IMAGE_FORMATS, default="JPEG", help="저장 형식 (기본값: JPEG)")
+    parser.add_argument("--workers", type=int, default=None, help="렌더링 프로세스 수 (기본값: CPU 수, 1이면 순차 처리)")
+    parser.add_argument("--no-gt", action="store_true", help="GT 박스를 그리지 않음")
+    parser.add_argument("--no-pred", action="store_true", help="예측 박스를 그리지 않음")
+    return parser
+
+
+def main(argv=None):
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    if not 1 <= args.quality <= 100:
+        parser.error("--quality는 1에서 100 사이여야 합니다")
+
+    try:
+        return _run(args)
+    except Exception as e:
+        print(f"오류: 렌더링 중 예외가 발생했습니다 - {type(e).__name__}: {e}", file=sys.stderr)
+        return EXIT_ERROR
+
+
+def _run(args):
+    # 로더의 진행 메시지는 stderr로 보냄
+    with contextlib.redirect_stdout(sys.stderr):
+        images, gt_annotations, categories = coco_loader.load_coco_annotations(args.gt)
+        predictions = coco_loader.load_predictions(args.pred) if args.pred else {}
+    if images is None or categories is None or predictions is None:
+        print("오류: 렌더링에 필요한 파일을 로드하지 못했습니다.", file=sys.stderr)
+        return EXIT_ERROR
+
+    def report_progress(done, total):
+        print(f"\rRendering... {done}/{total}", end="", file=sys.stderr, flush=True)
+
+    start = time.perf_counter()
+    saved = visualizer.render_dataset(
+        images, gt_annotations, predictions, categories, args.images, args.output,
+        confidence_threshold=args.conf, show_gt=not args.no_gt, show_pred=not args.no_pred,
+        max_size=args.max_size, quality=args.quality, image_format=args.format,
+        workers=args.workers, progress_callback=report_progress
+    )
+    elapsed = time.perf_counter() - start
+    print(file=sys.stderr)
+
+    total = sum(1 for info in images.values() if info and 'file_name' in info)
+    failed = total - len(saved)
+    print(f"Rendered {len(saved)}/{total} images in {elapsed:.1f}s -> {args.output}")
+    if failed:
+        print(f"FAILED: {failed} images could not be rendered", file=sys.stderr)
+        return EXIT_ERROR
+    return EXIT_OK
+
+
+if __name__ == '__main__':
+    sys.exit(main())
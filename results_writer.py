@@ -0,0 +1,168 @@
+# results_writer.py
+import gzip
+import json
+import os
+import tempfile
+
+import numpy as np
+
+DEFAULT_BBOX_PRECISION = 2   # bbox 좌표 소수점 자릿수
+DEFAULT_SCORE_PRECISION = 4  # score 소수점 자릿수
+WRITE_CHUNK_RECORDS = 5000   # 한 번에 파일에 쓰는 레코드 수
+COLUMNAR_EXTENSIONS = (".npz",)
+MISSING_INT_ID = -1          # 컬럼형 저장에서 id가 없는 예측의 값
+
+
+def _is_gzip_path(path):
+    return path.lower().endswith(".gz")
+
+
+def is_columnar_path(path):
+    return path.lower().endswith(COLUMNAR_EXTENSIONS)
+
+
+def _format_record(pred, bbox_precision, score_precision):
+    """예측 하나를 compact COCO results 레코드(JSON 문자열)로 변환합니다."""
+    record = {
+        "image_id": pred.get("image_id"),
+        "category_id": int(pred["category_id"]),
+        "bbox": [round(float(c), bbox_precision) for c in pred.get("bbox", [])],
+        "score": round(float(pred["score"]), score_precision),
+    }
+    if pred.get("id") is not None:
+        record["id"] = pred["id"]
+    return json.dumps(record, separators=(',', ':'))
+
+
+def _output_mode(output_path):
+    """저장할 파일의 권한. 기존 파일이 있으면 그 권한, 없으면 0o666 & ~umask"""
+    try:
+        return os.stat(output_path).st_mode & 0o7777
+    except OSError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+class _AtomicOutput:
+    """같은 디렉토리의 임시 파일에 쓴 뒤 성공 시에만 rename 하여, 저장 도중 실패해도 기존 파일이 깨지지 않게 합니다."""
+
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self.temp_path = None
+
+    def __enter__(self):
+        directory = os.path.dirname(os.path.abspath(self.output_path))
+        fd, self.temp_path = tempfile.mkstemp(prefix=".tmp_", suffix=os.path.basename(self.output_path), dir=directory)
+        os.close(fd)
+        # mkstemp는 0600으로 만들고 rename은 권한을 유지하므로, 일반 open()으로 저장했을 때와 같은 권한으로 맞춤
+        os.chmod(self.temp_path, _output_mode(self.output_path))
+        return self.temp_path
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            os.replace(self.temp_path, self.output_path)
+        elif os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+        return False
+
+
+def write_coco_results(predictions, output_path, total=None, compress=None,
+                       bbox_precision=DEFAULT_BBOX_PRECISION, score_precision=DEFAULT_SCORE_PRECISION,
+                       progress_callback=None):
+    """
+    예측을 compact COCO results JSON으로 레코드 단위 스트리밍 저장합니다.
+
+    Args:
+        predictions (iterable): 예측 dict를 하나씩 내놓는 iterable (예: PredictionStore.iter_predictions()).
+        output_path (str): 저장 경로. 임시 파일에 쓴 뒤 rename 하므로 원자적으로 교체됩니다.
+        total (int, optional): 전체 예측 수. progress 계산에 사용.
+        compress (bool, optional): gzip 압축 여부. None이면 확장자(.gz)로 판단.
+        bbox_precision (int): bbox 좌표 소수점 자릿수.
+        score_precision (int): score 소수점 자릿수.
+        progress_callback (callable, optional): progress_callback(written, total) 형태로 주기적으로 호출.
+
+    Returns:
+        int: 저장된 레코드 수.
+    """
+    if compress is None:
+        compress = _is_gzip_path(output_path)
+
+    written = 0
+    with _AtomicOutput(output_path) as temp_path:
+        opener = gzip.open if compress else open
+        with opener(temp_path, 'wt', encoding='utf-8') as f:
+            f.write("[")
+            chunk = []
+            for pred in predictions:
+                chunk.append(_format_record(pred, bbox_precision, score_precision))
+                written += 1
+                if len(chunk) >= WRITE_CHUNK_RECORDS:
+                    f.write(("," if written > len(chunk) else "") + "\n" + ",\n".join(chunk))
+                    chunk = []
+                    if progress_callback:
+                        progress_callback(written, total)
+            if chunk:
+                f.write(("," if written > len(chunk) else "") + "\n" + ",\n".join(chunk))
+            f.write("\n]\n")
+    if progress_callback:
+        progress_callback(written, total)
+    return written
+
+
+def write_columnar_results(predictions, output_path, total=None, compress=True, progress_callback=None):
+    """
+    예측을 컬럼형 바이너리(.npz) 형식으로 저장합니다.
+    image_id, category_id, bbox[N, 4], score, id 배열을 각각 저장하므로 JSON보다 작고 읽기 빠릅니다.
+    id가 없는 예측은 정수 id 배열이면 -1, 문자열 id 배열이면 ""로 저장합니다.
+    coco_loader.load_predictions()로 다시 읽을 수 있습니다.
+    """
+    if total is None:
+        predictions = list(predictions)
+        total = len(predictions)
+
+    image_ids = np.empty(total, dtype=object)
+    category_ids = np.empty(total, dtype=np.int32)
+    bboxes = np.empty((total, 4), dtype=np.float32)
+    scores = np.empty(total, dtype=np.float32)
+    ann_ids = np.empty(total, dtype=object)
+
+    count = 0
+    for pred in predictions:
+        image_ids[count] = pred.get("image_id")
+        category_ids[count] = pred["category_id"]
+        bboxes[count] = pred["bbox"]
+        scores[count] = pred["score"]
+        ann_ids[count] = pred.get("id")
+        count += 1
+        if progress_callback and count % WRITE_CHUNK_RECORDS == 0:
+            progress_callback(count, total)
+
+    # image_id가 모두 정수면 정수 배열로 저장 (object 배열은 pickle이 필요하므로 피함)
+    image_ids = image_ids[:count]
+    if all(isinstance(i, (int, np.integer)) for i in image_ids):
+        image_ids = image_ids.astype(np.int64)
+    else:
+        image_ids = image_ids.astype(str)
+    ann_ids = ann_ids[:count]
+    present = [i for i in ann_ids if i is not None]
+    if all(isinstance(i, (int, np.integer)) for i in present):
+        ann_ids = np.array([MISSING_INT_ID if i is None else i for i in ann_ids], dtype=np.int64)
+    else:
+        ann_ids = np.array(["" if i is None else str(i) for i in ann_ids], dtype=str)
+
+    with _AtomicOutput(output_path) as temp_path:
+        save = np.savez_compressed if compress else np.savez
+        with open(temp_path, 'wb') as f:
+            save(f, image_id=image_ids, category_id=category_ids[:count],
+                 bbox=bboxes[:count], score=scores[:count], id=ann_ids)
+    if progress_callback:
+        progress_callback(count, total)
+    return count
+
+
+def write_results(predictions, output_path, total=None, progress_callback=None, **kwargs):
+    """확장자에 따라 JSON(.json, .json.gz) 또는 컬럼형(.npz) 형식으로 저장합니다."""
+    if is_columnar_path(output_path):
+        return write_columnar_results(predictions, output_path, total=total, progress_callback=progress_callback)
+    return write_coco_results(predictions, output_path, total=total, progress_callback=progress_callback, **kwargs)
@@ -1,133 +1,247 @@
 import json
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
 from PIL import Image
+from collections import OrderedDict, defaultdict
 import numpy as np
 import os
 
-def show_annotation(json_file, img_dir, index=0):
+# COCO 클래스 레이블 (필요에 따라 수정)
+COCO_CLASSES = {
+    1: 'person', 2: 'bicycle', 3: 'car', 4: 'motorcycle', 5: 'airplane',
+    6: 'bus', 7: 'train', 8: 'truck', 9: 'boat', 10: 'traffic light',
+    11: 'fire hydrant', 13: 'stop sign', 14: 'parking meter', 15: 'bench',
+    16: 'bird', 17: 'cat', 18: 'dog', 19: 'horse', 20: 'sheep',
+    # 나머지 클래스들도 필요에 따라 추가
+}
+
+
+class PredictionIndex:
+    """
+    예측 결과 JSON 파일에 대한 인덱스.
+
+    파일을 한 번만 읽어 각 예측 레코드의 byte offset과 image_id → 레코드 번호 맵을 만들고,
+    이후에는 필요한 레코드만 seek 해서 읽습니다. 이미지 하나의 예측을 가져오는 비용은 파일 크기와 무관합니다.
+    """
+
+    def __init__(self, json_file, cache_size=256):
+        self.json_file = json_file
+        self.cache_size = cache_size
+        self._cache = OrderedDict() # image_id -> 예측 리스트 (LRU)
+        self._build()
+
+    def _build(self):
+        with open(self.json_file, 'rb') as f:
+            data = f.read()
+        self._mtime = os.path.getmtime(self.json_file)
+        text = data.decode('utf-8')
+        # ASCII 파일이면 문자 offset == byte offset
+        is_ascii = len(text) == len(data)
+
+        decoder = json.JSONDecoder()
+        starts, ends, image_ids = [], [], []
+        image_to_records = defaultdict(list)
+
+        pos = text.index('[') + 1
+        byte_pos, char_pos = pos, pos # 문자 offset을 byte offset으로 바꾸기 위한 누적 위치
+        length = len(text)
+        while True:
+            # 공백과 구분자(,)를 건너뜀
+            while pos < length and text[pos] in ' \t\r\n,':
+                pos += 1
+            if pos >= length or text[pos] == ']':
+                break
+            record, end = decoder.raw_decode(text, pos)
+
+            if is_ascii:
+                start_byte, end_byte = pos, end
+            else:
+                byte_pos += len(text[char_pos:pos].encode('utf-8'))
+                start_byte = byte_pos
+                byte_pos += len(text[pos:end].encode('utf-8'))
+                end_byte = byte_pos
+                char_pos = end
+
+            record_no = len(starts)
+            starts.append(start_byte)
+            ends.append(end_byte)
+            image_id = record.get('image_id') if isinstance(record, dict) else None
+            image_ids.append(image_id)
+            if image_id is not None:
+                image_to_records[image_id].append(record_no)
+            pos = end
+
+        self._starts = np.asarray(starts, dtype=np.int64)
+        self._lengths = np.asarray(ends, dtype=np.int64) - self._starts
+        self._record_image_ids = image_ids
+        self._image_to_records = dict(image_to_records)
+
+    def __len__(self):
+        return len(self._starts)
+
+    def is_stale(self):
+        """파일이 인덱스 생성 이후 변경되었는지 확인합니다."""
+        return not os.path.exists(self.json_file) or os.path.getmtime(self.json_file) != self._mtime
+
+    def image_ids(self):
+        return list(self._image_to_records.keys())
+
+    def image_id_of(self, index):
+        """index번째 예측 레코드의 image_id를 파일을 다시 읽지 않고 반환합니다."""
+        return self._record_image_ids[index]
+
+    def _read_records(self, record_numbers):
+        records = []
+        with open(self.json_file, 'rb') as f:
+            for record_no in record_numbers:
+                f.seek(int(self._starts[record_no]))
+                records.append(json.loads(f.read(int(self._lengths[record_no]))))
+        return records
+
+    def get_record(self, index):
+        """index번째 예측 레코드를 읽어 반환합니다."""
+        return self._read_records([index])[0]
+
+    def get_predictions(self, image_id):
+        """해당 이미지의 모든 예측을 반환합니다."""
+        if image_id in self._cache:
+            self._cache.move_to_end(image_id)
+            return self._cache[image_id]
+        predictions = self._read_records(self._image_to_records.get(image_id, []))
+        self._cache[image_id] = predictions
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return predictions
+
+
+_INDEX_CACHE = {} # 파일 경로 -> PredictionIndex
+
+def get_prediction_index(json_file):
+    """파일 경로에 대한 PredictionIndex를 반환합니다. 파일이 바뀌지 않았다면 이미 만든 인덱스를 재사용합니다."""
+    if isinstance(json_file, PredictionIndex):
+        return json_file
+    index = _INDEX_CACHE.get(json_file)
+    if index is None or index.is_stale():
+        index = PredictionIndex(json_file)
+        _INDEX_CACHE[json_file] = index
+    return index
+
+def show_annotation(json_file, img_dir, index=0, image_id=None, show=True):
     """
-    COCO 데이터셋의 예측 결과 중 하나만 시각화하는 함수
-    
+    COCO 데이터셋의 예측 결과를 이미지 단위로 시각화하는 함수
+
     Args:
-        json_file (str): 예측 결과가 저장된 JSON 파일 경로
+        json_file (str | PredictionIndex): 예측 결과가 저장된 JSON 파일 경로 또는 미리 만든 인덱스
         img_dir (str): 이미지가 저장된 디렉토리 경로
-        index (int): 시각화할 예측 결과의 인덱스 (기본값: 0)
+        index (int): 시각화할 예측 결과의 인덱스 (기본값: 0). 해당 예측이 속한 이미지의 모든 예측을 표시합니다.
+        image_id (int, optional): 지정하면 index 대신 이 이미지의 예측을 표시합니다.
+        show (bool): plt.show() 호출 여부
     """
-    # JSON 파일에서 예측 결과 로드
-    with open(json_file, 'r') as f:
-        predictions = json.load(f)
-    
-    # 특정 인덱스의 예측 결과 가져오기
-    if index >= len(predictions):
-        print(f"인덱스가 범위를 벗어납니다. 전체 예측 결과 수: {len(predictions)}")
-        return
-    
-    prediction = predictions[index]
-    
-    # 이미지 ID 가져오기
-    image_id = prediction.get('image_id')
+    # 예측 인덱스 가져오기 (파일은 처음 한 번만 읽음)
+    predictions = get_prediction_index(json_file)
+
+    if image_id is None:
+        # 특정 인덱스의 예측 결과가 속한 이미지 ID 가져오기
+        if index >= len(predictions):
+            print(f"인덱스가 범위를 벗어납니다. 전체 예측 결과 수: {len(predictions)}")
+            return
+        image_id = predictions.image_id_of(index)
     if not image_id:
         print("예측 결과에 image_id가 없습니다.")
         return
-    
+
     # COCO 형식의 이미지 파일명 (예: 000000123456.jpg)
     image_file = os.path.join(img_dir, f"{int(image_id):012d}.jpg")
-    
+
     if not os.path.exists(image_file):
         print(f"이미지 파일을 찾을 수 없습니다: {image_file}")
         return
-    
+
     # 이미지 로드
     image = Image.open(image_file)
-    
+
+    # matplotlib은 import 비용이 크므로 실제로 그릴 때만 불러옴
+    import matplotlib.pyplot as plt
+    import matplotlib.patches as patches
+
     # 시각화 준비
     fig, ax = plt.subplots(1, figsize=(12, 9))
     ax.imshow(image)
-    
-    # COCO 클래스 레이블 (필요에 따라 수정)
-    coco_classes = {
-        1: 'person', 2: 'bicycle', 3: 'car', 4: 'motorcycle', 5: 'airplane',
-        6: 'bus', 7: 'train', 8: 'truck', 9: 'boat', 10: 'traffic light',
-        11: 'fire hydrant', 13: 'stop sign', 14: 'parking meter', 15: 'bench',
-        16: 'bird', 17: 'cat', 18: 'dog', 19: 'horse', 20: 'sheep',
-        # 나머지 클래스들도 필요에 따라 추가
-    }
-    
-    # 예측 결과 시각화 (경계 상자, 클래스, 신뢰도 점수)
-    if 'bbox' in prediction and 'category_id' in prediction:
+
+    # 예측 결과 시각화 (경계 상자, 클래스, 신뢰도 점수) - 이미지의 모든 예측
+    for prediction in predictions.get_predictions(image_id):
+        if 'bbox' not in prediction or 'category_id' not in prediction:
+            continue
         bbox = prediction['bbox']  # [x, y, width, height] 형식
         category_id = prediction['category_id']
         score = prediction.get('score', 0)
-        
+
         # 경계 상자 그리기
         rect = patches.Rectangle(
             (bbox[0], bbox[1]), bbox[2], bbox[3],
             linewidth=2, edgecolor='r', facecolor='none'
         )
         ax.add_patch(rect)
-        
+
         # 클래스 이름과 신뢰도 점수 표시
-        class_name = coco_classes.get(category_id, f"Class {category_id}")
+        class_name = COCO_CLASSES.get(category_id, f"Class {category_id}")
         ax.text(
             bbox[0], bbox[1] - 5,
             f"{class_name}: {score:.2f}",
             color='white', fontsize=12, backgroundcolor='red'
         )
-    
+
     plt.axis('off')
     plt.tight_layout()
-    plt.show()
-    
+    if show:
+        plt.show()
+
     return fig
 
+def save_annotation(json_file, img_dir, output_dir, index=0, image_id=None):
+    """
+    COCO 데이터셋의 예측 결과를 시각화하고 저장하는 함수
+
+    Args:
+        json_file (str | PredictionIndex): 예측 결과가 저장된 JSON 파일 경로 또는 미리 만든 인덱스
+        img_dir (str): 이미지가 저장된 디렉토리 경로
+        output_dir (str): 시각화된 이미지를 저장할 디렉토리 경로
+        index (int): 시각화할 예측 결과의 인덱스 (기본값: 0)
+        image_id (int, optional): 지정하면 index 대신 이 이미지를 저장합니다.
+    """
+    # 출력 디렉토리 생성
+    os.makedirs(output_dir, exist_ok=True)
+
+    predictions = get_prediction_index(json_file)
+
+    # 시각화 실행
+    fig = show_annotation(predictions, img_dir, index, image_id=image_id, show=False)
+
+    if fig:
+        # 이미지 ID는 인덱스에서 바로 가져옴 (파일을 다시 읽지 않음)
+        if image_id is None:
+            image_id = predictions.image_id_of(index)
+
+        # 파일 저장
+        output_path = os.path.join(output_dir, f"annotation_{int(image_id):012d}.png")
+        fig.savefig(output_path, bbox_inches='tight', pad_inches=0.0)
+        import matplotlib.pyplot as plt
+        plt.close(fig)
+        print(f"이미지가 저장되었습니다: {output_path}")
+        return output_path
+
+    return None
+
 # 실행 예시
 if __name__ == "__main__":
     # 파일 경로 설정
     predictions_file = "/home/porsche3/Jong/capstone/faster_rcnn_predictions.json"
     image_directory = "/home/porsche3/Jong/capstone/coco2017/val2017"  # 실제 이미지 디렉토리 경로로 수정 필요
-    
-    # 첫 번째 예측 결과 시각화
-    show_annotation(predictions_file, image_directory, index=0)
-    def save_annotation(json_file, img_dir, output_dir, index=0):
-        """
-        COCO 데이터셋의 예측 결과를 시각화하고 저장하는 함수
-        
-        Args:
-            json_file (str): 예측 결과가 저장된 JSON 파일 경로
-            img_dir (str): 이미지가 저장된 디렉토리 경로
-            output_dir (str): 시각화된 이미지를 저장할 디렉토리 경로
-            index (int): 시각화할 예측 결과의 인덱스 (기본값: 0)
-        """
-        # 출력 디렉토리 생성
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # 시각화 실행
-        fig = show_annotation(json_file, img_dir, index)
-        
-        if fig:
-            # 이미지 ID 가져오기
-            with open(json_file, 'r') as f:
-                predictions = json.load(f)
-            
-            prediction = predictions[index]
-            image_id = prediction.get('image_id')
-            
-            # 파일 저장
-            output_path = os.path.join(output_dir, f"annotation_{int(image_id):012d}.png")
-            fig.savefig(output_path, bbox_inches='tight', pad_inches=0.0)
-            plt.close(fig)
-            print(f"이미지가 저장되었습니다: {output_path}")
-            return output_path
-        
-        return None
-
-    # 함수 사용 예시
-    if __name__ == "__main__":
-        # 파일 경로 설정
-        predictions_file = "/home/porsche3/Jong/capstone/faster_rcnn_predictions.json"
-        image_directory = "/home/porsche3/Jong/capstone/coco2017/val2017"
-        output_directory = "/home/porsche3/Jong/capstone/output_annotations"
-        
-        # 예측 결과 시각화 및 저장
-        save_annotation(predictions_file, image_directory, output_directory, index=0)
+    output_directory = "/home/porsche3/Jong/capstone/output_annotations"
+
+    # 인덱스는 한 번만 만들고 재사용
+    prediction_index = PredictionIndex(predictions_file)
+
+    # 첫 번째 예측 결과가 속한 이미지 시각화
+    show_annotation(prediction_index, image_directory, index=0)
+
+    # 예측 결과 시각화 및 저장
+    save_annotation(prediction_index, image_directory, output_directory, index=0)
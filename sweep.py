@@ -0,0 +1,223 @@
+# sweep.py
+"""
+여러 checkpoint의 예측 파일을 같은 GT로 한 번에 평가하는 명령행 도구.
+
+GT는 한 번만 로드하고 이미지별/클래스별 박스 배열(map_calculator.build_gt_index)로 변환해 둡니다.
+예측 파일은 프로세스 풀에서 파일 단위로 동시에 로드/평가하며, GT는 worker 초기화 시 fork로 공유됩니다.
+(copy-on-write, 읽기 전용이므로 checkpoint마다 GT를 다시 읽거나 복사하지 않음)
+
+사용 예:
+    python sweep.py --gt instances_val2017.json --pred runs/exp1/ckpt_*.json --output sweep.csv
+    python sweep.py --gt instances_val2017.json --pred runs/exp1/preds/ --iou 0.5 --workers 8
+
+    --pred에 디렉토리를 주면 그 안의 .json, .json.gz, .npz 파일을 이름 순으로 모두 평가합니다.
+    --output이 .csv이면 표를 CSV로, 그 밖에는 JSON 리포트로 저장합니다.
+
+종료 코드:
+    0: 모든 checkpoint 평가 성공
+    2: GT 로드 실패, 또는 하나 이상의 checkpoint 평가 실패
+"""
+import argparse
+import contextlib
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import coco_loader
+import map_calculator
+import profiling
+
+EXIT_OK = 0
+EXIT_ERROR = 2
+
+PREDICTION_EXTENSIONS = ('.json', '.json.gz', '.npz')
+
+# worker 프로세스에서 공유하는 GT (initializer에서 한 번만 설정, fork 시 복사 없이 공유)
+_SWEEP_CONTEXT = {}
+
+
+def _init_sweep_worker(gt_annotations, gt_index, categories, image_ids, iou_threshold, conf_threshold):
+    _SWEEP_CONTEXT.update(
+        gt_annotations=gt_annotations, gt_index=gt_index, categories=categories,
+        image_ids=image_ids, iou_threshold=iou_threshold, conf_threshold=conf_threshold
+    )
+
+
+def _evaluate_checkpoint(pred_path):
+    """
+    예측 파일 하나를 로드하여 공유 GT로 평가합니다. (worker 프로세스에서 실행)
+
+    Returns:
+        dict: {"checkpoint", "pred_file", "map", "class_aps", "num_predictions", "seconds"}
+              로드에 실패하면 {"checkpoint", "pred_file", "error"}
+    """
+    ctx = _SWEEP_CONTEXT
+    start = time.perf_counter()
+    result = {"checkpoint": checkpoint_name(pred_path), "pred_file": pred_path}
+    predictions = coco_loader.load_predictions(pred_path)
+    if predictions is None:
+        result["error"] = "failed to load predictions"
+        return result
+    mean_ap, class_aps, _ = map_calculator.evaluate_dataset(
+        ctx["gt_annotations"], predictions, ctx["categories"],
+        iou_threshold=ctx["iou_threshold"], conf_threshold=ctx["conf_threshold"],
+        image_ids=ctx["image_ids"], workers=1, gt_index=ctx["gt_index"]
+    )
+    result.update(
+        map=mean_ap,
+        class_aps=class_aps,
+        num_predictions=sum(len(preds) for preds in predictions.values()),
+        seconds=time.perf_counter() - start,
+    )
+    return result
+
+
+def checkpoint_name(pred_path):
+    """표에 표시할 checkpoint 이름 (확장자를 뺀 파일명)"""
+    name = os.path.basename(pred_path)
+    for ext in PREDICTION_EXTENSIONS:
+        if name.lower().endswith(ext):
+            return name[:-len(ext)]
+    return name
+
+
+def expand_prediction_paths(paths):
+    """디렉토리는 그 안의 예측 파일(이름 순)로 펼치고, 파일은 주어진 순서를 유지합니다."""
+    expanded = []
+    for path in paths:
+        if os.path.isdir(path):
+            expanded.extend(sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if name.lower().endswith(PREDICTION_EXTENSIONS)
+            ))
+        else:
+            expanded.append(path)
+    return expanded
+
+
+@profiling.profiled("sweep")
+def run_sweep(gt_path, pred_paths, iou_threshold=0.5, conf_threshold=0.0, workers=None):
+    """
+    GT를 한 번 로드/색인한 뒤 pred_paths의 예측 파일을 프로세스 풀에서 동시에 평가합니다.
+
+    Args:
+        gt_path (str): GT COCO annotation 파일 경로.
+        pred_paths (list): checkpoint별 예측 파일 경로.
+        workers (int, optional): 프로세스 수. None이면 min(CPU 수, 파일 수).
+
+    Returns:
+        dict: 리포트 {"categories", "checkpoints": [...], "timings"}. GT 로드에 실패하면 None.
+    """
+    timings = {}
+    start = time.perf_counter()
+    images, gt_annotations, categories = coco_loader.load_coco_annotations(gt_path)
+    if images is None or categories is None:
+        return None
+    gt_index = map_calculator.build_gt_index(gt_annotations)
+    timings["load_gt"] = time.perf_counter() - start
+
+    if workers is None:
+        workers = min(os.cpu_count() or 1, len(pred_paths))
+    init_args = (gt_annotations, gt_index, categories, list(images.keys()), iou_threshold, conf_threshold)
+
+    start = time.perf_counter()
+    if workers <= 1:
+        _init_sweep_worker(*init_args)
+        results = [_evaluate_checkpoint(path) for path in pred_paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_sweep_worker, initargs=init_args) as executor:
+            results = list(executor.map(_evaluate_checkpoint, pred_paths))
+    timings["evaluate"] = time.perf_counter() - start
+
+    return {
+        "gt_file": gt_path,
+        "iou_threshold": iou_threshold,
+        "conf_threshold": conf_threshold,
+        "num_images": len(images),
+        "categories": {cat_id: cat.get("name", f"ID:{cat_id}") for cat_id, cat in sorted(categories.items())},
+        "checkpoints": results,
+        "timings": timings,
+    }
+
+
+def build_table(report):
+    """리포트를 checkpoint x (mAP, 클래스별 AP) 표로 만듭니다. 평가에 실패한 checkpoint는 값이 비어 있습니다."""
+    cat_ids = list(report["categories"])
+    header = ["checkpoint", "mAP"] + [report["categories"][cat_id] for cat_id in cat_ids]
+    rows = []
+    for result in report["checkpoints"]:
+        if "error" in result:
+            rows.append([result["checkpoint"], None] + [None] * len(cat_ids))
+            continue
+        class_aps = result["class_aps"]
+        rows.append([result["checkpoint"], result["map"]] + [class_aps.get(cat_id) for cat_id in cat_ids])
+    return header, rows
+
+
+def format_table(header, rows):
+    """표를 고정 폭 텍스트로 만듭니다. (값이 없으면 '-')"""
+    cells = [header] + [[row[0]] + ["-" if value is None else f"{value:.4f}" for value in row[1:]] for row in rows]
+    widths = [max(len(str(line[i])) for line in cells) for i in range(len(header))]
+    lines = []
+    for line in cells:
+        lines.append("  ".join(str(value).ljust(widths[0]) if i == 0 else str(value).rjust(widths[i])
+                               for i, value in enumerate(line)))
+    lines.insert(1, "  ".join("-" * width for width in widths))
+    return "\n".join(lines)
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Evaluate many checkpoint prediction files against one GT.")
+    parser.add_argument("--gt", required=True, help="GT COCO annotation JSON 경로")
+    parser.add_argument("--pred", required=True, nargs="+", help="checkpoint 예측 파일 또는 예측 파일이 있는 디렉토리")
+    parser.add_argument("--iou", type=float, default=0.5, help="IoU 임계값 (기본값: 0.5)")
+    parser.add_argument("--conf", type=float, default=0.0, help="confidence 임계값 (기본값: 0.0)")
+    parser.add_argument("--workers", type=int, default=None, help="동시에 평가할 프로세스 수 (기본값: min(CPU 수, 파일 수))")
+    parser.add_argument("--output", help="표 저장 경로 (.csv면 CSV, 그 밖에는 JSON 리포트)")
+    parser.add_argument("--profile", nargs="?", const=profiling.DEFAULT_PROFILE_DIR, default=None, metavar="DIR",
+                        help="sweep을 cProfile로 기록하여 DIR에 저장 (기본값: ./profiles)")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    if args.profile:
+        profiling.enable(args.profile)
+
+    pred_paths = expand_prediction_paths(args.pred)
+    if not pred_paths:
+        print("오류: 평가할 예측 파일이 없습니다.", file=sys.stderr)
+        return EXIT_ERROR
+
+    # 로더의 진행 메시지가 표준 출력의 표와 섞이지 않도록 stderr로 보냄
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run_sweep(args.gt, pred_paths, iou_threshold=args.iou, conf_threshold=args.conf, workers=args.workers)
+    if report is None:
+        print("오류: GT 파일을 로드하지 못했습니다.", file=sys.stderr)
+        return EXIT_ERROR
+
+    header, rows = build_table(report)
+    print(format_table(header, rows))
+
+    if args.output:
+        if args.output.lower().endswith(".csv"):
+            with open(args.output, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(header)
+                writer.writerows(["" if value is None else value for value in row] for row in rows)
+        else:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Sweep table ({len(rows)} checkpoints) -> {args.output}", file=sys.stderr)
+
+    failed = [result for result in report["checkpoints"] if "error" in result]
+    for result in failed:
+        print(f"FAILED: {result['pred_file']} ({result['error']})", file=sys.stderr)
+    return EXIT_ERROR if failed else EXIT_OK
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,9 @@
 # visualizer.py
 from PIL import Image, ImageDraw, ImageFont
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+import numpy as np
+import os
 import random
 
 # 색상 팔레트 (카테고리별로 다른 색상 사용 위함)
@@ -15,38 +19,75 @@ DEFAULT_COLORS = [
 
 
 
+# 프로세스별 폰트 캐시 (ImageFont.truetype 호출은 매번 파일을 찾고 파싱하므로 비용이 큼)
+_FONT_CACHE = {}
+
+# 배치 렌더링 worker 프로세스에서 공유하는 설정 (initializer에서 한 번만 전달)
+_RENDER_CONTEXT = {}
+
+
 def get_color(category_id):
     """카테고리 ID에 따라 색상을 반환합니다."""
     idx = category_id % len(DEFAULT_COLORS)
     return DEFAULT_COLORS[idx]
 
+def get_font(size=15):
+    """폰트를 한 번만 로드하여 프로세스 내에서 재사용합니다."""
+    font = _FONT_CACHE.get(size)
+    if font is None:
+        # 폰트 설정 (시스템에 따라 경로 수정 필요)
+        try:
+            font = ImageFont.truetype("arial.ttf", size)
+        except IOError:
+            font = ImageFont.load_default()
+        _FONT_CACHE[size] = font
+    return font
+
+def open_image(image_path, max_size=None):
+    """
+    이미지를 RGB로 엽니다. max_size(가로, 세로)가 주어지면 그 안에 들어가도록 축소합니다.
+    JPEG은 draft 모드로 디코딩 단계에서부터 축소하므로 큰 이미지를 훨씬 빠르게 읽습니다.
+
+    Returns:
+        tuple: (PIL.Image.Image, scale) - scale은 원본 좌표에 곱할 배율.
+    """
+    image = Image.open(image_path)
+    orig_w, orig_h = image.size
+    if max_size:
+        image.draft("RGB", max_size) # JPEG 이외의 형식에서는 아무 동작도 하지 않음
+    image = image.convert("RGB")
+    if max_size and (image.width > max_size[0] or image.height > max_size[1]):
+        image.thumbnail(max_size, Image.Resampling.LANCZOS)
+    scale = image.width / orig_w if orig_w else 1.0
+    return image, scale
+
 def draw_annotations(image_path, gt_annotations, pred_annotations, categories,
                      confidence_threshold=0.5, iou_threshold_for_match=0.5,
-                     show_gt=True, show_pred=True):
+                     show_gt=True, show_pred=True, max_size=None, presorted=False, strict=False):
     """
     이미지에 Ground Truth와 예측 Annotation을 그립니다.
 
     Args:
         image_path (str): 이미지 파일 경로.
         gt_annotations (list): GT annotation 리스트.
-        pred_annotations (list): 예측 annotation 리스트.
+        pred_annotations (list): 예측 annotation 리스트. 입력 리스트는 변경하지 않습니다.
         categories (dict): 카테고리 정보 딕셔너리.
         confidence_threshold (float): 표시할 예측의 최소 confidence 점수.
         iou_threshold_for_match (float): GT와 예측 매칭 확인용 IoU 임계값 (시각화용).
         show_gt (bool): GT 박스 표시 여부.
         show_pred (bool): 예측 박스 표시 여부.
+        max_size (tuple, optional): 출력 이미지 최대 크기 (가로, 세로). 주어지면 축소 디코딩 후 박스도 같은 배율로 그림.
+        presorted (bool): pred_annotations가 이미 score 내림차순이면 True (load_predictions 결과).
+            True이면 정렬하지 않고 threshold 미만 score가 나오는 곳에서 멈춥니다.
+        strict (bool): True이면 이미지를 읽거나 그리지 못했을 때 회색 대체 이미지 대신 None을 반환합니다. (배치 렌더링용)
 
     Returns:
-        PIL.Image.Image: Annotation이 그려진 이미지 객체.
+        PIL.Image.Image: Annotation이 그려진 이미지 객체. strict=True에서 실패하면 None.
     """
     try:
-        image = Image.open(image_path).convert("RGB")
+        image, scale = open_image(image_path, max_size)
         draw = ImageDraw.Draw(image)
-        # 폰트 설정 (시스템에 따라 경로 수정 필요)
-        try:
-            font = ImageFont.truetype("arial.ttf", 15)
-        except IOError:
-            font = ImageFont.load_default()
+        font = get_font(15)
 
         # GT 그리기
         if show_gt and gt_annotations:
@@ -57,7 +98,7 @@ def draw_annotations(image_path, gt_annotations, pred_annotations, categories,
                 label = cat_info.get('name', f'ID:{cat_id}')
                 color = get_color(cat_id)
 
-                xmin, ymin, w, h = bbox
+                xmin, ymin, w, h = [c * scale for c in bbox]
                 xmax, ymax = xmin + w, ymin + h
                 # GT 박스는 실선으로 그림
                 draw.rectangle([xmin, ymin, xmax, ymax], outline=color, width=2)
@@ -68,38 +109,156 @@ def draw_annotations(image_path, gt_annotations, pred_annotations, categories,
 
         # 예측 그리기
         if show_pred and pred_annotations:
-            # 예측을 score 기준으로 내림차순 정렬 (겹칠 때 높은 score가 위에 오도록)
-            pred_annotations.sort(key=lambda x: x['score'], reverse=True)
-
-            for pred in pred_annotations:
-                if pred['score'] >= confidence_threshold:
-                    bbox = pred['bbox']
-                    cat_id = pred['category_id']
-                    score = pred['score']
-                    cat_info = categories.get(cat_id, {})
-                    label = cat_info.get('name', f'ID:{cat_id}')
-                    color = get_color(cat_id)
-
-                    xmin, ymin, w, h = bbox
-                    xmax, ymax = xmin + w, ymin + h
-                    # 예측 박스는 점선으로 그림
-                    # 점선 구현이 복잡하므로 여기서는 다른 두께 또는 스타일로 구분
-                    draw.rectangle([xmin, ymin, xmax, ymax], outline=color, width=3) # 약간 더 두껍게
-
-                    text = f"Pred: {label} ({score:.2f})"
-                    text_bbox = draw.textbbox((xmin, ymax - 15 if ymax > 15 else ymax), text, font=font) # 박스 아래쪽에 표시
-                    draw.rectangle(text_bbox, fill=color)
-                    draw.text((xmin, ymax - 15 if ymax > 15 else ymax), text, fill="black", font=font)
+            if presorted:
+                # 이미 score 내림차순이면 threshold보다 낮은 score가 나온 뒤는 볼 필요가 없음
+                visible = itertools.takewhile(lambda p: p['score'] >= confidence_threshold, pred_annotations)
+            else:
+                # threshold를 넘는 예측만 골라 복사본을 정렬 (높은 score 박스를 먼저 그림)
+                visible = sorted((p for p in pred_annotations if p['score'] >= confidence_threshold),
+                                 key=lambda p: p['score'], reverse=True)
+            for pred in visible:
+                bbox = pred['bbox']
+                cat_id = pred['category_id']
+                score = pred['score']
+                cat_info = categories.get(cat_id, {})
+                label = cat_info.get('name', f'ID:{cat_id}')
+                color = get_color(cat_id)
+
+                xmin, ymin, w, h = [c * scale for c in bbox]
+                xmax, ymax = xmin + w, ymin + h
+                # 예측 박스는 점선으로 그림
+                # 점선 구현이 복잡하므로 여기서는 다른 두께 또는 스타일로 구분
+                draw.rectangle([xmin, ymin, xmax, ymax], outline=color, width=3) # 약간 더 두껍게
+
+                text = f"Pred: {label} ({score:.2f})"
+                text_bbox = draw.textbbox((xmin, ymax - 15 if ymax > 15 else ymax), text, font=font) # 박스 아래쪽에 표시
+                draw.rectangle(text_bbox, fill=color)
+                draw.text((xmin, ymax - 15 if ymax > 15 else ymax), text, fill="black", font=font)
 
         return image
 
     except FileNotFoundError:
         print(f"오류: 이미지 파일을 찾을 수 없습니다 - {image_path}")
         # 빈 이미지 또는 오류 이미지 반환
-        return Image.new('RGB', (300, 200), color = 'grey')
+        return None if strict else Image.new('RGB', (300, 200), color = 'grey')
     except Exception as e:
         print(f"오류: 이미지에 annotation 그리는 중 오류 발생 - {e}")
-        return Image.new('RGB', (300, 200), color = 'grey')
+        return None if strict else Image.new('RGB', (300, 200), color = 'grey')
+
+def _init_render_worker(context):
+    """배치 렌더링 worker 초기화: 공통 설정을 저장하고 폰트를 미리 로드합니다."""
+    _RENDER_CONTEXT.clear()
+    _RENDER_CONTEXT.update(context)
+    get_font(15)
+
+def _render_one(task):
+    """worker에서 이미지 한 장을 렌더링하여 저장합니다. 실패 시 None 반환."""
+    image_path, output_path, gt_anns, pred_anns = task
+    ctx = _RENDER_CONTEXT
+    if not os.path.exists(image_path):
+        print(f"오류: 이미지 파일을 찾을 수 없습니다 - {image_path}")
+        return None
+    image = draw_annotations(
+        image_path, gt_anns, pred_anns, ctx["categories"],
+        confidence_threshold=ctx["confidence_threshold"],
+        show_gt=ctx["show_gt"], show_pred=ctx["show_pred"], max_size=ctx["max_size"], strict=True
+    )
+    if image is None:
+        # 읽을 수 없는 이미지는 대체 이미지를 저장하지 않고 실패로 셈
+        return None
+    save_kwargs = {"quality": ctx["quality"]} if ctx["image_format"] in ("JPEG", "WEBP") else {}
+    image.save(output_path, ctx["image_format"], **save_kwargs)
+    return output_path
+
+def _output_path_for(output_dir, file_name, image_id, extension):
+    """
+    렌더링 결과 저장 경로. file_name의 하위 디렉토리 구조를 output_dir 아래에 그대로 유지합니다.
+    (train/a.jpg와 val/a.jpg가 서로 덮어쓰지 않도록)
+    절대 경로이거나 output_dir 밖을 가리키는 file_name은 image_id를 붙인 파일명만 사용합니다.
+    """
+    relative = os.path.normpath(file_name)
+    if os.path.isabs(relative) or relative == os.pardir or relative.startswith(os.pardir + os.sep):
+        relative = f"{image_id}_{os.path.basename(relative)}"
+    return os.path.join(output_dir, os.path.splitext(relative)[0] + extension)
+
+def render_dataset(images, gt_annotations, pred_annotations, categories, image_dir, output_dir,
+                   image_ids=None, confidence_threshold=0.5, show_gt=True, show_pred=True,
+                   max_size=None, quality=90, image_format="JPEG", workers=None, progress_callback=None):
+    """
+    데이터셋 전체 또는 일부 이미지에 GT/예측 overlay를 그려 디스크에 저장합니다. (리뷰용 이미지 묶음 생성)
+
+    Args:
+        images (dict): image_id -> 이미지 정보 (coco_loader.load_coco_annotations 결과).
+        gt_annotations (dict): image_id -> GT annotation 리스트.
+        pred_annotations (Mapping): image_id -> 예측 리스트 (dict 또는 PredictionStore).
+        categories (dict): 카테고리 정보 딕셔너리.
+        image_dir (str): 원본 이미지 디렉토리.
+        output_dir (str): 결과 이미지 저장 디렉토리. file_name의 하위 디렉토리 구조를 그대로 만듭니다.
+        image_ids (iterable, optional): 렌더링할 이미지 ID 목록. None이면 전체.
+        max_size (tuple, optional): 출력 최대 크기 (가로, 세로). 주어지면 JPEG 축소 디코딩을 사용.
+        quality (int): JPEG/WEBP 저장 품질.
+        image_format (str): 저장 형식 ("JPEG", "PNG", "WEBP").
+        workers (int, optional): 프로세스 수. None이면 CPU 수, 1이면 현재 프로세스에서 순차 처리.
+        progress_callback (callable, optional): progress_callback(done, total) 형태로 호출.
+
+    Returns:
+        list: 저장된 이미지 경로 목록.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if image_ids is None:
+        image_ids = list(images.keys())
+    extension = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp"}.get(image_format, ".jpg")
+
+    tasks = []
+    created_dirs = {output_dir}
+    for image_id in image_ids:
+        image_info = images.get(image_id)
+        if not image_info or 'file_name' not in image_info:
+            continue
+        image_path = os.path.join(image_dir, image_info['file_name'])
+        output_path = _output_path_for(output_dir, image_info['file_name'], image_id, extension)
+        output_subdir = os.path.dirname(output_path)
+        if output_subdir not in created_dirs:
+            os.makedirs(output_subdir, exist_ok=True)
+            created_dirs.add(output_subdir)
+        tasks.append((
+            image_path,
+            output_path,
+            list(gt_annotations.get(image_id, [])) if gt_annotations else [],
+            list(pred_annotations.get(image_id, [])) if pred_annotations else [],
+        ))
+
+    context = {
+        "categories": categories,
+        "confidence_threshold": confidence_threshold,
+        "show_gt": show_gt,
+        "show_pred": show_pred,
+        "max_size": max_size,
+        "quality": quality,
+        "image_format": image_format,
+    }
+
+    total = len(tasks)
+    saved = []
+    if workers == 1 or total <= 1:
+        _init_render_worker(context)
+        results = map(_render_one, tasks)
+        for done, path in enumerate(results, 1):
+            if path:
+                saved.append(path)
+            if progress_callback:
+                progress_callback(done, total)
+        return saved
+
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, min(64, total // (workers * 4) or 1))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_render_worker, initargs=(context,)) as executor:
+        for done, path in enumerate(executor.map(_render_one, tasks, chunksize=chunksize), 1):
+            if path:
+                saved.append(path)
+            if progress_callback and (done % 100 == 0 or done == total):
+                progress_callback(done, total)
+    return saved
 
 def draw_pr_curve(precision, recall, title="Precision-Recall Curve"):
     """